@@ -0,0 +1,350 @@
+"""
+RideArchive - per-athlete columnar ride history for analytics scans
+Training load, zone and TSS summaries used to scan the row-oriented rides
+table, JSON zone columns included. The archive keeps one file per athlete
+with fixed numeric columns (zone times flattened to one column per zone),
+sorted by ride date: Arrow IPC when the optional pyarrow package is
+installed, otherwise a numpy structured array. Both are memory-mapped on
+read, so a scan of years of rides touches only the pages of the columns
+it uses and never PostgreSQL.
+
+Refresh is incremental: migration 017 bumps a per-athlete rides version on
+every write (tombstoning deletes), the manifest keeps the version each
+athlete was exported at, and a refresh re-reads only rides newer than
+that and merges them in. Files are replaced atomically, so readers in any
+replica sharing the directory see either the old or the new file.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Iterable
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # the numpy format is memory-mappable too
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveConfig:
+    """Columnar ride archive configuration"""
+    ENABLED = os.getenv("RIDE_ARCHIVE", "true").lower() == "true"
+    # Shared by the replicas; only the maintenance leader writes
+    DIRECTORY = os.getenv("RIDE_ARCHIVE_DIR", "/app/data/ride-archive")
+    FORMAT = "arrow" if pyarrow is not None else "npy"
+    REFRESH_INTERVAL = 300  # seconds between maintenance runs
+    CONCURRENCY = 4  # athletes exported at once
+    POWER_ZONES = 7  # buckets beyond the last column are added to it
+    HR_ZONES = 5
+    MAX_SUMMARY_WEEKS = 520
+
+
+_METRICS = [
+    "duration_min", "distance_km", "tss", "np_watts", "avg_power_watts", "max_power_watts",
+    "avg_heart_rate", "max_heart_rate", "avg_cadence", "elevation_gain", "kilojoules",
+]
+POWER_ZONE_COLUMNS = [f"power_z{i}_s" for i in range(1, ArchiveConfig.POWER_ZONES + 1)]
+HR_ZONE_COLUMNS = [f"hr_z{i}_s" for i in range(1, ArchiveConfig.HR_ZONES + 1)]
+
+# Column -> numpy dtype; missing values are NaN (NaT for dates)
+ARCHIVE_COLUMNS: Dict[str, str] = {
+    "ride_id": "int64",
+    "ride_date": "datetime64[s]",
+    **{name: "float32" for name in _METRICS + POWER_ZONE_COLUMNS + HR_ZONE_COLUMNS},
+}
+
+VERSIONS_SQL = """
+    SELECT athlete_id, version FROM athlete_ride_versions
+"""
+
+CHANGED_RIDES_SQL = f"""
+    SELECT id, ride_date, {", ".join(_METRICS)}, time_in_power_zones, time_in_heart_rate_zones
+    FROM rides
+    WHERE athlete_id = $1 AND archive_version > $2
+"""
+
+REMOVED_RIDES_SQL = """
+    SELECT ride_id FROM ride_archive_tombstones
+    WHERE athlete_id = $1 AND version > $2
+"""
+
+# Tombstones already applied to a saved manifest are no longer needed
+PRUNE_TOMBSTONES_SQL = """
+    DELETE FROM ride_archive_tombstones t
+    USING unnest($1::int[], $2::bigint[]) AS m(athlete_id, version)
+    WHERE t.athlete_id = m.athlete_id AND t.version <= m.version
+"""
+
+
+def zone_times(value: Any, zones: int) -> np.ndarray:
+    """Seconds per zone from a time_in_*_zones value ({"zones": [{"time": s}, ...]})"""
+    times = np.full(zones, np.nan, dtype=np.float32)
+    if isinstance(value, str):
+        value = json.loads(value)
+    buckets = (value or {}).get("zones") or []
+    if not buckets:
+        return times
+    seconds = np.array([bucket.get("time") or 0 for bucket in buckets], dtype=np.float32)
+    times[:] = 0
+    times[:min(len(seconds), zones)] = seconds[:zones]
+    times[-1] += seconds[zones:].sum()
+    return times
+
+
+def _epoch_seconds(value: Optional[datetime]) -> np.datetime64:
+    if value is None:
+        return np.datetime64("NaT", "s")
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(value, "s")
+
+
+def rows_to_columns(rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """rides rows (CHANGED_RIDES_SQL) -> archive columns"""
+    columns = {
+        "ride_id": np.array([row["id"] for row in rows], dtype=np.int64),
+        "ride_date": np.array([_epoch_seconds(row["ride_date"]) for row in rows], dtype="datetime64[s]"),
+    }
+    for name in _METRICS:
+        columns[name] = np.array([np.nan if row[name] is None else row[name] for row in rows],
+                                 dtype=np.float32)
+    for names, key, zones in ((POWER_ZONE_COLUMNS, "time_in_power_zones", ArchiveConfig.POWER_ZONES),
+                              (HR_ZONE_COLUMNS, "time_in_heart_rate_zones", ArchiveConfig.HR_ZONES)):
+        times = (np.stack([zone_times(row[key], zones) for row in rows]) if rows
+                 else np.empty((0, zones), dtype=np.float32))
+        for i, name in enumerate(names):
+            columns[name] = np.ascontiguousarray(times[:, i])
+    return columns
+
+
+def merge_columns(existing: Optional[Dict[str, np.ndarray]], changed: Dict[str, np.ndarray],
+                  removed_ids: Iterable[int] = ()) -> Dict[str, np.ndarray]:
+    """Replace changed rides, drop removed ones, keep the result sorted by date"""
+    if existing is not None and len(existing["ride_id"]):
+        replaced = np.concatenate([changed["ride_id"], np.fromiter(removed_ids, dtype=np.int64)])
+        keep = ~np.isin(existing["ride_id"], replaced)
+        merged = {name: np.concatenate([existing[name][keep], changed[name]]) for name in ARCHIVE_COLUMNS}
+    else:
+        merged = changed
+    order = np.argsort(merged["ride_date"], kind="stable")  # NaT sorts last
+    return {name: np.ascontiguousarray(merged[name][order]) for name in ARCHIVE_COLUMNS}
+
+
+def weekly_summary(columns: Dict[str, np.ndarray], weeks: int, today: date) -> Dict[str, Any]:
+    """TSS, hours and zone time per ISO week for the last `weeks` weeks"""
+    monday = np.datetime64(today - timedelta(days=today.weekday()), "D")
+    first = monday - np.timedelta64(7 * (weeks - 1), "D")
+    days = columns["ride_date"].astype("datetime64[D]")
+    lo, hi = np.searchsorted(days, [first, monday + np.timedelta64(7, "D")])
+    week = ((days[lo:hi] - first) // np.timedelta64(7, "D")).astype(np.int64)
+
+    def per_week(name):
+        values = np.nan_to_num(np.asarray(columns[name][lo:hi], dtype=np.float64))
+        return np.bincount(week, weights=values, minlength=weeks)
+
+    rides = np.bincount(week, minlength=weeks)
+    tss = per_week("tss")
+    hours = per_week("duration_min") / 60
+    power_zones = np.stack([per_week(name) for name in POWER_ZONE_COLUMNS], axis=1)
+    hr_zones = np.stack([per_week(name) for name in HR_ZONE_COLUMNS], axis=1)
+    return {
+        "weeks": [
+            {
+                "week_start": (first + np.timedelta64(7 * i, "D")).astype(date),
+                "rides": int(rides[i]),
+                "tss": round(float(tss[i]), 1),
+                "hours": round(float(hours[i]), 2),
+                "power_zone_seconds": power_zones[i].astype(int).tolist(),
+                "hr_zone_seconds": hr_zones[i].astype(int).tolist(),
+            }
+            for i in range(weeks)
+        ],
+        "rides": int(hi - lo),
+        "tss": round(float(tss.sum()), 1),
+        "hours": round(float(hours.sum()), 2),
+    }
+
+
+class RideArchive:
+    """Incrementally refreshed, memory-mapped per-athlete ride columns"""
+
+    def __init__(self, manager, directory: Optional[str] = None, file_format: Optional[str] = None):
+        self.manager = manager
+        self.directory = directory or ArchiveConfig.DIRECTORY
+        self.format = file_format or ArchiveConfig.FORMAT
+        self.stats_counters = {
+            "refreshes": 0,
+            "athletes_exported": 0,
+            "rides_written": 0,
+            "rides_removed": 0,
+            "scans": 0,
+        }
+        self.last_refresh: Optional[Dict[str, Any]] = None
+        self._manifest: Optional[Dict[str, Any]] = None
+        self._manifest_mtime: Optional[int] = None
+
+    def stats(self) -> Dict[str, Any]:
+        manifest = self._load_manifest()
+        return {
+            **self.stats_counters,
+            "format": self.format,
+            "directory": self.directory,
+            "athletes": len(manifest["athletes"]),
+            "last_refresh": self.last_refresh,
+        }
+
+    # ---------- files ----------
+
+    def _path(self, athlete_id: int) -> str:
+        return os.path.join(self.directory, f"athlete-{athlete_id}.{self.format}")
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        """The saved manifest, re-read only when the leader replaced it"""
+        try:
+            mtime = os.stat(self._manifest_path()).st_mtime_ns
+            if mtime != self._manifest_mtime:
+                with open(self._manifest_path()) as f:
+                    self._manifest = json.load(f)
+                self._manifest_mtime = mtime
+            manifest = self._manifest
+        except FileNotFoundError:
+            manifest = None
+        except (OSError, ValueError) as e:
+            logger.warning("Unreadable ride archive manifest, re-exporting everything: %s", e)
+            manifest = None
+        # Files of another format (pyarrow installed or removed) are re-exported
+        if not manifest or manifest.get("format") != self.format:
+            return {"format": self.format, "athletes": {}}
+        return {"format": self.format, "athletes": dict(manifest["athletes"])}
+
+    def _replace(self, path: str, write):
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        os.makedirs(self.directory, exist_ok=True)
+        self._replace(self._manifest_path(), lambda f: f.write(json.dumps(manifest).encode()))
+
+    def _write(self, athlete_id: int, columns: Dict[str, np.ndarray]):
+        path = self._path(athlete_id)
+        if not len(columns["ride_id"]):
+            # An empty array cannot be memory-mapped; no file reads as no rides
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if self.format == "arrow":
+            table = pyarrow.table({name: columns[name] for name in ARCHIVE_COLUMNS})
+
+            def write(f):
+                with pyarrow.ipc.new_file(f, table.schema) as writer:
+                    writer.write_table(table)
+        else:
+            records = np.empty(len(columns["ride_id"]), dtype=list(ARCHIVE_COLUMNS.items()))
+            for name in ARCHIVE_COLUMNS:
+                records[name] = columns[name]
+
+            def write(f):
+                np.save(f, records)
+        self._replace(path, write)
+
+    def _read(self, athlete_id: int, names: List[str]) -> Optional[Dict[str, np.ndarray]]:
+        path = self._path(athlete_id)
+        if not os.path.exists(path):
+            return None
+        if self.format == "arrow":
+            table = pyarrow.ipc.open_file(pyarrow.memory_map(path, "r")).read_all()
+            return {name: table.column(name).to_numpy() for name in names}
+        records = np.load(path, mmap_mode="r")
+        return {name: records[name] for name in names}
+
+    def scan(self, athlete_id: int, columns: Optional[List[str]] = None,
+             start: Optional[date] = None, end: Optional[date] = None) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Memory-mapped columns of an athlete's rides with start <= ride date < end,
+        sorted by date; None if the athlete has not been exported yet
+        """
+        names = list(columns or ARCHIVE_COLUMNS)
+        unknown = set(names) - set(ARCHIVE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown archive columns: {sorted(unknown)}")
+        if str(athlete_id) not in self._load_manifest()["athletes"]:
+            return None
+        self.stats_counters["scans"] += 1
+        data = self._read(athlete_id, sorted(set(names) | {"ride_date"}))
+        if data is None:
+            return {name: np.empty(0, dtype=ARCHIVE_COLUMNS[name]) for name in names}
+        lo, hi = 0, len(data["ride_date"])
+        if start or end:
+            days = data["ride_date"]
+            if start:
+                lo = int(np.searchsorted(days, np.datetime64(start, "s")))
+            if end:
+                hi = int(np.searchsorted(days, np.datetime64(end, "s")))
+        return {name: data[name][lo:hi] for name in names}
+
+    # ---------- refresh ----------
+
+    async def refresh(self) -> int:
+        """Export every athlete whose rides changed since their last export; returns how many"""
+        started = time.time()
+        manifest = self._load_manifest()
+        exported = manifest["athletes"]
+        async with self.manager.pg_pool.acquire() as conn:
+            if exported:
+                await conn.execute(PRUNE_TOMBSTONES_SQL, [int(a) for a in exported],
+                                   list(exported.values()))
+            rows = await conn.fetch(VERSIONS_SQL)
+        # -1: never exported, so rides from before migration 017 (version 0) count
+        due = [(row["athlete_id"], row["version"]) for row in rows
+               if row["version"] > exported.get(str(row["athlete_id"]), -1)]
+
+        semaphore = asyncio.Semaphore(ArchiveConfig.CONCURRENCY)
+
+        async def export(athlete_id, version):
+            async with semaphore:
+                try:
+                    await self._export(athlete_id, exported.get(str(athlete_id), -1))
+                    return athlete_id, version
+                except Exception as e:
+                    logger.warning("Ride archive export failed for athlete %s: %s", athlete_id, e)
+                    return None
+
+        done = [result for result in await asyncio.gather(*[export(a, v) for a, v in due]) if result]
+        if done:
+            exported.update({str(athlete_id): version for athlete_id, version in done})
+            await asyncio.to_thread(self._save_manifest, manifest)
+        self.stats_counters["refreshes"] += 1
+        self.stats_counters["athletes_exported"] += len(done)
+        self.last_refresh = {"at": started, "athletes": len(done), "failed": len(due) - len(done),
+                             "seconds": round(time.time() - started, 3)}
+        return len(done)
+
+    async def _export(self, athlete_id: int, since: int):
+        """Merge the athlete's rides changed after version `since` into their file"""
+        async with self.manager.pg_pool.acquire() as conn:
+            rows = await conn.fetch(CHANGED_RIDES_SQL, athlete_id, since)
+            removed = [row["ride_id"] for row in await conn.fetch(REMOVED_RIDES_SQL, athlete_id, since)]
+
+        def merge_and_write():
+            existing = self._read(athlete_id, list(ARCHIVE_COLUMNS)) if since >= 0 else None
+            merged = merge_columns(existing, rows_to_columns([dict(row) for row in rows]), removed)
+            self._write(athlete_id, merged)
+
+        await asyncio.to_thread(merge_and_write)
+        self.stats_counters["rides_written"] += len(rows)
+        self.stats_counters["rides_removed"] += len(removed)
@@ -0,0 +1,309 @@
+"""
+StravaBackfill - pages through connected athletes' Strava activity history
+Athletes connecting through n8n only got rides as webhooks arrived, so
+their CTL / ATL started near zero. The backfill fetches
+/athlete/activities pages (200 summaries each) for HISTORY_DAYS, shared
+fairly across athletes: a worker fetches one page, then the athlete goes
+to the back of the queue. Every request first takes a token from both
+budget buckets (15-minute and daily), sized below Strava's application
+limits so webhook ingestion keeps its share. A page's rides and the next
+page number are saved in one transaction, so the backfill resumes per
+athlete after a restart. One replica runs it, elected like the
+maintenance scheduler.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Optional, Dict, Any
+
+from strava import (
+    TokenBucket, StravaRateLimited, StravaAuthError,
+    transform_activity, ride_values, INSERT_RIDE_IF_NEW_SQL
+)
+from maintenance import LeaderLock
+from jobs import JobConfig
+
+logger = logging.getLogger(__name__)
+
+
+class BackfillConfig:
+    """Strava history backfill configuration"""
+    ENABLED = os.getenv("STRAVA_BACKFILL", "true").lower() == "true"
+    LOCK_KEY = "athlete-state:backfill:leader"
+    LOCK_TTL = 60  # seconds; renewed before every request
+    POLL_INTERVAL = 60  # seconds between checks for new work
+    # Strava allows 100 read requests per 15 minutes and 1000 per day by
+    # default; the backfill stays well below so webhooks are never starved
+    FIFTEEN_MINUTE_BUDGET = int(os.getenv("STRAVA_BACKFILL_15MIN", "60"))
+    DAILY_BUDGET = int(os.getenv("STRAVA_BACKFILL_DAILY", "600"))
+    CONCURRENCY = 4  # pages in flight
+    PER_PAGE = 200  # Strava's maximum
+    HISTORY_DAYS = 365
+    MAX_ATTEMPTS = 5
+    # Connected athletes without a backfill row are queued automatically
+    DISCOVER = os.getenv("STRAVA_BACKFILL_DISCOVER", "true").lower() == "true"
+    RIDE_TYPES = {"Ride", "VirtualRide", "GravelRide", "MountainBikeRide", "EBikeRide", "Velomobile"}
+
+
+DISCOVER_SQL = """
+    INSERT INTO strava_backfill (athlete_id, before_ts, after_ts)
+    SELECT id, $1, $2 FROM athletes WHERE strava_refresh_token IS NOT NULL
+    ON CONFLICT (athlete_id) DO NOTHING
+"""
+
+REQUEST_SQL = """
+    INSERT INTO strava_backfill (athlete_id, before_ts, after_ts)
+    SELECT id, $2, $3 FROM athletes WHERE id = $1
+    ON CONFLICT (athlete_id) DO UPDATE SET
+        status = 'pending', before_ts = EXCLUDED.before_ts, after_ts = EXCLUDED.after_ts,
+        next_page = 1, pages = 0, rides = 0, attempts = 0, error = NULL,
+        requested_at = NOW(), updated_at = NOW(), finished_at = NULL
+    WHERE $4 OR strava_backfill.status = 'failed'
+"""
+
+LOAD_PENDING_SQL = """
+    SELECT b.athlete_id, b.before_ts, b.after_ts, b.next_page, a.strava_ftp
+    FROM strava_backfill b
+    JOIN athletes a ON a.id = b.athlete_id
+    WHERE b.status = 'pending'
+    ORDER BY b.requested_at
+"""
+
+SAVE_PAGE_SQL = """
+    UPDATE strava_backfill
+    SET next_page = $2, pages = pages + 1, rides = rides + $3, status = $4,
+        attempts = 0, error = NULL, updated_at = NOW(),
+        finished_at = CASE WHEN $4 = 'done' THEN NOW() END
+    WHERE athlete_id = $1
+"""
+
+FAIL_SQL = """
+    UPDATE strava_backfill
+    SET attempts = attempts + 1, error = $2, updated_at = NOW(),
+        status = CASE WHEN attempts + 1 >= $3 THEN 'failed' ELSE status END
+    WHERE athlete_id = $1
+    RETURNING status
+"""
+
+STATUS_SQL = """
+    SELECT athlete_id, status, next_page, pages, rides, attempts, error,
+           requested_at, updated_at, finished_at
+    FROM strava_backfill
+    WHERE athlete_id = $1
+"""
+
+
+class RateBudget:
+    """Both buckets must have a token; a 429 pauses every request"""
+
+    def __init__(self, fifteen_minute: int, daily: int):
+        self.short = TokenBucket(fifteen_minute, fifteen_minute / 900)
+        self.daily = TokenBucket(daily, daily / 86400)
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def wait_time(self) -> float:
+        return max(self.paused_until - time.monotonic(),
+                   self.short.wait_time(), self.daily.wait_time(), 0.0)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                wait = self.wait_time()
+                if wait <= 0:
+                    self.short.try_acquire()
+                    self.daily.try_acquire()
+                    return
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Strava said 429: no request before its window resets"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        self.short._refill()
+        self.daily._refill()
+        return {
+            "fifteen_minute_tokens": round(self.short.tokens, 1),
+            "daily_tokens": round(self.daily.tokens, 1),
+            "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 1),
+        }
+
+
+class _LeaseLost(Exception):
+    pass
+
+
+class StravaBackfill:
+    """Rate-budgeted, resumable Strava activity history import"""
+
+    def __init__(self, manager, strava_client, tokens):
+        self.manager = manager
+        self.strava = strava_client
+        self.tokens = tokens
+        self.budget = RateBudget(BackfillConfig.FIFTEEN_MINUTE_BUDGET, BackfillConfig.DAILY_BUDGET)
+        self.lock: Optional[LeaderLock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.stats_counters = {
+            "pages": 0,
+            "rides": 0,
+            "athletes_done": 0,
+            "failures": 0,
+            "rate_limited": 0,
+        }
+
+    async def initialize(self):
+        if not self.manager.pg_pool or not self.manager.redis_client:
+            logger.warning("Strava backfill disabled (needs PostgreSQL and Redis)")
+            return
+        self.lock = LeaderLock(self.manager.redis_client, BackfillConfig.LOCK_KEY,
+                               BackfillConfig.LOCK_TTL, JobConfig.WORKER_ID)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Strava backfill started")
+
+    async def cleanup(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.lock:
+            try:
+                await self.lock.release()
+            except Exception as e:
+                logger.warning("Could not release the backfill lock: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            "running": self._task is not None and not self._task.done(),
+            "leader": bool(self.lock and self.lock.held),
+            "budget": self.budget.stats(),
+        }
+
+    def _window(self):
+        before = int(time.time())
+        return before, before - BackfillConfig.HISTORY_DAYS * 86400
+
+    async def request(self, athlete_id: int, force: bool = False) -> Optional[Dict[str, Any]]:
+        """Queue an athlete's backfill (again, if forced or failed); returns its progress"""
+        before, after = self._window()
+        async with self.manager.pg_pool.acquire() as conn:
+            await conn.execute(REQUEST_SQL, athlete_id, before, after, force)
+        if self._wakeup:
+            self._wakeup.set()
+        return await self.progress(athlete_id)
+
+    async def progress(self, athlete_id: int) -> Optional[Dict[str, Any]]:
+        async with self.manager.pg_pool.acquire() as conn:
+            row = await conn.fetchrow(STATUS_SQL, athlete_id)
+        return dict(row) if row else None
+
+    async def _run(self):
+        while True:
+            try:
+                if await self.lock.hold():
+                    await self.run_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Strava backfill pass failed: %s", e)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), BackfillConfig.POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_pending(self) -> int:
+        """Work through every pending athlete; returns the pages fetched"""
+        async with self.manager.pg_pool.acquire() as conn:
+            if BackfillConfig.DISCOVER:
+                await conn.execute(DISCOVER_SQL, *self._window())
+            rows = await conn.fetch(LOAD_PENDING_SQL)
+        if not rows:
+            return 0
+        queue: asyncio.Queue = asyncio.Queue()
+        for row in rows:
+            queue.put_nowait(dict(row))
+        pages_before = self.stats_counters["pages"]
+        workers = [asyncio.create_task(self._worker(queue))
+                   for _ in range(min(BackfillConfig.CONCURRENCY, len(rows)))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+        return self.stats_counters["pages"] - pages_before
+
+    async def _worker(self, queue: asyncio.Queue):
+        while not queue.empty():
+            job = queue.get_nowait()
+            try:
+                more = await self._fetch_page(job)
+            except _LeaseLost:
+                logger.info("Backfill leadership lost; stopping")
+                return
+            except StravaRateLimited as e:
+                self.stats_counters["rate_limited"] += 1
+                logger.warning("%s; backfill paused", e)
+                self.budget.pause(e.retry_after)
+                more = True
+            except Exception as e:
+                more = await self._record_failure(job["athlete_id"], e)
+            if more:
+                queue.put_nowait(job)  # to the back: other athletes get a page first
+
+    async def _fetch_page(self, job: Dict[str, Any]) -> bool:
+        """Fetch and save one page; True if the athlete has more pages"""
+        athlete_id = job["athlete_id"]
+        access_token = await self.tokens.get_access_token(athlete_id)
+        if not access_token:
+            raise StravaAuthError(f"Athlete {athlete_id} is not connected to Strava")
+        await self.budget.acquire()
+        if self.lock and not await self.lock.hold():
+            raise _LeaseLost()
+        try:
+            activities = await self.strava.get(athlete_id, access_token, "/athlete/activities", params={
+                "before": job["before_ts"],
+                "after": job["after_ts"],
+                "page": job["next_page"],
+                "per_page": BackfillConfig.PER_PAGE,
+            })
+        except StravaAuthError:
+            await self.tokens.forget(athlete_id)
+            raise
+        rides = [
+            transform_activity(activity, [], athlete_id, job.get("strava_ftp"))
+            for activity in activities or []
+            if (activity.get("sport_type") or activity.get("type")) in BackfillConfig.RIDE_TYPES
+        ]
+        done = len(activities or []) < BackfillConfig.PER_PAGE
+        async with self.manager.pg_pool.acquire() as conn:
+            async with conn.transaction():
+                if rides:
+                    await conn.executemany(INSERT_RIDE_IF_NEW_SQL, [ride_values(r) for r in rides])
+                await conn.execute(SAVE_PAGE_SQL, athlete_id, job["next_page"] + 1, len(rides),
+                                   "done" if done else "pending")
+        job["next_page"] += 1
+        self.stats_counters["pages"] += 1
+        self.stats_counters["rides"] += len(rides)
+        if done:
+            self.stats_counters["athletes_done"] += 1
+            await self.manager.invalidate_context(athlete_id)
+            logger.info("Strava backfill finished for athlete %s (%s pages)", athlete_id, job["next_page"] - 1)
+        return not done
+
+    async def _record_failure(self, athlete_id: int, error: Exception) -> bool:
+        """Count a failed page; True if the athlete should be retried in this pass"""
+        self.stats_counters["failures"] += 1
+        logger.warning("Strava backfill page failed for athlete %s: %s", athlete_id, error)
+        try:
+            async with self.manager.pg_pool.acquire() as conn:
+                status = await conn.fetchval(FAIL_SQL, athlete_id, str(error), BackfillConfig.MAX_ATTEMPTS)
+        except Exception as e:
+            logger.error("Could not record backfill failure for athlete %s: %s", athlete_id, e)
+            return False
+        # Auth failures wait for the next pass (a reconnect or token refresh)
+        return status == "pending" and not isinstance(error, StravaAuthError)
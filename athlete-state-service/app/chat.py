@@ -0,0 +1,205 @@
+"""
+ChatHistoryService - newest-first keyset pagination over n8n_chat_histories
+and a rolling per-athlete conversation summary folded forward incrementally,
+so each chat turn costs the same however long the conversation gets
+"""
+import logging
+import base64
+import asyncio
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class ChatConfig:
+    """Chat history configuration"""
+    DEFAULT_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+    # Fold new messages into the summary once this many have accumulated
+    SUMMARY_BATCH = 20
+    SUMMARY_MAX_MESSAGES = 100  # per fold, oldest first
+    SUMMARY_MESSAGE_CHARS = 600  # same cap as the Chat Memory Lookup tool
+    OLLAMA_GENERATE_URL = "http://host.docker.internal:11434/api/generate"
+    SUMMARY_MODEL = "mistral"
+    SUMMARY_TIMEOUT = 120  # seconds
+
+
+def encode_cursor(created_at: datetime, message_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, message_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(message_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+def build_summary_prompt(previous_summary: str, messages: List[Dict[str, Any]]) -> str:
+    """Prompt that folds new messages into the running summary"""
+    lines = []
+    for message in messages:
+        speaker = "Athlete" if message["role"] == "user" else "Coach"
+        content = (message["content"] or "")[:ChatConfig.SUMMARY_MESSAGE_CHARS]
+        lines.append(f"{speaker}: {content}")
+
+    return (
+        "You maintain a running summary of a conversation between a cycling coach "
+        "and an athlete. Keep goals, constraints, injuries, preferences, decisions "
+        "and open questions; drop small talk. Answer with the updated summary only, "
+        "at most 200 words.\n\n"
+        f"Current summary:\n{previous_summary or '(none yet)'}\n\n"
+        "New messages:\n" + "\n".join(lines)
+    )
+
+
+class ChatHistoryService:
+    """Chat history reads and rolling summaries"""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.http_client: Optional[httpx.AsyncClient] = None
+        # At most one background fold per athlete
+        self._folds: Dict[int, asyncio.Task] = {}
+
+    async def initialize(self):
+        self.http_client = httpx.AsyncClient(timeout=ChatConfig.SUMMARY_TIMEOUT)
+
+    async def cleanup(self):
+        for task in self._folds.values():
+            task.cancel()
+        await asyncio.gather(*self._folds.values(), return_exceptions=True)
+        self._folds.clear()
+        if self.http_client:
+            await self.http_client.aclose()
+            self.http_client = None
+
+    async def get_page(self, athlete_id: int, limit: int = ChatConfig.DEFAULT_PAGE_SIZE,
+                       before: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Newest messages first by (created_at, id). Messages in a page are
+        returned oldest to newest for display; next_cursor pages further back.
+        """
+        limit = max(1, min(limit, ChatConfig.MAX_PAGE_SIZE))
+        cursor_at, cursor_id = decode_cursor(before) if before else (None, None)
+
+        async with self.manager.pg_pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT id, role, clean_content AS content, created_at
+                FROM n8n_chat_histories
+                WHERE athlete_id = $1
+                  AND role IS NOT NULL
+                  AND ($2::timestamp IS NULL OR (created_at, id) < ($2::timestamp, $3::int))
+                ORDER BY created_at DESC, id DESC
+                LIMIT $4
+            """, athlete_id, cursor_at, cursor_id, limit + 1)
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"]) if has_more else None
+
+        return {
+            "athlete_id": athlete_id,
+            "messages": [dict(r) for r in reversed(rows)],
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+        }
+
+    async def _load_summary(self, conn, athlete_id: int) -> Dict[str, Any]:
+        row = await conn.fetchrow("""
+            SELECT s.summary, s.last_message_id, s.message_count, s.updated_at,
+                   (SELECT COUNT(*) FROM n8n_chat_histories h
+                    WHERE h.athlete_id = $1 AND h.role IS NOT NULL
+                      AND h.id > COALESCE(s.last_message_id, 0))::int AS pending
+            FROM (SELECT $1::int AS athlete_id) a
+            LEFT JOIN chat_summaries s ON s.athlete_id = a.athlete_id
+        """, athlete_id)
+        return {
+            "summary": row["summary"] or "",
+            "last_message_id": row["last_message_id"] or 0,
+            "message_count": row["message_count"] or 0,
+            "updated_at": row["updated_at"],
+            "pending": row["pending"],
+        }
+
+    async def _generate(self, prompt: str) -> str:
+        response = await self.http_client.post(
+            ChatConfig.OLLAMA_GENERATE_URL,
+            json={"model": ChatConfig.SUMMARY_MODEL, "prompt": prompt, "stream": False}
+        )
+        response.raise_for_status()
+        return (response.json().get("response") or "").strip()
+
+    async def _fold(self, athlete_id: int, current: Dict[str, Any]) -> Dict[str, Any]:
+        """Fold the next batch of unsummarized messages into the summary"""
+        async with self.manager.pg_pool.acquire() as conn:
+            messages = await conn.fetch("""
+                SELECT id, role, clean_content AS content
+                FROM n8n_chat_histories
+                WHERE athlete_id = $1 AND role IS NOT NULL AND id > $2
+                ORDER BY id
+                LIMIT $3
+            """, athlete_id, current["last_message_id"], ChatConfig.SUMMARY_MAX_MESSAGES)
+        if not messages:
+            return current
+
+        summary = await self._generate(build_summary_prompt(current["summary"], messages))
+        if not summary:
+            return current
+
+        last_id = messages[-1]["id"]
+        async with self.manager.pg_pool.acquire() as conn:
+            # Never move the watermark backwards if another replica folded further
+            await conn.execute("""
+                INSERT INTO chat_summaries (athlete_id, summary, last_message_id, message_count, updated_at)
+                VALUES ($1, $2, $3, $4, NOW())
+                ON CONFLICT (athlete_id) DO UPDATE SET
+                    summary = EXCLUDED.summary,
+                    last_message_id = EXCLUDED.last_message_id,
+                    message_count = chat_summaries.message_count + EXCLUDED.message_count,
+                    updated_at = NOW()
+                WHERE chat_summaries.last_message_id < EXCLUDED.last_message_id
+            """, athlete_id, summary, last_id, len(messages))
+
+        logger.info("Folded %s messages into summary for athlete %s", len(messages), athlete_id)
+        return {
+            "summary": summary,
+            "last_message_id": last_id,
+            "message_count": current["message_count"] + len(messages),
+            "updated_at": datetime.now(),
+            "pending": max(0, current["pending"] - len(messages)),
+        }
+
+    async def _refresh(self, athlete_id: int):
+        try:
+            async with self.manager.pg_pool.acquire() as conn:
+                current = await self._load_summary(conn, athlete_id)
+            if current["pending"] >= ChatConfig.SUMMARY_BATCH:
+                await self._fold(athlete_id, current)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The stored summary stays in place; the next read retries
+            logger.warning("Chat summary refresh failed for athlete %s: %s", athlete_id, e)
+        finally:
+            self._folds.pop(athlete_id, None)
+
+    async def get_summary(self, athlete_id: int, refresh: bool = True) -> Dict[str, Any]:
+        """
+        Rolling summary - always one read. Once SUMMARY_BATCH new messages have
+        built up, a fold is started in the background (one per athlete) and
+        the stored summary is returned without waiting for the LLM.
+        """
+        async with self.manager.pg_pool.acquire() as conn:
+            current = await self._load_summary(conn, athlete_id)
+
+        if refresh and current["pending"] >= ChatConfig.SUMMARY_BATCH and athlete_id not in self._folds:
+            self._folds[athlete_id] = asyncio.create_task(self._refresh(athlete_id))
+
+        return {"athlete_id": athlete_id, **current, "refreshing": athlete_id in self._folds}
@@ -0,0 +1,143 @@
+"""
+CohortService - training load, compliance and fatigue flags for a roster
+Seeing load across athletes used to mean running the per-athlete workflow
+SQL once per athlete. Migration 018 keeps one precomputed row per athlete
+in the athlete_cohort_summary materialized view; the maintenance scheduler
+refreshes it CONCURRENTLY (readers keep the old rows until the swap), so a
+roster of hundreds of athletes is one indexed read. Flags are derived here
+so their thresholds change without a migration.
+"""
+import time
+import logging
+from datetime import date
+from typing import Optional, Dict, Any, List
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+
+class CohortConfig:
+    """Cohort summary configuration"""
+    REFRESH_INTERVAL = 300  # seconds between maintenance refreshes
+    MAX_ATHLETES = 2000  # athlete_ids per request
+    # Fatigue flags
+    LOAD_SPIKE_RATIO = 1.5  # 7-day TSS over the 28-day weekly average
+    MIN_CHRONIC_TSS = 100  # 28-day TSS below this: too little history for a ratio
+    LOW_COMPLIANCE = 0.6  # completed / planned workouts
+    MIN_PLANNED = 3  # fewer planned workouts: compliance not flagged
+    INACTIVE_DAYS = 10
+
+
+REFRESH_SQL = "REFRESH MATERIALIZED VIEW CONCURRENTLY athlete_cohort_summary"
+# CONCURRENTLY refuses a view that was never populated
+POPULATE_SQL = "REFRESH MATERIALIZED VIEW athlete_cohort_summary"
+COUNT_SQL = "SELECT count(*) FROM athlete_cohort_summary"
+
+COHORT_SQL = """
+    SELECT athlete_id, name, ctl_42d, atl_7d, tsb, acute_fatigue_level,
+           tss_this_week, tss_last_week, tss_7d, tss_28d, last_ride_date,
+           planned_workouts, completed_workouts, planned_tss, refreshed_at
+    FROM athlete_cohort_summary
+    WHERE $1::int[] IS NULL OR athlete_id = ANY($1::int[])
+    ORDER BY athlete_id
+"""
+
+
+def _float(value: Any) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def cohort_row(row: Dict[str, Any], today: date) -> Dict[str, Any]:
+    """Response entry for one athlete_cohort_summary row, with its flags"""
+    planned = row["planned_workouts"]
+    compliance = round(row["completed_workouts"] / planned, 2) if planned else None
+    chronic_weekly = row["tss_28d"] / 4
+    acwr = (round(row["tss_7d"] / chronic_weekly, 2)
+            if row["tss_28d"] >= CohortConfig.MIN_CHRONIC_TSS else None)
+
+    flags = []
+    if row["acute_fatigue_level"] == "high":
+        flags.append("high_fatigue")
+    if acwr is not None and acwr > CohortConfig.LOAD_SPIKE_RATIO:
+        flags.append("load_spike")
+    if compliance is not None and planned >= CohortConfig.MIN_PLANNED and compliance < CohortConfig.LOW_COMPLIANCE:
+        flags.append("low_compliance")
+    last_ride = row["last_ride_date"]
+    if last_ride is None or (today - last_ride).days > CohortConfig.INACTIVE_DAYS:
+        flags.append("inactive")
+
+    return {
+        "athlete_id": row["athlete_id"],
+        "name": row["name"],
+        "ctl_42d": _float(row["ctl_42d"]),
+        "atl_7d": _float(row["atl_7d"]),
+        "tsb": _float(row["tsb"]),
+        "acute_fatigue_level": row["acute_fatigue_level"],
+        "tss": {
+            "this_week": row["tss_this_week"],
+            "last_week": row["tss_last_week"],
+            "last_7d": row["tss_7d"],
+            "last_28d": row["tss_28d"],
+        },
+        "acute_chronic_ratio": acwr,
+        "last_ride_date": last_ride,
+        "compliance": {
+            "planned": planned,
+            "completed": row["completed_workouts"],
+            "ratio": compliance,
+            "planned_tss": row["planned_tss"],
+        },
+        "flags": flags,
+    }
+
+
+class CohortService:
+    """Roster-wide training load summary from a concurrently refreshed view"""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.stats_counters = {
+            "requests": 0,
+            "refreshes": 0,
+        }
+        self.last_refresh: Optional[Dict[str, Any]] = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.stats_counters, "last_refresh": self.last_refresh}
+
+    async def refresh(self) -> int:
+        """Recompute the view without blocking readers; returns its athletes"""
+        started = time.time()
+        async with self.manager.pg_pool.acquire() as conn:
+            try:
+                await conn.execute(REFRESH_SQL)
+            except asyncpg.ObjectNotInPrerequisiteStateError:
+                await conn.execute(POPULATE_SQL)
+            athletes = await conn.fetchval(COUNT_SQL)
+        self.stats_counters["refreshes"] += 1
+        self.last_refresh = {"at": started, "athletes": athletes,
+                             "seconds": round(time.time() - started, 3)}
+        return athletes
+
+    async def get_cohort(self, athlete_ids: Optional[List[int]] = None,
+                         flagged_only: bool = False, today: Optional[date] = None) -> Dict[str, Any]:
+        """Every athlete's row (or the given athletes'), flags included"""
+        self.stats_counters["requests"] += 1
+        async with self.manager.pg_pool.acquire() as conn:
+            rows = await conn.fetch(COHORT_SQL, athlete_ids)
+        today = today or date.today()
+        athletes = [cohort_row(row, today) for row in rows]
+        flag_counts: Dict[str, int] = {}
+        for athlete in athletes:
+            for flag in athlete["flags"]:
+                flag_counts[flag] = flag_counts.get(flag, 0) + 1
+        if flagged_only:
+            athletes = [a for a in athletes if a["flags"]]
+        return {
+            "athletes": athletes,
+            "count": len(athletes),
+            "roster_size": len(rows),
+            "flag_counts": flag_counts,
+            "refreshed_at": rows[0]["refreshed_at"] if rows else None,
+        }
@@ -0,0 +1,179 @@
+"""
+ContextService - one precomputed snapshot of everything the chat agent's
+Postgres tools look up (capabilities, recent load, current phase, goals).
+Built in a single query, cached per athlete and versioned so ride, plan and
+goal writes invalidate it without racing concurrent rebuilds.
+"""
+import json
+from datetime import date, datetime
+from typing import Optional, Dict, Any
+
+from managers import json_default
+
+
+class ContextConfig:
+    """Chat context configuration"""
+    LOAD_WINDOW_DAYS = 30
+    RECENT_RIDES = 10
+    DEFAULT_FTP = 242  # same fallback as analyze_recent_training_load
+
+
+# Ports of the check_athlete_capabilities, Athlete-Goals,
+# analyze_recent_training_load and review_current_training_plan tool queries
+CONTEXT_SQL = """
+WITH athlete AS (
+    SELECT *, COALESCE(athlete_ftp, strava_ftp, 0) AS ftp
+    FROM athletes
+    WHERE id = $1
+),
+recent AS (
+    SELECT ride_date, COALESCE(title, 'Ride') AS title, duration_min, tss,
+           avg_power_watts, avg_heart_rate, time_in_power_zones, time_in_heart_rate_zones
+    FROM rides
+    WHERE athlete_id = $1 AND ride_date >= $2::date - $3::int
+    ORDER BY ride_date DESC
+    LIMIT $4
+),
+summary AS (
+    SELECT COUNT(*) AS total_rides,
+           COALESCE(SUM(tss), 0) AS total_tss,
+           ROUND(COALESCE(AVG(tss), 0), 1) AS avg_tss,
+           ROUND(COALESCE(AVG(avg_power_watts), 0), 0) AS avg_power,
+           COUNT(DISTINCT DATE(ride_date)) AS days_with_rides
+    FROM rides
+    WHERE athlete_id = $1 AND ride_date >= $2::date - $3::int
+),
+phase AS (
+    SELECT *
+    FROM training_phases
+    WHERE athlete_id = $1 AND (completed IS NULL OR completed = false)
+    ORDER BY start_date DESC
+    LIMIT 1
+)
+SELECT
+    (SELECT json_build_object(
+        'athlete_id', id,
+        'name', name,
+        'ftp', ftp,
+        'weight_kg', COALESCE(strava_weight_kg, 0),
+        'wkg', CASE WHEN COALESCE(strava_weight_kg, 0) > 0
+                    THEN ROUND(ftp::numeric / strava_weight_kg, 2) ELSE 0 END,
+        'training_phase', training_phase,
+        'strava_profile_synced', strava_profile_synced_at IS NOT NULL,
+        'power_zones', strava_power_zones,
+        'heart_rate_zones', strava_heart_rate_zones
+    ) FROM athlete) AS capabilities,
+    (SELECT json_build_object(
+        'training_goal', COALESCE(training_goal, 'Not specified'),
+        'weekly_hours_available', COALESCE(weekly_hours_available, 0),
+        'target_event_type', target_event_type,
+        'target_event_date', target_event_date,
+        'target_event_distance_km', target_event_distance_km,
+        'weeks_to_event', weeks_to_event,
+        'target_ftp_watts', target_ftp_watts,
+        'target_weight_kg', target_weight_kg
+    ) FROM athlete) AS goals,
+    json_build_object(
+        'recent_rides', COALESCE((
+            SELECT json_agg(json_build_object(
+                'date', r.ride_date,
+                'title', r.title,
+                'duration_minutes', r.duration_min,
+                'tss', r.tss,
+                'avg_power', r.avg_power_watts,
+                'avg_heart_rate', r.avg_heart_rate,
+                'ftp_percentage', CASE WHEN r.avg_power_watts IS NOT NULL
+                    THEN ROUND(r.avg_power_watts::numeric
+                               / NULLIF((SELECT COALESCE(athlete_ftp, strava_ftp, $5) FROM athlete), 0) * 100, 1)
+                    END,
+                'time_in_power_zones', r.time_in_power_zones,
+                'time_in_heart_rate_zones', r.time_in_heart_rate_zones
+            ) ORDER BY r.ride_date DESC)
+            FROM recent r
+        ), '[]'::json),
+        'summary', (SELECT json_build_object(
+            'total_rides', total_rides,
+            'total_tss', total_tss,
+            'avg_tss_per_ride', avg_tss,
+            'avg_power', avg_power,
+            'days_with_rides', days_with_rides,
+            'analysis_date', $2::date
+        ) FROM summary)
+    ) AS training_load,
+    (SELECT json_build_object(
+        'phase_name', phase_name,
+        'focus', focus,
+        'duration_weeks', duration_weeks,
+        'start_date', start_date,
+        'days_until_start', GREATEST(0, start_date - $2::date),
+        'has_started', $2::date >= start_date,
+        'current_week', CASE WHEN $2::date >= start_date
+                             THEN FLOOR(($2::date - start_date) / 7) + 1 ELSE 0 END,
+        'weeks_until_start', CASE WHEN $2::date < start_date
+                                  THEN CEIL((start_date - $2::date) / 7.0) ELSE 0 END,
+        'rationale', rationale,
+        'target_metrics', target_metrics,
+        'phase_status', CASE
+            WHEN $2::date < start_date THEN 'future'
+            WHEN $2::date < start_date + (duration_weeks * INTERVAL '7 days') THEN 'active'
+            ELSE 'completed' END
+    ) FROM phase) AS current_phase
+"""
+
+
+def _json(value: Any) -> Any:
+    return json.loads(value) if isinstance(value, str) else value
+
+
+class ContextService:
+    """Cached chat context snapshots"""
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    async def _build(self, athlete_id: int, as_of: date) -> Optional[Dict[str, Any]]:
+        async with self.manager.pg_pool.acquire() as conn:
+            row = await conn.fetchrow(
+                CONTEXT_SQL, athlete_id, as_of, ContextConfig.LOAD_WINDOW_DAYS,
+                ContextConfig.RECENT_RIDES, ContextConfig.DEFAULT_FTP
+            )
+        if not row or row["capabilities"] is None:
+            return None
+        return {
+            "capabilities": _json(row["capabilities"]),
+            "goals": _json(row["goals"]),
+            "training_load": _json(row["training_load"]),
+            "current_phase": _json(row["current_phase"]),
+        }
+
+    async def get_context(self, athlete_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Snapshot for the chat agent. The DB part is cached until a ride, plan
+        or goal write bumps the version (or the day rolls over); AthleteState
+        comes from its own cache so state updates never invalidate it.
+        """
+        today = date.today()
+        version, snapshot = await self.manager.get_cached_context(athlete_id)
+        cached = snapshot is not None and snapshot.get("as_of") == today.isoformat()
+
+        if not cached:
+            parts = await self._build(athlete_id, today)
+            if parts is None:
+                return None
+            snapshot = {
+                "athlete_id": athlete_id,
+                "version": version,
+                "as_of": today.isoformat(),
+                "built_at": datetime.now().isoformat(),
+                **parts,
+            }
+            # Round-trip through JSON so hits and misses return identical shapes
+            snapshot = json.loads(json.dumps(snapshot, default=json_default))
+            await self.manager.cache_context(athlete_id, snapshot)
+
+        state = await self.manager.get_state(athlete_id)
+        return {
+            **snapshot,
+            "state": state.to_dict() if state else None,
+            "cached": cached,
+        }
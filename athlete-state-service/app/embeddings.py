@@ -0,0 +1,199 @@
+"""
+ChatEmbeddingWorker - embeds new n8n_chat_histories rows into chat_messages
+Tracks a persisted high-water mark on id, so late or overlapping runs can
+neither miss nor double-embed messages (replaces Embed_Chat_Messages).
+Each batch is a prefix of the id sequence: it stops below the first row that
+has not settled yet. Writes lock the watermark row, so replicas racing on
+the same batch serialize and the loser drops its copy.
+"""
+import logging
+import json
+import time
+import asyncio
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingWorkerConfig:
+    """Chat embedding worker configuration"""
+    WATERMARK_NAME = "chat_embeddings"
+    POLL_INTERVAL = 5.0  # seconds between polls when caught up
+    BATCH_SIZE = 256
+    EMBED_CHUNK = 32  # texts per Ollama call
+    EMBED_CONCURRENCY = 4
+    # Ids come from a sequence but commit out of order; a batch ends below
+    # the first row younger than this so a slow transaction can't be skipped
+    SETTLE_SECONDS = 2
+    MAX_BACKOFF = 300  # seconds
+
+
+def chunked(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class ChatEmbeddingWorker:
+    """Background worker that keeps chat_messages embeddings up to date"""
+
+    def __init__(self, manager, embedder):
+        self.manager = manager
+        # Anything with `async embed_batch(texts) -> vectors` (RagRetriever)
+        self.embedder = embedder
+        self._task: Optional[asyncio.Task] = None
+        self.watermark = 0
+        self.head_id = 0
+        self.oldest_pending_at = None
+        self.stats_counters = {
+            "embedded": 0,
+            "skipped": 0,
+            "batches": 0,
+            "failures": 0,
+        }
+        self.last_batch = {"messages": 0, "ms": 0.0, "per_second": 0.0}
+
+    async def initialize(self):
+        if not self.manager.pg_pool:
+            logger.warning("Chat embedding worker disabled (no PostgreSQL)")
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info("Chat embedding worker started")
+
+    async def cleanup(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        lag_seconds = None
+        if self.oldest_pending_at is not None:
+            lag_seconds = round(max(0.0, time.time() - self.oldest_pending_at.timestamp()), 1)
+        return {
+            **self.stats_counters,
+            "watermark": self.watermark,
+            "head_id": self.head_id,
+            "lag_messages": max(0, self.head_id - self.watermark),
+            "lag_seconds": lag_seconds,
+            "last_batch": self.last_batch,
+            "running": self._task is not None and not self._task.done(),
+        }
+
+    async def _run(self):
+        backoff = EmbeddingWorkerConfig.POLL_INTERVAL
+        while True:
+            try:
+                processed = await self.run_once()
+                backoff = EmbeddingWorkerConfig.POLL_INTERVAL
+                if processed >= EmbeddingWorkerConfig.BATCH_SIZE:
+                    continue  # behind: go straight to the next batch
+                await asyncio.sleep(EmbeddingWorkerConfig.POLL_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats_counters["failures"] += 1
+                logger.warning("Chat embedding batch failed, retrying in %.0fs: %s", backoff, e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, EmbeddingWorkerConfig.MAX_BACKOFF)
+
+    async def _fetch_batch(self) -> List[Dict[str, Any]]:
+        async with self.manager.pg_pool.acquire() as conn:
+            self.watermark = await conn.fetchval(
+                "SELECT last_id FROM worker_watermarks WHERE name = $1",
+                EmbeddingWorkerConfig.WATERMARK_NAME
+            ) or 0
+            rows = await conn.fetch("""
+                WITH unsettled AS (
+                    SELECT MIN(id) AS id
+                    FROM n8n_chat_histories
+                    WHERE id > $1
+                      AND created_at >= NOW() - make_interval(secs => $2)
+                )
+                SELECT h.id, h.athlete_id, h.role, h.clean_content AS content, h.created_at
+                FROM n8n_chat_histories h, unsettled u
+                WHERE h.id > $1
+                  AND (u.id IS NULL OR h.id < u.id)
+                ORDER BY h.id
+                LIMIT $3
+            """, self.watermark, EmbeddingWorkerConfig.SETTLE_SECONDS, EmbeddingWorkerConfig.BATCH_SIZE)
+            self.head_id = await conn.fetchval("SELECT COALESCE(MAX(id), 0) FROM n8n_chat_histories")
+        self.oldest_pending_at = rows[0]["created_at"] if rows else None
+        return [dict(r) for r in rows]
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        semaphore = asyncio.Semaphore(EmbeddingWorkerConfig.EMBED_CONCURRENCY)
+
+        async def embed_chunk(chunk):
+            async with semaphore:
+                return await self.embedder.embed_batch(chunk)
+
+        results = await asyncio.gather(
+            *(embed_chunk(c) for c in chunked(texts, EmbeddingWorkerConfig.EMBED_CHUNK))
+        )
+        return [vector for chunk in results for vector in chunk]
+
+    async def run_once(self) -> int:
+        """Embed one batch past the watermark; returns rows consumed"""
+        started = time.perf_counter()
+        rows = await self._fetch_batch()
+        if not rows:
+            return 0
+
+        # Tool / system rows and empty texts only move the watermark forward
+        messages = [
+            r for r in rows
+            if r["athlete_id"] is not None and r["role"] and (r["content"] or "").strip()
+        ]
+        embeddings = await self._embed([m["content"] for m in messages]) if messages else []
+        new_watermark = rows[-1]["id"]
+
+        async with self.manager.pg_pool.acquire() as conn:
+            async with conn.transaction():
+                # Serializes replicas; whoever commits second sees the new mark
+                locked = await conn.fetchval("""
+                    INSERT INTO worker_watermarks (name, last_id)
+                    VALUES ($1, 0)
+                    ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+                    RETURNING last_id
+                """, EmbeddingWorkerConfig.WATERMARK_NAME) or 0
+                messages = [m for m in messages if m["id"] > locked]
+                embeddings = embeddings[len(embeddings) - len(messages):]
+                if messages:
+                    await conn.execute("""
+                        INSERT INTO chat_messages
+                            (athlete_id, role, content, embedding, metadata, created_at, source_id)
+                        SELECT m.athlete_id, m.role, m.content, m.embedding::vector,
+                               jsonb_build_object('athlete_id', m.athlete_id, 'source_id', m.source_id),
+                               m.created_at, m.source_id
+                        FROM unnest($1::int[], $2::text[], $3::text[], $4::text[],
+                                    $5::timestamp[], $6::int[])
+                             AS m(athlete_id, role, content, embedding, created_at, source_id)
+                        ON CONFLICT (source_id) DO NOTHING
+                    """,
+                        [m["athlete_id"] for m in messages],
+                        [m["role"] for m in messages],
+                        [m["content"] for m in messages],
+                        [json.dumps(e) for e in embeddings],
+                        [m["created_at"] for m in messages],
+                        [m["id"] for m in messages]
+                    )
+                await conn.execute("""
+                    UPDATE worker_watermarks SET last_id = $2, updated_at = NOW()
+                    WHERE name = $1 AND last_id < $2
+                """, EmbeddingWorkerConfig.WATERMARK_NAME, new_watermark)
+                new_watermark = max(new_watermark, locked)
+
+        elapsed = time.perf_counter() - started
+        self.watermark = new_watermark
+        if len(rows) < EmbeddingWorkerConfig.BATCH_SIZE:
+            self.oldest_pending_at = None  # caught up
+        self.stats_counters["embedded"] += len(messages)
+        self.stats_counters["skipped"] += len(rows) - len(messages)
+        self.stats_counters["batches"] += 1
+        self.last_batch = {
+            "messages": len(messages),
+            "ms": round(elapsed * 1000, 1),
+            "per_second": round(len(messages) / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        logger.info("Embedded %s chat messages up to id %s in %s ms",
+                    len(messages), new_watermark, self.last_batch["ms"])
+        return len(rows)
@@ -0,0 +1,242 @@
+"""
+FtpEstimator - batch FTP estimation from stored power curves
+Critical power fit and 95% of 20 min best run as array operations over every
+athlete at once; only athletes whose curve changed since their last
+estimate are recomputed.
+"""
+import logging
+import time
+import asyncio
+from datetime import date, datetime
+from typing import Optional, Dict, Any, List, Sequence
+import numpy as np
+
+from power import POWER_CURVE_DURATIONS
+from power_curves import curve_from_db
+
+logger = logging.getLogger(__name__)
+
+
+class FtpConfig:
+    """FTP estimation configuration"""
+    SOURCE = "power_curve"
+    WINDOW_DAYS = 90
+    RECENT_DAYS = 42  # trend compares the last 42 days with the 48 before
+    # Critical power is fit on 3-20 min efforts (hyperbolic model region)
+    CP_MIN_DURATION = 180
+    CP_MAX_DURATION = 1200
+    CP_MIN_POINTS = 3
+    TWENTY_MIN_FACTOR = 0.95
+    TREND_THRESHOLD = 0.03  # 3% change counts as rising / falling
+    MIN_FTP = 50
+    MAX_FTP = 600
+    STATE_UPDATE_CONCURRENCY = 10
+
+
+def fit_critical_power(curves: np.ndarray, durations: np.ndarray = POWER_CURVE_DURATIONS):
+    """
+    Least-squares fit of work = CP * t + W' for every row of `curves`
+    (athletes x durations). Returns (cp, w_prime); NaN where a row has too
+    few efforts or the fit is not physiological.
+    """
+    curves = np.atleast_2d(np.asarray(curves, dtype=np.float64))
+    in_range = (durations >= FtpConfig.CP_MIN_DURATION) & (durations <= FtpConfig.CP_MAX_DURATION)
+    t = durations[in_range].astype(np.float64)
+    power = curves[:, in_range]
+    mask = ~np.isnan(power)
+    work = np.where(mask, power * t, 0.0)
+    t = np.where(mask, t, 0.0)
+
+    n = mask.sum(axis=1)
+    sum_t = t.sum(axis=1)
+    sum_w = work.sum(axis=1)
+    sum_tt = (t * t).sum(axis=1)
+    sum_tw = (t * work).sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = n * sum_tt - sum_t ** 2
+        cp = (n * sum_tw - sum_t * sum_w) / denom
+        w_prime = (sum_w - cp * sum_t) / n
+
+    valid = (n >= FtpConfig.CP_MIN_POINTS) & (denom > 0) & (cp > 0) & (w_prime > 0)
+    return np.where(valid, cp, np.nan), np.where(valid, w_prime, np.nan)
+
+
+def twenty_minute_ftp(curves: np.ndarray, durations: np.ndarray = POWER_CURVE_DURATIONS) -> np.ndarray:
+    """95% of the best 20 minute power (NaN without a 20 minute effort)"""
+    curves = np.atleast_2d(np.asarray(curves, dtype=np.float64))
+    index = int(np.searchsorted(durations, 1200))
+    return curves[:, index] * FtpConfig.TWENTY_MIN_FACTOR
+
+
+def estimate_ftp(curves: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    FTP per row: mean of the CP fit and 95% of 20 min where both exist,
+    otherwise whichever is available
+    """
+    cp, w_prime = fit_critical_power(curves)
+    p20 = twenty_minute_ftp(curves)
+    both = np.vstack([cp, p20])
+    counts = (~np.isnan(both)).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ftp = np.nansum(both, axis=0) / counts
+    ftp = np.where((ftp >= FtpConfig.MIN_FTP) & (ftp <= FtpConfig.MAX_FTP), ftp, np.nan)
+    return {"ftp": ftp, "cp": cp, "w_prime": w_prime, "p20": p20}
+
+
+def detect_trend(recent: np.ndarray, prior: np.ndarray) -> np.ndarray:
+    """'rising' / 'falling' / 'stable', or 'unknown' when either side is missing"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = (recent - prior) / prior
+    trend = np.full(len(recent), "unknown", dtype=object)
+    known = ~np.isnan(change)
+    trend[known] = "stable"
+    trend[known & (change >= FtpConfig.TREND_THRESHOLD)] = "rising"
+    trend[known & (change <= -FtpConfig.TREND_THRESHOLD)] = "falling"
+    return trend
+
+
+def _reason(cp: float, w_prime: float, p20: float, trend: str, days: int) -> str:
+    parts = []
+    if not np.isnan(cp):
+        parts.append(f"CP {cp:.0f} W (W' {w_prime / 1000:.1f} kJ)")
+    if not np.isnan(p20):
+        parts.append(f"95% of 20 min {p20:.0f} W")
+    parts.append(f"trend {trend}")
+    parts.append(f"{days} days with power in the last {FtpConfig.WINDOW_DAYS}")
+    return "; ".join(parts)
+
+
+class FtpEstimator:
+    """Nightly / on-demand FTP review over all athletes with power curves"""
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    async def _changed_athletes(self, conn, athlete_ids: Optional[List[int]], force: bool) -> List[int]:
+        """
+        Athletes whose curve was raised after their last review. Every
+        reviewed athlete gets a watermark, including those without an
+        estimate, so they are not recomputed on every run.
+        """
+        rows = await conn.fetch("""
+            SELECT c.athlete_id
+            FROM athlete_power_curves c
+            LEFT JOIN athlete_ftp_reviews r ON r.athlete_id = c.athlete_id
+            WHERE ($1::int[] IS NULL OR c.athlete_id = ANY($1::int[]))
+            GROUP BY c.athlete_id, r.reviewed_at
+            HAVING $2 OR r.reviewed_at IS NULL OR MAX(c.updated_at) > r.reviewed_at
+        """, athlete_ids, force)
+        return [r["athlete_id"] for r in rows]
+
+    async def _mark_reviewed(self, conn, athlete_ids: List[int], reviewed_at: datetime):
+        await conn.execute("""
+            INSERT INTO athlete_ftp_reviews (athlete_id, reviewed_at)
+            SELECT unnest($1::int[]), $2
+            ON CONFLICT (athlete_id) DO UPDATE SET reviewed_at = EXCLUDED.reviewed_at
+        """, athlete_ids, reviewed_at)
+
+    async def _load_windows(self, conn, athlete_ids: List[int], as_of: date) -> List[Dict[str, Any]]:
+        """Recent and prior window curves (plus contributing ride counts) in one query"""
+        rows = await conn.fetch("""
+            WITH curves AS (
+                SELECT athlete_id,
+                       power_curve_max_agg(curve) FILTER (WHERE curve_date > $2::date - $3::int) AS recent,
+                       power_curve_max_agg(curve) FILTER (WHERE curve_date <= $2::date - $3::int) AS prior,
+                       COUNT(*)::int AS days
+                FROM athlete_power_curves
+                WHERE athlete_id = ANY($1::int[])
+                  AND curve_date > $2::date - $4::int
+                  AND curve_date <= $2::date
+                GROUP BY athlete_id
+            ),
+            ride_counts AS (
+                SELECT athlete_id, COUNT(*)::int AS rides
+                FROM rides
+                WHERE athlete_id = ANY($1::int[])
+                  AND ride_date::date > $2::date - $4::int
+                  AND ride_date::date <= $2::date
+                  AND np_watts IS NOT NULL
+                GROUP BY athlete_id
+            )
+            SELECT c.*, COALESCE(r.rides, 0) AS rides
+            FROM curves c
+            LEFT JOIN ride_counts r ON r.athlete_id = c.athlete_id
+            ORDER BY c.athlete_id
+        """, athlete_ids, as_of, FtpConfig.RECENT_DAYS, FtpConfig.WINDOW_DAYS)
+        return [dict(r) for r in rows]
+
+    async def run(self, athlete_ids: Optional[List[int]] = None, force: bool = False,
+                  as_of: Optional[date] = None) -> Dict[str, Any]:
+        """Estimate FTP for every changed athlete and store the suggestions"""
+        started = time.perf_counter()
+        as_of = as_of or date.today()
+        # Taken before reading curves, so one raised mid-run is seen next run
+        reviewed_at = datetime.now()
+
+        async with self.manager.pg_pool.acquire() as conn:
+            candidates = await self._changed_athletes(conn, athlete_ids, force)
+            rows = await self._load_windows(conn, candidates, as_of) if candidates else []
+            if candidates:
+                await self._mark_reviewed(conn, candidates, reviewed_at)
+
+        if not rows:
+            return {"candidates": len(candidates), "estimated": 0, "suggestions": [],
+                    "state_updates": 0, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+        recent = np.vstack([curve_from_db(r["recent"]) for r in rows])
+        prior = np.vstack([curve_from_db(r["prior"]) for r in rows])
+        with np.errstate(invalid="ignore"):
+            best = np.fmax(recent, prior)
+
+        overall = estimate_ftp(best)
+        trend = detect_trend(estimate_ftp(recent)["ftp"], estimate_ftp(prior)["ftp"])
+
+        suggestions = []
+        for i, row in enumerate(rows):
+            ftp = overall["ftp"][i]
+            if np.isnan(ftp):
+                continue
+            suggestions.append({
+                "athlete_id": row["athlete_id"],
+                "ftp_watts": int(round(ftp)),
+                "rides_used": row["rides"],
+                "source": FtpConfig.SOURCE,
+                "reason": _reason(overall["cp"][i], overall["w_prime"][i], overall["p20"][i],
+                                  trend[i], row["days"]),
+                "trend": trend[i],
+            })
+
+        if suggestions:
+            async with self.manager.pg_pool.acquire() as conn:
+                await conn.copy_records_to_table(
+                    "athlete_ftp_suggestions",
+                    records=[(s["athlete_id"], s["ftp_watts"], s["rides_used"], s["source"], s["reason"])
+                             for s in suggestions],
+                    columns=["athlete_id", "ftp_watts", "rides_used", "source", "reason"]
+                )
+
+        state_updates = await self._update_states(suggestions)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("FTP review: %s changed athletes, %s suggestions in %s ms",
+                    len(candidates), len(suggestions), elapsed_ms)
+
+        return {
+            "candidates": len(candidates),
+            "estimated": len(suggestions),
+            "suggestions": suggestions,
+            "state_updates": state_updates,
+            "elapsed_ms": elapsed_ms,
+        }
+
+    async def _update_states(self, suggestions: Sequence[Dict[str, Any]]) -> int:
+        semaphore = asyncio.Semaphore(FtpConfig.STATE_UPDATE_CONCURRENCY)
+
+        async def update(suggestion):
+            async with semaphore:
+                return await self.manager.update_state(
+                    suggestion["athlete_id"], {"current_ftp": suggestion["ftp_watts"]}
+                )
+
+        results = await asyncio.gather(*(update(s) for s in suggestions), return_exceptions=True)
+        return sum(1 for r in results if r is True)
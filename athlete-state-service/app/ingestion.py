@@ -0,0 +1,253 @@
+"""
+StravaIngestionService - webhook events acknowledged immediately, coalesced
+per activity and processed by background workers
+"""
+import logging
+import json
+import time
+import asyncio
+from typing import Optional, Dict, Any, Tuple
+
+from strava import (
+    StravaClient, StravaRateLimited, StravaAuthError, StravaConfig,
+    transform_activity, ride_values, UPSERT_RIDE_SQL
+)
+from power import analyze_ride, zone_edges_from_strava
+from power_curves import PowerCurveStore
+from tokens import StravaTokenManager
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionConfig:
+    """Webhook ingestion configuration"""
+    WORKER_COUNT = 4
+    # Events for the same activity within this window collapse into one fetch
+    COALESCE_WINDOW = 10.0  # seconds
+    MAX_BUFFERED = 10000
+    MAX_ATTEMPTS = 5
+    RETRY_DELAY = 30.0  # seconds, for non rate-limit failures
+
+
+class StravaIngestionService:
+    """Queue-backed processing of Strava webhook events"""
+
+    def __init__(self, manager, strava_client: Optional[StravaClient] = None,
+                 power_curves: Optional[PowerCurveStore] = None,
+                 tokens: Optional[StravaTokenManager] = None):
+        self.manager = manager
+        self.strava = strava_client or StravaClient()
+        self.power_curves = power_curves or PowerCurveStore(manager)
+        # Access tokens come from the token manager's Redis cache, not athletes
+        self._owns_tokens = tokens is None
+        self.tokens = tokens or StravaTokenManager(manager)
+        # (object_type, object_id) -> [event, due_at, attempts]
+        self._buffer: Dict[Tuple[str, int], list] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.stats_counters = {
+            "received": 0,
+            "coalesced": 0,
+            "ignored": 0,
+            "processed": 0,
+            "failed": 0,
+            "retried": 0,
+            "curves_raised": 0,
+        }
+
+    async def initialize(self):
+        await self.strava.initialize()
+        if self._owns_tokens:
+            await self.tokens.initialize()
+        self._queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._tasks.append(asyncio.create_task(self._release_loop()))
+        for _ in range(IngestionConfig.WORKER_COUNT):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        logger.info("Strava ingestion started (%s workers)", IngestionConfig.WORKER_COUNT)
+
+    async def cleanup(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._buffer:
+            logger.warning("Dropping %s buffered Strava events on shutdown", len(self._buffer))
+        await self.strava.cleanup()
+        if self._owns_tokens:
+            await self.tokens.cleanup()
+
+    # ---------- webhook side ----------
+
+    def accept_event(self, event: Dict[str, Any]) -> bool:
+        """
+        Record a webhook event without doing any I/O.
+        Returns False if the event is ignored (non-activity or malformed).
+        """
+        self.stats_counters["received"] += 1
+
+        object_type = str(event.get("object_type", "")).strip().lower()
+        aspect_type = str(event.get("aspect_type", "")).strip().lower()
+        try:
+            object_id = int(event["object_id"])
+            owner_id = int(event["owner_id"])
+        except (KeyError, TypeError, ValueError):
+            self.stats_counters["ignored"] += 1
+            return False
+
+        if object_type != "activity" or aspect_type not in ("create", "update", "delete"):
+            self.stats_counters["ignored"] += 1
+            return False
+
+        key = (object_type, object_id)
+        normalized = {
+            "object_type": object_type,
+            "aspect_type": aspect_type,
+            "object_id": object_id,
+            "owner_id": owner_id,
+            "event_time": event.get("event_time"),
+        }
+
+        entry = self._buffer.get(key)
+        if entry:
+            # Keep the newest aspect; a create followed by updates is still one fetch
+            entry[0] = normalized
+            self.stats_counters["coalesced"] += 1
+            return True
+
+        if len(self._buffer) >= IngestionConfig.MAX_BUFFERED:
+            raise OverflowError("Strava ingestion buffer is full")
+
+        self._buffer[key] = [normalized, time.monotonic() + IngestionConfig.COALESCE_WINDOW, 0]
+        self._wakeup.set()
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            "buffered": len(self._buffer),
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
+
+    # ---------- background side ----------
+
+    async def _release_loop(self):
+        """Move events whose coalescing window has passed onto the work queue"""
+        while True:
+            if not self._buffer:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            now = time.monotonic()
+            next_due = None
+            for key, (event, due_at, attempts) in list(self._buffer.items()):
+                if due_at <= now:
+                    del self._buffer[key]
+                    self._queue.put_nowait((event, attempts))
+                elif next_due is None or due_at < next_due:
+                    next_due = due_at
+
+            if next_due is not None:
+                await asyncio.sleep(max(0.05, next_due - now))
+
+    def _schedule_retry(self, event: Dict[str, Any], attempts: int, delay: float):
+        key = (event["object_type"], event["object_id"])
+        if key in self._buffer:
+            # A newer event arrived meanwhile; it will trigger its own fetch
+            return
+        self.stats_counters["retried"] += 1
+        self._buffer[key] = [event, time.monotonic() + delay, attempts]
+        self._wakeup.set()
+
+    async def _worker(self):
+        while True:
+            event, attempts = await self._queue.get()
+            try:
+                await self._process(event)
+                self.stats_counters["processed"] += 1
+            except StravaRateLimited as e:
+                logger.warning("%s; activity %s re-queued", e, event['object_id'])
+                self._schedule_retry(event, attempts, e.retry_after)
+            except StravaAuthError as e:
+                logger.error("%s; activity %s dropped", e, event['object_id'])
+                self.stats_counters["failed"] += 1
+            except Exception as e:
+                attempts += 1
+                if attempts < IngestionConfig.MAX_ATTEMPTS:
+                    logger.warning("Strava event failed (%s), retry %s", e, attempts)
+                    self._schedule_retry(event, attempts, IngestionConfig.RETRY_DELAY * attempts)
+                else:
+                    logger.error("Strava event for activity %s failed: %s", event['object_id'], e)
+                    self.stats_counters["failed"] += 1
+            finally:
+                self._queue.task_done()
+
+    async def _load_athlete(self, strava_athlete_id: int) -> Optional[Dict[str, Any]]:
+        async with self.manager.pg_pool.acquire() as conn:
+            row = await conn.fetchrow("""
+                SELECT id, strava_ftp, strava_power_zones, strava_heart_rate_zones
+                FROM athletes
+                WHERE strava_athlete_id = $1
+            """, strava_athlete_id)
+        return dict(row) if row else None
+
+    @staticmethod
+    def _athlete_zone_edges(athlete: Dict[str, Any], column: str):
+        zones = athlete.get(column)
+        if isinstance(zones, str):
+            zones = json.loads(zones)
+        if isinstance(zones, dict):
+            return zone_edges_from_strava(zones.get("zones") or [])
+        return None
+
+    def _analyze_streams(self, athlete: Dict[str, Any], streams: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not streams.get("watts") and not streams.get("heartrate"):
+            return None
+        return analyze_ride(
+            watts=streams.get("watts"),
+            heart_rate=streams.get("heartrate"),
+            time=streams.get("time"),
+            ftp=athlete.get("strava_ftp") or StravaConfig.DEFAULT_FTP,
+            power_zone_edges=self._athlete_zone_edges(athlete, "strava_power_zones"),
+            hr_zone_edges=self._athlete_zone_edges(athlete, "strava_heart_rate_zones")
+        )
+
+    async def _process(self, event: Dict[str, Any]):
+        if event["aspect_type"] == "delete":
+            # Rides can be referenced by planned_workouts, so deletes are only logged
+            logger.info("Strava activity %s deleted upstream, keeping ride", event['object_id'])
+            return
+
+        athlete = await self._load_athlete(event["owner_id"])
+        access_token = await self.tokens.get_access_token(athlete["id"]) if athlete else None
+        if not access_token:
+            logger.warning("No connected athlete for Strava owner %s", event['owner_id'])
+            self.stats_counters["ignored"] += 1
+            return
+
+        try:
+            activity, zones, streams = await self.strava.get_activity_bundle(
+                athlete["id"], access_token, event["object_id"]
+            )
+        except StravaAuthError:
+            # A token revoked or refreshed elsewhere: the next lookup re-reads it
+            await self.tokens.forget(athlete["id"])
+            raise
+        analysis = self._analyze_streams(athlete, streams)
+        if analysis and analysis.get("invalid_streams"):
+            logger.warning("Skipping stream analytics for activity %s: %s",
+                           event['object_id'], analysis["invalid_streams"])
+        ride = transform_activity(activity, zones, athlete["id"], athlete.get("strava_ftp"), analysis)
+
+        async with self.manager.pg_pool.acquire() as conn:
+            ride_id = await conn.fetchval(UPSERT_RIDE_SQL, *ride_values(ride))
+            if analysis and analysis.get("has_power"):
+                raised = await self.power_curves.merge_ride(
+                    athlete["id"], ride["ride_date"], analysis["power_curve"], conn=conn
+                )
+                if raised:
+                    self.stats_counters["curves_raised"] += 1
+        await self.manager.invalidate_context(athlete["id"])
+
+        logger.info("Upserted ride %s from Strava activity %s", ride_id, event['object_id'])
@@ -0,0 +1,121 @@
+"""
+CacheInvalidationListener - drops Redis caches when PostgreSQL rows change
+n8n workflows write planned_workouts, rides and athlete goals directly,
+bypassing this service's own invalidation calls. Triggers (migrations/010
+and 012) pg_notify the affected athlete (and calendar month) on every
+write, and this listener invalidates the cache. Every notification
+(including plan_generation_jobs progress, migrations/013) is also handed to
+on_event, which feeds the progress streams.
+Identical notifications within one transaction are collapsed by
+PostgreSQL, so a bulk plan insert costs one message per month.
+"""
+import json
+import asyncio
+import logging
+from datetime import date
+from typing import Optional, Dict, Any, Set, Callable
+import asyncpg
+
+from managers import DatabaseConfig
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidationConfig:
+    """Cache invalidation listener configuration"""
+    CHANNEL = "athlete_cache"
+    RECONNECT_DELAY = 5  # seconds
+
+
+def parse_month(value: Optional[str]) -> Optional[date]:
+    """'YYYY-MM' -> first day of that month"""
+    if not value:
+        return None
+    try:
+        year, month = value.split("-")[:2]
+        return date(int(year), int(month), 1)
+    except ValueError:
+        return None
+
+
+class CacheInvalidationListener:
+    """LISTENs on a dedicated connection and invalidates caches per notification"""
+
+    def __init__(self, manager, on_event: Optional[Callable[[int, Dict[str, Any]], None]] = None):
+        self.manager = manager
+        # Called with (athlete_id, event) for every valid notification
+        self.on_event = on_event
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+        self.received = 0
+        self.connected = False
+
+    async def initialize(self):
+        if not self.manager.pg_pool:
+            logger.warning("Cache invalidation listener disabled (no PostgreSQL)")
+            return
+        self._task = asyncio.create_task(self._listen())
+
+    async def cleanup(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def _listen(self):
+        """Hold a LISTEN connection open, reconnecting after failures"""
+        while True:
+            conn = None
+            try:
+                # Not a pool connection: LISTEN must outlive any single request
+                conn = await asyncpg.connect(DatabaseConfig.POSTGRES_DSN)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(InvalidationConfig.CHANNEL, self._on_notify)
+                self.connected = True
+                logger.info("Listening for cache invalidations on %s", InvalidationConfig.CHANNEL)
+                await lost.wait()
+                logger.warning("Cache invalidation connection lost, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Cache invalidation listener error: %s", e)
+            finally:
+                self.connected = False
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(InvalidationConfig.RECONNECT_DELAY)
+
+    def _on_notify(self, conn, pid, channel, payload: str):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed cache invalidation: %s", payload[:200])
+            return
+        task = asyncio.ensure_future(self.handle(event))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def handle(self, event: Dict[str, Any]):
+        """Apply one notification: {"scope": "calendar" | "context" | "job", "athlete_id": ..., ...}"""
+        try:
+            athlete_id = int(event["athlete_id"])
+        except (KeyError, TypeError, ValueError):
+            return
+        self.received += 1
+        if event.get("scope") == "calendar":
+            month = parse_month(event.get("month"))
+            if month:
+                await self.manager.invalidate_calendar(athlete_id, [month])
+        elif event.get("scope") == "context":
+            await self.manager.invalidate_context(athlete_id)
+        if self.on_event:
+            self.on_event(athlete_id, event)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "received": self.received,
+            "in_flight": len(self._pending),
+        }
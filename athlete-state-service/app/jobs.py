@@ -0,0 +1,539 @@
+"""
+PlanJobManager - queued plan generation on a bounded asyncio worker pool
+Jobs are de-duplicated per athlete, scheduled round-robin across athletes
+and persisted to plan_generation_jobs so clients can poll a real status
+"""
+import logging
+import os
+import json
+import uuid
+import socket
+import asyncio
+import hashlib
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Deque, Callable, Awaitable
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class JobConfig:
+    """Job subsystem configuration"""
+    N8N_GENERATE_URL = "http://n8n:5678/webhook/generate-plan"
+    WORKER_COUNT = 2
+    MAX_PENDING = 1000
+    JOB_TIMEOUT = 600  # seconds; plan generation takes 60-300s
+    MAX_ATTEMPTS = 3
+    RETRY_BASE_DELAY = 30  # seconds, doubled per attempt
+    RETRY_MAX_DELAY = 600
+    KEEP_FINISHED = 500  # finished jobs kept in memory for fast polling
+    # Live jobs are leased to the replica holding them in memory; another
+    # replica reclaims them only once the heartbeat is older than the lease
+    HEARTBEAT_INTERVAL = 30  # seconds
+    LEASE_TIMEOUT = 120
+    WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff after the given number of failed attempts"""
+    return min(JobConfig.RETRY_MAX_DELAY, JobConfig.RETRY_BASE_DELAY * 2 ** max(0, attempts - 1))
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Only retry when the request never reached n8n. Plan generation is not
+    idempotent: after a read timeout or an error response the workflow may
+    already have saved a plan, and a retry would create a second one.
+    """
+    return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+
+
+def dedupe_key(params: Dict[str, Any]) -> str:
+    """Stable hash of the request params"""
+    canonical = json.dumps(params or {}, sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class PlanJob:
+    """A single plan generation request"""
+    athlete_id: int
+    params: Dict[str, Any] = field(default_factory=dict)
+    id: uuid.UUID = field(default_factory=uuid.uuid4)
+    status: str = "queued"
+    progress: int = 0
+    message: str = "Queued"
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    next_attempt_at: Optional[datetime] = None
+    locked_by: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    updated_at: datetime = field(default_factory=datetime.now)
+
+    @property
+    def dedupe_key(self) -> str:
+        return dedupe_key(self.params)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization"""
+        return {
+            "job_id": str(self.id),
+            "athlete_id": self.athlete_id,
+            "status": self.status,
+            "complete": self.status == "completed",
+            "progress": self.progress,
+            "message": self.message,
+            "params": self.params,
+            "result": self.result,
+            "error": self.error,
+            "attempts": self.attempts,
+            "next_attempt_at": self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "updated_at": self.updated_at.isoformat()
+        }
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "PlanJob":
+        """Create from a plan_generation_jobs row"""
+        params = row.get("params") or {}
+        result = row.get("result")
+        if isinstance(params, str):
+            params = json.loads(params)
+        if isinstance(result, str):
+            result = json.loads(result)
+        return cls(
+            id=row["id"],
+            athlete_id=row["athlete_id"],
+            params=params,
+            status=row["status"],
+            progress=row.get("progress") or 0,
+            message=row.get("message") or "",
+            result=result,
+            error=row.get("error"),
+            attempts=row.get("attempts") or 0,
+            next_attempt_at=row.get("next_attempt_at"),
+            locked_by=row.get("locked_by"),
+            created_at=row.get("created_at") or datetime.now(),
+            started_at=row.get("started_at"),
+            finished_at=row.get("finished_at"),
+            updated_at=row.get("updated_at") or datetime.now()
+        )
+
+
+class PlanJobManager:
+    """Bounded worker pool for plan generation jobs"""
+
+    def __init__(self, worker_count: int = JobConfig.WORKER_COUNT,
+                 on_complete: Optional[Callable[[PlanJob], Awaitable[None]]] = None,
+                 on_update: Optional[Callable[[PlanJob], None]] = None):
+        self.worker_count = worker_count
+        # Called after a job completes, e.g. to drop caches of the new plan
+        self.on_complete = on_complete
+        # Called on every status / progress change, e.g. to push it to clients
+        self.on_update = on_update
+        self.pg_pool = None
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self._jobs: "OrderedDict[uuid.UUID, PlanJob]" = OrderedDict()
+        # athlete_id -> pending job ids; dict order is the round-robin order
+        self._pending: "OrderedDict[int, Deque[uuid.UUID]]" = OrderedDict()
+        self._running_athletes: Dict[int, uuid.UUID] = {}
+        self._tasks: Dict[uuid.UUID, asyncio.Task] = {}
+        self._workers: List[asyncio.Task] = []
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._retry_timers: Dict[uuid.UUID, asyncio.TimerHandle] = {}
+        self._wakeup: Optional[asyncio.Condition] = None
+
+    async def initialize(self, pg_pool):
+        """Start workers and reclaim jobs whose owner stopped heartbeating"""
+        self.pg_pool = pg_pool
+        self.http_client = httpx.AsyncClient(timeout=JobConfig.JOB_TIMEOUT)
+        self._wakeup = asyncio.Condition()
+
+        await self._reclaim_jobs()
+
+        for index in range(self.worker_count):
+            self._workers.append(asyncio.create_task(self._worker(index)))
+        if self.pg_pool:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        logger.info("Plan job workers started (%s)", self.worker_count)
+
+    async def cleanup(self):
+        """Stop workers and release this replica's live jobs for others to take"""
+        tasks = self._workers + ([self._heartbeat] if self._heartbeat else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._heartbeat = None
+        for timer in self._retry_timers.values():
+            timer.cancel()
+        self._retry_timers.clear()
+        await self._release_jobs()
+
+        if self.http_client:
+            await self.http_client.aclose()
+            self.http_client = None
+
+    # ---------- public API ----------
+
+    async def enqueue(self, athlete_id: int, params: Optional[Dict[str, Any]] = None) -> PlanJob:
+        """Queue a generation job, or return the live job for an identical request"""
+        params = params or {}
+        key = dedupe_key(params)
+
+        existing = self._find_active(athlete_id, key)
+        if existing:
+            logger.info("Reusing job %s for athlete %s", existing.id, athlete_id)
+            return existing
+
+        if self.pending_count() >= JobConfig.MAX_PENDING:
+            raise OverflowError("Plan generation queue is full, try again later")
+
+        job = PlanJob(athlete_id=athlete_id, params=params, locked_by=JobConfig.WORKER_ID)
+        persisted = await self._insert_job(job)
+        if persisted is not job:
+            # Another replica queued the same request first
+            return persisted
+
+        self._remember(job)
+        await self._push_pending(job)
+        logger.info("Queued plan job %s for athlete %s", job.id, athlete_id)
+        return job
+
+    async def get_job(self, job_id: uuid.UUID) -> Optional[PlanJob]:
+        """Job by id, from memory or PostgreSQL"""
+        job = self._jobs.get(job_id)
+        if job:
+            return job
+        if not self.pg_pool:
+            return None
+        async with self.pg_pool.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT * FROM plan_generation_jobs WHERE id = $1", job_id
+            )
+        return PlanJob.from_row(dict(row)) if row else None
+
+    async def latest_job(self, athlete_id: int) -> Optional[PlanJob]:
+        """Most recent job for an athlete"""
+        in_memory = [j for j in self._jobs.values() if j.athlete_id == athlete_id]
+        if in_memory:
+            return max(in_memory, key=lambda j: j.created_at)
+        if not self.pg_pool:
+            return None
+        async with self.pg_pool.acquire() as conn:
+            row = await conn.fetchrow("""
+                SELECT * FROM plan_generation_jobs
+                WHERE athlete_id = $1
+                ORDER BY created_at DESC
+                LIMIT 1
+            """, athlete_id)
+        return PlanJob.from_row(dict(row)) if row else None
+
+    async def cancel(self, job_id: uuid.UUID) -> Optional[PlanJob]:
+        """Cancel a queued or running job"""
+        job = await self.get_job(job_id)
+        if not job or job.status not in ACTIVE_STATUSES:
+            return job
+
+        pending = self._pending.get(job.athlete_id)
+        if pending and job.id in pending:
+            pending.remove(job.id)
+            if not pending:
+                del self._pending[job.athlete_id]
+
+        job.status = "cancelled"
+        timer = self._retry_timers.pop(job.id, None)
+        if timer:
+            timer.cancel()
+        task = self._tasks.get(job.id)
+        if task:
+            task.cancel()
+
+        await self._finish(job, "cancelled", message="Cancelled")
+        return job
+
+    async def report_progress(self, job_id: uuid.UUID, progress: int, message: Optional[str] = None) -> Optional[PlanJob]:
+        """Progress callback used by the generation workflow"""
+        job = await self.get_job(job_id)
+        if not job or job.status != "running":
+            return job
+        job.progress = max(0, min(99, int(progress)))
+        if message:
+            job.message = message
+        await self._persist(job)
+        return job
+
+    def pending_count(self) -> int:
+        return sum(len(q) for q in self._pending.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and worker utilisation"""
+        return {
+            "workers": self.worker_count,
+            "running": len(self._running_athletes),
+            "pending": self.pending_count(),
+            "athletes_waiting": len(self._pending)
+        }
+
+    # ---------- scheduling ----------
+
+    def _find_active(self, athlete_id: int, key: str) -> Optional[PlanJob]:
+        for job in self._jobs.values():
+            if (job.athlete_id == athlete_id and job.status in ACTIVE_STATUSES
+                    and job.dedupe_key == key):
+                return job
+        return None
+
+    def _remember(self, job: PlanJob):
+        self._jobs[job.id] = job
+        # Trim finished jobs, oldest first
+        finished = [j.id for j in self._jobs.values() if j.status in FINISHED_STATUSES]
+        for old_id in finished[:max(0, len(finished) - JobConfig.KEEP_FINISHED)]:
+            del self._jobs[old_id]
+
+    async def _push_pending(self, job: PlanJob):
+        self._pending.setdefault(job.athlete_id, deque()).append(job.id)
+        async with self._wakeup:
+            self._wakeup.notify()
+
+    def _schedule(self, job: PlanJob):
+        """Queue a job now, or once its retry backoff has elapsed"""
+        delay = (job.next_attempt_at - datetime.now()).total_seconds() if job.next_attempt_at else 0
+        if delay <= 0:
+            asyncio.ensure_future(self._push_pending(job))
+            return
+
+        def _due():
+            self._retry_timers.pop(job.id, None)
+            if job.status == "queued":
+                asyncio.ensure_future(self._push_pending(job))
+
+        self._retry_timers[job.id] = asyncio.get_running_loop().call_later(delay, _due)
+
+    def _next_job(self) -> Optional[PlanJob]:
+        """
+        Round-robin over athletes: take the first athlete without a running
+        job, then move it to the back so one athlete cannot starve the rest
+        """
+        for athlete_id in list(self._pending.keys()):
+            if athlete_id in self._running_athletes:
+                continue
+            queue = self._pending.pop(athlete_id)
+            job_id = queue.popleft()
+            if queue:
+                self._pending[athlete_id] = queue
+            job = self._jobs.get(job_id)
+            if job and job.status == "queued":
+                return job
+        return None
+
+    async def _worker(self, index: int):
+        while True:
+            async with self._wakeup:
+                job = self._next_job()
+                while job is None:
+                    await self._wakeup.wait()
+                    job = self._next_job()
+                self._running_athletes[job.athlete_id] = job.id
+
+            task = asyncio.create_task(self._run(job))
+            self._tasks[job.id] = task
+            try:
+                await task
+            except asyncio.CancelledError:
+                # A cancelled job is fine; a cancelled worker must stop
+                if job.status != "cancelled":
+                    raise
+            finally:
+                self._tasks.pop(job.id, None)
+                self._running_athletes.pop(job.athlete_id, None)
+                async with self._wakeup:
+                    # The athlete may have more jobs waiting behind this one
+                    self._wakeup.notify_all()
+
+    async def _run(self, job: PlanJob):
+        job.status = "running"
+        job.attempts += 1
+        job.progress = 5
+        job.message = "Generating training plan..."
+        job.started_at = datetime.now()
+        await self._persist(job)
+        logger.info("Running plan job %s for athlete %s", job.id, job.athlete_id)
+
+        try:
+            response = await self.http_client.post(
+                JobConfig.N8N_GENERATE_URL,
+                json={"athlete_id": job.athlete_id, "job_id": str(job.id), **job.params}
+            )
+            response.raise_for_status()
+            try:
+                result = response.json()
+            except ValueError:
+                result = {"raw": response.text[:1000]}
+            await self._finish(job, "completed", message="Training plan created", result=result)
+            logger.info("Plan job %s completed", job.id)
+            if self.on_complete:
+                try:
+                    await self.on_complete(job)
+                except Exception as e:
+                    logger.warning("Plan job %s completion hook failed: %s", job.id, e)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if is_retryable(e) and job.attempts < JobConfig.MAX_ATTEMPTS:
+                delay = retry_delay(job.attempts)
+                logger.warning("Plan job %s failed, retrying in %.0fs: %s", job.id, delay, e)
+                job.status = "queued"
+                job.message = "Retrying..."
+                job.next_attempt_at = datetime.now() + timedelta(seconds=delay)
+                await self._persist(job)
+                self._schedule(job)
+            else:
+                logger.error("Plan job %s failed: %s", job.id, e)
+                await self._finish(job, "failed", message="Plan generation failed", error=str(e))
+
+    async def _finish(self, job: PlanJob, status: str, message: str,
+                      result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        job.status = status
+        job.message = message
+        job.result = result
+        job.error = error
+        if status == "completed":
+            job.progress = 100
+        job.finished_at = datetime.now()
+        await self._persist(job)
+
+    # ---------- persistence ----------
+
+    async def _insert_job(self, job: PlanJob) -> PlanJob:
+        """Insert a new job; returns the already-live job on a dedupe conflict"""
+        if not self.pg_pool:
+            return job
+        try:
+            async with self.pg_pool.acquire() as conn:
+                inserted = await conn.fetchval("""
+                    INSERT INTO plan_generation_jobs
+                    (id, athlete_id, status, progress, message, params, dedupe_key,
+                     locked_by, heartbeat_at, created_at, updated_at)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, NOW(), $9, $9)
+                    ON CONFLICT (athlete_id, dedupe_key) WHERE status IN ('queued', 'running')
+                    DO NOTHING
+                    RETURNING id
+                """, job.id, job.athlete_id, job.status, job.progress, job.message,
+                    json.dumps(job.params, default=str), job.dedupe_key, job.locked_by, job.created_at)
+                if inserted:
+                    return job
+                row = await conn.fetchrow("""
+                    SELECT * FROM plan_generation_jobs
+                    WHERE athlete_id = $1 AND dedupe_key = $2
+                      AND status IN ('queued', 'running')
+                """, job.athlete_id, job.dedupe_key)
+                return PlanJob.from_row(dict(row)) if row else job
+        except Exception as e:
+            logger.warning("Failed to persist job, keeping in memory: %s", e)
+            return job
+
+    async def _persist(self, job: PlanJob):
+        job.updated_at = datetime.now()
+        if self.on_update:
+            self.on_update(job)
+        if not self.pg_pool:
+            return
+        try:
+            async with self.pg_pool.acquire() as conn:
+                await conn.execute("""
+                    UPDATE plan_generation_jobs SET
+                        status = $2,
+                        progress = $3,
+                        message = $4,
+                        result = $5,
+                        error = $6,
+                        attempts = $7,
+                        started_at = $8,
+                        finished_at = $9,
+                        updated_at = $10,
+                        next_attempt_at = $11,
+                        locked_by = CASE WHEN $2 IN ('queued', 'running') THEN $12 END,
+                        heartbeat_at = CASE WHEN $2 IN ('queued', 'running') THEN NOW() END
+                    WHERE id = $1
+                """, job.id, job.status, job.progress, job.message,
+                    json.dumps(job.result, default=str) if job.result is not None else None,
+                    job.error, job.attempts, job.started_at, job.finished_at, job.updated_at,
+                    job.next_attempt_at, job.locked_by)
+        except Exception as e:
+            logger.warning("Failed to persist job %s: %s", job.id, e)
+
+    async def _heartbeat_loop(self):
+        """Renew the lease on this replica's live jobs and take over stale ones"""
+        while True:
+            await asyncio.sleep(JobConfig.HEARTBEAT_INTERVAL)
+            try:
+                async with self.pg_pool.acquire() as conn:
+                    await conn.execute("""
+                        UPDATE plan_generation_jobs SET heartbeat_at = NOW()
+                        WHERE locked_by = $1 AND status IN ('queued', 'running')
+                    """, JobConfig.WORKER_ID)
+            except Exception as e:
+                logger.warning("Plan job heartbeat failed: %s", e)
+            await self._reclaim_jobs()
+
+    async def _reclaim_jobs(self):
+        """
+        Take over live jobs whose owner stopped heartbeating (crashed or was
+        killed). SKIP LOCKED lets replicas reclaim concurrently without
+        claiming the same job twice.
+        """
+        if not self.pg_pool:
+            return
+        try:
+            async with self.pg_pool.acquire() as conn:
+                rows = await conn.fetch("""
+                    UPDATE plan_generation_jobs j
+                    SET status = 'queued', message = 'Re-queued after lease expired',
+                        locked_by = $1, heartbeat_at = NOW(), updated_at = NOW()
+                    FROM (
+                        SELECT id FROM plan_generation_jobs
+                        WHERE status IN ('queued', 'running')
+                          AND (locked_by IS NULL
+                               OR heartbeat_at IS NULL
+                               OR heartbeat_at < NOW() - make_interval(secs => $2))
+                        FOR UPDATE SKIP LOCKED
+                    ) stale
+                    WHERE j.id = stale.id
+                    RETURNING j.*
+                """, JobConfig.WORKER_ID, JobConfig.LEASE_TIMEOUT)
+            for row in sorted(rows, key=lambda r: r["created_at"]):
+                job = PlanJob.from_row(dict(row))
+                self._remember(job)
+                self._schedule(job)
+            if rows:
+                logger.info("Reclaimed %s plan jobs", len(rows))
+        except Exception as e:
+            logger.warning("Failed to reclaim plan jobs: %s", e)
+
+    async def _release_jobs(self):
+        """Hand this replica's live jobs back so another replica picks them up at once"""
+        if not self.pg_pool:
+            return
+        try:
+            async with self.pg_pool.acquire() as conn:
+                await conn.execute("""
+                    UPDATE plan_generation_jobs
+                    SET status = 'queued', message = 'Re-queued after shutdown',
+                        locked_by = NULL, heartbeat_at = NULL, updated_at = NOW()
+                    WHERE locked_by = $1 AND status IN ('queued', 'running')
+                """, JobConfig.WORKER_ID)
+        except Exception as e:
+            logger.warning("Failed to release plan jobs: %s", e)
@@ -0,0 +1,159 @@
+"""
+Non-blocking structured logging
+Records are put on an in-memory queue by the event loop and formatted /
+written to stdout by a background thread (QueueHandler + QueueListener), so a
+slow log pipe never stalls request handling. The queue is bounded: when the
+writer falls behind, new records are dropped and counted instead of growing
+memory without limit. Every line is one JSON object carrying the request id
+of the request that produced it.
+"""
+import os
+import sys
+import copy
+import json
+import queue
+import logging
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, Dict
+
+from metrics import LOG_RECORDS_DROPPED
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Emit 1 in N of these high-frequency events (see SamplingFilter)
+SAMPLE_RATES: Dict[str, int] = {
+    "cache_hit": 100,
+    "cache_miss": 10,
+    "state_updated": 10,
+}
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request's correlation id"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Deterministic 1-in-N sampling for records logged with
+    extra={"event": name} where name is in SAMPLE_RATES. Warnings and
+    errors are never sampled.
+    """
+
+    def __init__(self, rates: Dict[str, int]):
+        super().__init__()
+        self.rates = rates
+        self.seen: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        rate = self.rates.get(event) if event else None
+        if not rate or rate <= 1 or record.levelno >= logging.WARNING:
+            return True
+        count = self.seen.get(event, 0)
+        self.seen[event] = count + 1
+        if count % rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra` fields become top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _StructuredQueueHandler(QueueHandler):
+    """
+    QueueHandler that keeps `extra` fields and exceptions structured and
+    drops records (counting them) when the bounded queue is full
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc(record.levelname.lower())
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() renders the record to text; only resolve the
+        # message arguments and traceback so the writer thread gets plain data
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(level: str = LOG_LEVEL, stream=None, queue_size: int = LOG_QUEUE_SIZE) -> QueueListener:
+    """
+    Route the root logger through a queue drained by a writer thread.
+    Idempotent; call stop_logging() on shutdown to flush.
+    """
+    global _listener
+    if _listener:
+        return _listener
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    queue_handler = _StructuredQueueHandler(log_queue)
+    # Filters run on the caller's side: sampled-out records never reach the
+    # queue and the request id is read from the caller's context
+    queue_handler.addFilter(SamplingFilter(SAMPLE_RATES))
+    queue_handler.addFilter(RequestIdFilter())
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
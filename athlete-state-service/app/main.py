@@ -1,14 +1,20 @@
 """
 AthleteState Service - FastAPI application
 """
-from fastapi import FastAPI, HTTPException, status, Body
+from fastapi import FastAPI, HTTPException, status, Body, Query, Request, Header, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import sys
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 from datetime import date, datetime
+from uuid import UUID
 import json
+import time
+import uuid
+import hmac
+import logging
 
 # Fix Python path
 sys.path.insert(0, '/app')
@@ -16,25 +22,163 @@ sys.path.insert(0, '/app')
 # Now import - NO DOT before models!
 from models import AthleteState
 from managers import AthleteStateManager
+from rag import RagRetriever, RagConfig
+from jobs import PlanJobManager, FINISHED_STATUSES
+from plans import PlanStore
+from ingestion import StravaIngestionService
+from tokens import StravaTokenManager
+from backfill import StravaBackfill, BackfillConfig
+from power_curves import PowerCurveStore, PowerCurveConfig
+from ftp import FtpEstimator
+from context import ContextService
+from chat import ChatHistoryService, ChatConfig
+from embeddings import ChatEmbeddingWorker
+from metrics import registry, HTTP_REQUEST_SECONDS, cache_hit_ratios
+from invalidation import CacheInvalidationListener
+from logs import setup_logging, stop_logging, request_id_var
+from write_behind import StateWriteBehind, WriteBehindConfig
+from maintenance import MaintenanceScheduler, MaintenanceConfig
+from warmup import StateWarmup
+from progress import ProgressBroker, job_event
+from workouts import WorkoutListingService, workouts_etag, etag_matches
+from responses import FastJSONResponse, CompressionMiddleware
+from redis_layer import pool_stats
+from cohort import CohortService, CohortConfig
+from archive import RideArchive, ArchiveConfig, weekly_summary, POWER_ZONE_COLUMNS, HR_ZONE_COLUMNS
+
+logger = logging.getLogger("athlete_state")
 
 # Initialize manager
 manager = AthleteStateManager()
+rag_retriever = RagRetriever()
+
+async def _on_plan_generated(job):
+    """The n8n workflow wrote a new plan; its calendar and context are stale"""
+    await manager.invalidate_plan_views(job.athlete_id)
+
+progress_broker = ProgressBroker()
+
+def _on_job_update(job):
+    # With LISTEN up, the plan_generation_jobs trigger delivers this to every replica
+    if not cache_invalidation.connected:
+        progress_broker.publish(job.athlete_id, job_event(job.to_dict()))
+
+def _on_database_event(athlete_id: int, event: Dict[str, Any]):
+    """Forward job progress and saved workouts (including n8n's) to progress streams"""
+    if event.get("scope") == "job":
+        progress_broker.publish(athlete_id, job_event(event))
+    elif event.get("scope") == "calendar":
+        progress_broker.publish(athlete_id, {"type": "workouts", "month": event.get("month")})
+
+job_manager = PlanJobManager(on_complete=_on_plan_generated, on_update=_on_job_update)
+plan_store = PlanStore(manager)
+power_curves = PowerCurveStore(manager)
+strava_tokens = StravaTokenManager(manager)
+strava_ingestion = StravaIngestionService(manager, power_curves=power_curves, tokens=strava_tokens)
+# Shares ingestion's pooled Strava client (and its per-athlete politeness buckets)
+strava_backfill = StravaBackfill(manager, strava_ingestion.strava, strava_tokens)
+ftp_estimator = FtpEstimator(manager)
+context_service = ContextService(manager)
+chat_history = ChatHistoryService(manager)
+chat_embedder = ChatEmbeddingWorker(manager, rag_retriever)
+cache_invalidation = CacheInvalidationListener(manager, on_event=_on_database_event)
+state_writer = StateWriteBehind(manager)
+workout_listing = WorkoutListingService(manager)
+ride_archive = RideArchive(manager)
+cohort_service = CohortService(manager)
+maintenance = MaintenanceScheduler(manager, state_writer, token_manager=strava_tokens,
+                                   ride_archive=ride_archive if ArchiveConfig.ENABLED else None,
+                                   cohort=cohort_service)
+state_warmup = StateWarmup(manager)
+
+STRAVA_VERIFY_TOKEN = os.getenv("STRAVA_VERIFY_TOKEN", "")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager"""
-    print("🚀 Starting AthleteState Service")
+    setup_logging()
+    logger.info("Starting AthleteState Service")
+    if not STRAVA_VERIFY_TOKEN:
+        logger.warning("STRAVA_VERIFY_TOKEN is not set; Strava subscription handshakes will be refused")
     await manager.initialize()
+    if WriteBehindConfig.ENABLED:
+        # Replays the journal before any request can read state
+        await state_writer.initialize()
+    # Runs in the background; /ready reports 503 until it is done
+    await state_warmup.initialize()
+    await rag_retriever.initialize(manager.pg_pool)
+    await job_manager.initialize(manager.pg_pool)
+    await strava_tokens.initialize()
+    await strava_ingestion.initialize()
+    if BackfillConfig.ENABLED:
+        await strava_backfill.initialize()
+    await chat_history.initialize()
+    await chat_embedder.initialize()
+    await cache_invalidation.initialize()
+    if MaintenanceConfig.ENABLED:
+        await maintenance.initialize()
     yield
-    print("🛑 Shutting down")
+    logger.info("Shutting down")
+    await state_warmup.cleanup()
+    await maintenance.cleanup()
+    await cache_invalidation.cleanup()
+    await chat_embedder.cleanup()
+    await chat_history.cleanup()
+    await strava_backfill.cleanup()
+    await strava_ingestion.cleanup()
+    await strava_tokens.cleanup()
+    await job_manager.cleanup()
+    await rag_retriever.cleanup()
+    # Last flush before the pool closes
+    await state_writer.cleanup()
     await manager.cleanup()
+    stop_logging()
 
 app = FastAPI(
     title="AthleteState Service",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+def _queue_depths():
+    ingestion = strava_ingestion.stats()
+    jobs = job_manager.stats()
+    embedding = chat_embedder.stats()
+    return {
+        ("state_write_behind_dirty",): state_writer.stats()["dirty"],
+        ("strava_buffered",): ingestion["buffered"],
+        ("strava_queued",): ingestion["queued"],
+        ("plan_jobs_pending",): jobs["pending"],
+        ("plan_jobs_running",): jobs["running"],
+        ("chat_embedding_lag",): embedding["lag_messages"],
+    }
+
+registry.gauge("background_queue_depth", "Items waiting in background queues", ["queue"], _queue_depths)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status_code = 500
+    # Correlate every log line of this request (and of n8n's call into it)
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        request_id_var.reset(token)
+        # Route template, not the raw path, keeps label cardinality bounded
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            request.method,
+            route.path if route else "unmatched",
+            str(status_code)
+        )
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -42,6 +186,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost: compresses the final body, after every other middleware
+app.add_middleware(CompressionMiddleware)
 
 @app.get("/")
 async def root():
@@ -51,14 +197,40 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 503 until the startup state warm-up has finished (or timed out)"""
+    warmup = state_warmup.stats()
+    if not warmup["ready"]:
+        return FastJSONResponse({"status": "warming", "warmup": warmup}, status_code=503)
+    return {"status": "ready", "warmup": warmup}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/v1/metrics/cache")
+async def cache_metrics():
+    """AthleteState hit ratio per storage tier, Redis pool and local cache usage"""
+    pool = getattr(manager.redis_client, "connection_pool", None)
+    return {
+        "success": True,
+        "hit_ratios": cache_hit_ratios(),
+        "redis_pool": {k[0]: v for k, v in pool_stats(pool).items()} if pool else None,
+        "local_cache": manager.state_cache.stats() if manager.state_cache else None,
+    }
+
 @app.get("/api/v1/state/{athlete_id}")
 async def get_state(athlete_id: int):
     try:
         state = await manager.get_state(athlete_id)
         if state:
-            return {"success": True, "state": state.to_dict()}
+            return FastJSONResponse({"success": True, "state": state.to_dict()})
         else:
             raise HTTPException(404, f"Athlete {athlete_id} not found")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Error: {str(e)}")
 
@@ -69,14 +241,13 @@ async def update_athlete_state(
 ):
     """Update athlete state with partial updates"""
     try:
-        success = await manager.update_state(athlete_id, updates)
-        if success:
-            # Get updated state to return
-            state = await manager.get_state(athlete_id)
+        # The updated state comes back from the update itself: no second read
+        state = await manager.patch_state(athlete_id, updates)
+        if state:
             return {
                 "success": True,
                 "athlete_id": athlete_id,
-                "state": state.to_dict() if state else None,
+                "state": state.to_dict(),
                 "message": "State updated successfully"
             }
         else:
@@ -84,12 +255,19 @@ async def update_athlete_state(
                 status_code=400,
                 detail=f"Failed to update athlete {athlete_id}"
             )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error: {str(e)}"
         )
 
+@app.get("/api/v1/state/write-behind/stats")
+async def get_state_write_behind_stats():
+    """Dirty athletes, flushes and journal segments of the state write-behind"""
+    return {"success": True, "enabled": manager.write_behind is not None, "stats": state_writer.stats()}
+
 @app.post("/api/v1/events")
 async def log_coaching_event(
     athlete_id: int = Body(...),
@@ -126,30 +304,27 @@ async def log_coaching_event(
 async def get_calendar_month(athlete_id: int, year: int, month: int):
     """Get calendar data for a specific month"""
     try:
-        # Use the calendar_view we created
-        async with manager.pg_pool.acquire() as conn:
-            rows = await conn.fetch("""
-                SELECT * FROM calendar_view 
-                WHERE athlete_id = $1 
-                AND EXTRACT(YEAR FROM scheduled_date) = $2
-                AND EXTRACT(MONTH FROM scheduled_date) = $3
-                ORDER BY scheduled_date
-            """, athlete_id, year, month)
-            
-            days = []
-            for row in rows:
-                day_data = dict(row)
-                # Convert date to string for JSON
-                if day_data.get('scheduled_date'):
-                    day_data['scheduled_date'] = day_data['scheduled_date'].isoformat()
-                days.append(day_data)
+        days = await manager.get_cached_calendar(athlete_id, year, month)
+        if days is None:
+            # Use the calendar_view we created
+            async with manager.pg_pool.acquire() as conn:
+                rows = await conn.fetch("""
+                    SELECT * FROM calendar_view 
+                    WHERE athlete_id = $1 
+                    AND EXTRACT(YEAR FROM scheduled_date) = $2
+                    AND EXTRACT(MONTH FROM scheduled_date) = $3
+                    ORDER BY scheduled_date
+                """, athlete_id, year, month)
             
-            return {
-                "success": True,
-                "athlete_id": athlete_id,
-                "month": f"{year}-{month:02d}",
-                "days": days
-            }
+            days = [dict(row) for row in rows]
+            await manager.cache_calendar(athlete_id, year, month, days)
+        
+        return FastJSONResponse({
+            "success": True,
+            "athlete_id": athlete_id,
+            "month": f"{year}-{month:02d}",
+            "days": days
+        })
             
     except Exception as e:
         raise HTTPException(500, f"Error: {str(e)}")
@@ -177,18 +352,12 @@ async def get_workout_details(athlete_id: int, workout_id: int):
                 LIMIT 5
             """, athlete_id, str(workout_id))
             
-            workout_dict = dict(workout)
-            # Convert date and timestamps to strings
-            if workout_dict.get('scheduled_date'):
-                workout_dict['scheduled_date'] = workout_dict['scheduled_date'].isoformat()
-            if workout_dict.get('created_at'):
-                workout_dict['created_at'] = workout_dict['created_at'].isoformat()
-            
-            return {
+            # Dates and timestamps are rendered by FastJSONResponse
+            return FastJSONResponse({
                 "success": True,
-                "workout": workout_dict,
+                "workout": dict(workout),
                 "coaching_events": [dict(e) for e in events]
-            }
+            })
             
     except HTTPException:
         raise
@@ -240,6 +409,8 @@ async def update_workout(
             if not updated:
                 raise HTTPException(404, "Workout not found")
             
+            await manager.invalidate_plan_views(athlete_id, [updated['scheduled_date']])
+            
             # Log coaching event if status changed
             if 'completion_status' in filtered_updates:
                 await manager.log_coaching_event(
@@ -262,6 +433,440 @@ async def update_workout(
     except Exception as e:
         raise HTTPException(500, f"Error: {str(e)}")
 
+# ========== WORKOUT LISTING ENDPOINTS ==========
+
+@app.get("/api/v1/workouts/stats")
+async def get_workout_listing_stats():
+    """304 / cache / delta counters of the workouts listing"""
+    return {"success": True, "stats": workout_listing.stats()}
+
+@app.get("/api/v1/workouts/{athlete_id}")
+async def list_workouts(
+    athlete_id: int,
+    since: Optional[int] = Query(None, description="version of the listing the client already has"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Workouts of the athlete's current plan (replaces athletes/workouts).
+    Unchanged since the ETag sent in If-None-Match: 304 with no body.
+    With ?since=<version>: only workouts written after it plus removed ids,
+    or the full listing with "delta": false if the client must resync.
+    """
+    try:
+        version = await workout_listing.current_version(athlete_id)
+        etag = workouts_etag(athlete_id, version)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(if_none_match, etag):
+            workout_listing.not_modified()
+            return Response(status_code=304, headers=headers)
+
+        if since is None:
+            listing = await workout_listing.listing(athlete_id, version)
+            body = {**listing, "delta": False, "removed": []}
+        else:
+            body = await workout_listing.changes(athlete_id, since, version)
+        # A write between the two reads: describe what was actually returned
+        headers["ETag"] = workouts_etag(athlete_id, body["version"])
+        return FastJSONResponse({"success": True, **body}, headers=headers)
+
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+
+# ========== CHAT CONTEXT ENDPOINTS ==========
+
+@app.get("/api/v1/context/{athlete_id}")
+async def get_chat_context(athlete_id: int):
+    """State, capabilities, recent load, current phase and goals in one call"""
+    try:
+        context = await context_service.get_context(athlete_id)
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+    if not context:
+        raise HTTPException(404, f"Athlete {athlete_id} not found")
+    return FastJSONResponse({"success": True, **context})
+
+@app.post("/api/v1/context/{athlete_id}/invalidate")
+async def invalidate_chat_context(athlete_id: int):
+    """Called by workflows that write goals or FTP directly to the database"""
+    await manager.invalidate_context(athlete_id)
+    return {"success": True, "athlete_id": athlete_id}
+
+# ========== CHAT HISTORY ENDPOINTS ==========
+
+@app.get("/api/v1/chat/{athlete_id}/history")
+async def get_chat_history(
+    athlete_id: int,
+    limit: int = Query(ChatConfig.DEFAULT_PAGE_SIZE, ge=1, le=ChatConfig.MAX_PAGE_SIZE),
+    before: Optional[str] = Query(None, description="next_cursor from the previous page")
+):
+    """Newest chat messages first, paged backwards with a keyset cursor"""
+    try:
+        page = await chat_history.get_page(athlete_id, limit, before)
+        return {"success": True, **page}
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+
+@app.get("/api/v1/chat/{athlete_id}/summary")
+async def get_chat_summary(athlete_id: int, refresh: bool = True):
+    """Stored conversation summary; a fold runs in the background when enough new messages exist"""
+    try:
+        summary = await chat_history.get_summary(athlete_id, refresh)
+        return {"success": True, **summary}
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+
+@app.get("/api/v1/chat/embeddings/stats")
+async def get_chat_embedding_stats():
+    """Embedding worker watermark, lag and throughput"""
+    return {"success": True, "stats": chat_embedder.stats()}
+
+# ========== RAG ENDPOINTS ==========
+
+@app.post("/api/v1/rag/batch")
+async def rag_batch(
+    queries: List[Dict[str, Any]] = Body(...),
+    top_k: int = Body(RagConfig.DEFAULT_TOP_K),
+    source_patterns: Optional[List[str]] = Body(None)
+):
+    """Embed every day's RAG query in one batch and return top-k matches for all"""
+    if not queries:
+        raise HTTPException(400, "At least one query is required")
+    if len(queries) > RagConfig.MAX_QUERIES:
+        raise HTTPException(400, f"At most {RagConfig.MAX_QUERIES} queries per batch")
+    if not 1 <= top_k <= RagConfig.MAX_TOP_K:
+        raise HTTPException(400, f"top_k must be between 1 and {RagConfig.MAX_TOP_K}")
+
+    try:
+        batch = await rag_retriever.retrieve_batch(queries, top_k, source_patterns)
+        return {"success": True, **batch}
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+
+# ========== TRAINING PLAN ENDPOINTS ==========
+
+@app.post("/api/v1/plans", status_code=201)
+async def save_training_plan(
+    athlete_id: int = Body(...),
+    workouts: List[Dict[str, Any]] = Body(...),
+    goal: Optional[str] = Body(None),
+    start_date: Optional[str] = Body(None),
+    end_date: Optional[str] = Body(None)
+):
+    """Save a generated plan and all of its workouts in one transaction"""
+    try:
+        result = await plan_store.save_plan(
+            athlete_id=athlete_id,
+            workouts=workouts,
+            goal=goal,
+            start_date=start_date,
+            end_date=end_date
+        )
+        return {"success": True, "message": "Training plan created successfully", **result}
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+
+# ========== PLAN GENERATION JOB ENDPOINTS ==========
+
+@app.post("/api/v1/jobs/plan-generation", status_code=202)
+async def enqueue_plan_generation(
+    athlete_id: int = Body(...),
+    params: Optional[Dict[str, Any]] = Body(None)
+):
+    """Queue a plan generation job (identical live requests share one job)"""
+    try:
+        job = await job_manager.enqueue(athlete_id, params)
+        return {"success": True, "job_id": str(job.id), "job": job.to_dict()}
+    except OverflowError as e:
+        raise HTTPException(503, str(e))
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+
+@app.get("/api/v1/jobs/stats")
+async def get_job_stats():
+    """Queue depth and worker utilisation"""
+    return {"success": True, "stats": job_manager.stats(), "streams": progress_broker.stats()}
+
+@app.get("/api/v1/jobs/athlete/{athlete_id}/latest")
+async def get_latest_job(athlete_id: int):
+    """Latest plan generation job for an athlete"""
+    try:
+        job = await job_manager.latest_job(athlete_id)
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+    if not job:
+        raise HTTPException(404, f"No plan generation jobs for athlete {athlete_id}")
+    return {"success": True, **job.to_dict()}
+
+def _event_stream(body) -> StreamingResponse:
+    return StreamingResponse(body, media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # nginx must not buffer the stream
+    })
+
+@app.get("/api/v1/jobs/athlete/{athlete_id}/events")
+async def stream_athlete_progress(athlete_id: int):
+    """
+    Server-sent events: 'job' on every status / progress change of the
+    athlete's plan jobs and 'workouts' whenever planned workouts are saved
+    (including plans written directly by n8n). Starts with the latest job.
+    """
+    # Subscribe before the snapshot so nothing falls in between
+    queue = progress_broker.subscribe(athlete_id)
+    try:
+        latest = await job_manager.latest_job(athlete_id)
+    except Exception as e:
+        progress_broker.unsubscribe(athlete_id, queue)
+        raise HTTPException(500, f"Error: {str(e)}")
+    initial = [job_event(latest.to_dict())] if latest else []
+    return _event_stream(progress_broker.stream(athlete_id, queue, initial))
+
+@app.get("/api/v1/jobs/{job_id}/events")
+async def stream_job_progress(job_id: UUID):
+    """Server-sent events for one job; the stream ends once the job finishes"""
+    try:
+        job = await job_manager.get_job(job_id)
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+    if not job:
+        raise HTTPException(404, f"Job {job_id} not found")
+    queue = progress_broker.subscribe(job.athlete_id)
+    # Re-read after subscribing: the job may have moved on in between
+    job = await job_manager.get_job(job_id) or job
+
+    def finished(event):
+        return event["type"] == "job" and event["job_id"] == str(job_id) \
+            and event["status"] in FINISHED_STATUSES
+
+    return _event_stream(progress_broker.stream(
+        job.athlete_id, queue, [job_event(job.to_dict())], until=finished
+    ))
+
+@app.get("/api/v1/jobs/{job_id}")
+async def get_job(job_id: UUID):
+    """Plan generation job status"""
+    try:
+        job = await job_manager.get_job(job_id)
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+    if not job:
+        raise HTTPException(404, f"Job {job_id} not found")
+    return {"success": True, **job.to_dict()}
+
+@app.post("/api/v1/jobs/{job_id}/progress")
+async def report_job_progress(
+    job_id: UUID,
+    progress: int = Body(...),
+    message: Optional[str] = Body(None)
+):
+    """Progress callback for the generation workflow"""
+    try:
+        job = await job_manager.report_progress(job_id, progress, message)
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+    if not job:
+        raise HTTPException(404, f"Job {job_id} not found")
+    return {"success": True, **job.to_dict()}
+
+@app.post("/api/v1/jobs/{job_id}/cancel")
+async def cancel_job(job_id: UUID):
+    """Cancel a queued or running job"""
+    try:
+        job = await job_manager.cancel(job_id)
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+    if not job:
+        raise HTTPException(404, f"Job {job_id} not found")
+    return {"success": True, **job.to_dict()}
+
+# ========== STRAVA WEBHOOK ENDPOINTS ==========
+
+@app.get("/api/v1/strava/webhook")
+async def verify_strava_subscription(
+    hub_mode: str = Query(..., alias="hub.mode"),
+    hub_challenge: str = Query(..., alias="hub.challenge"),
+    hub_verify_token: str = Query(..., alias="hub.verify_token")
+):
+    """Strava push subscription validation handshake"""
+    if not STRAVA_VERIFY_TOKEN:
+        # Fail closed: an unset token must not accept an empty hub.verify_token
+        raise HTTPException(503, "Strava webhook verification is not configured")
+    if hub_mode != "subscribe" or not hmac.compare_digest(hub_verify_token, STRAVA_VERIFY_TOKEN):
+        raise HTTPException(403, "Invalid verify token")
+    return {"hub.challenge": hub_challenge}
+
+@app.post("/api/v1/strava/webhook")
+async def receive_strava_event(event: Dict[str, Any] = Body(...)):
+    """Acknowledge a Strava webhook event immediately; processing is queued"""
+    try:
+        queued = strava_ingestion.accept_event(event)
+    except OverflowError as e:
+        # A non-2xx makes Strava retry the delivery later
+        raise HTTPException(503, str(e))
+    return {"success": True, "queued": queued}
+
+@app.get("/api/v1/strava/ingestion/stats")
+async def get_strava_ingestion_stats():
+    """Webhook ingestion counters and queue depth"""
+    return {"success": True, "stats": strava_ingestion.stats()}
+
+@app.get("/api/v1/strava/tokens/stats")
+async def get_strava_token_stats():
+    """Tracked tokens, tokens due for refresh and refresh outcomes"""
+    return {"success": True, "stats": strava_tokens.stats()}
+
+@app.get("/api/v1/strava/backfill/stats")
+async def get_strava_backfill_stats():
+    """Backfill leadership, pages and rides imported, remaining rate budget"""
+    return {"success": True, "stats": strava_backfill.stats()}
+
+@app.post("/api/v1/strava/backfill/{athlete_id}", status_code=202)
+async def request_strava_backfill(athlete_id: int, force: bool = Query(False)):
+    """Queue an athlete's activity history import (called after Strava connect)"""
+    if not manager.pg_pool:
+        raise HTTPException(503, "PostgreSQL not available")
+    try:
+        progress = await strava_backfill.request(athlete_id, force=force)
+        if not progress:
+            raise HTTPException(404, f"Athlete {athlete_id} not found")
+        return {"success": True, "backfill": progress}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+
+@app.get("/api/v1/strava/backfill/{athlete_id}")
+async def get_strava_backfill(athlete_id: int):
+    """Backfill progress for one athlete"""
+    if not manager.pg_pool:
+        raise HTTPException(503, "PostgreSQL not available")
+    try:
+        progress = await strava_backfill.progress(athlete_id)
+        if not progress:
+            raise HTTPException(404, f"No backfill for athlete {athlete_id}")
+        return {"success": True, "backfill": progress}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+
+# ========== POWER CURVE ENDPOINTS ==========
+
+@app.get("/api/v1/power-curve/{athlete_id}")
+async def get_power_curve(
+    athlete_id: int,
+    windows: Optional[str] = Query(None, description="Comma-separated day windows, default 42,90")
+):
+    """Mean-maximal power (1 s to 60 min) over trailing day windows"""
+    window_days = list(PowerCurveConfig.DEFAULT_WINDOWS)
+    if windows:
+        try:
+            window_days = [int(w) for w in windows.split(",") if w.strip()]
+        except ValueError:
+            raise HTTPException(400, "windows must be comma-separated integers")
+        if not window_days or not all(1 <= w <= PowerCurveConfig.MAX_WINDOW for w in window_days):
+            raise HTTPException(400, f"windows must be between 1 and {PowerCurveConfig.MAX_WINDOW} days")
+
+    try:
+        curve = await power_curves.get_windows(athlete_id, window_days)
+        return {"success": True, **curve}
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+
+# ========== RIDE ARCHIVE ENDPOINTS ==========
+
+@app.get("/api/v1/rides/archive/stats")
+async def get_ride_archive_stats():
+    """Archive format, athletes exported and the last incremental refresh"""
+    return {"success": True, "stats": ride_archive.stats()}
+
+@app.get("/api/v1/rides/{athlete_id}/summary")
+async def get_ride_summary(
+    athlete_id: int,
+    weeks: int = Query(12, ge=1, le=ArchiveConfig.MAX_SUMMARY_WEEKS)
+):
+    """Weekly TSS, hours and zone time, scanned from the columnar ride archive"""
+    try:
+        columns = ride_archive.scan(athlete_id, ["ride_date", "tss", "duration_min",
+                                                 *POWER_ZONE_COLUMNS, *HR_ZONE_COLUMNS])
+        if columns is None:
+            raise HTTPException(404, f"Rides of athlete {athlete_id} are not archived yet")
+        return FastJSONResponse({"success": True, "athlete_id": athlete_id,
+                                 **weekly_summary(columns, weeks, date.today())})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+
+# ========== COHORT ENDPOINTS ==========
+
+@app.get("/api/v1/cohort")
+async def get_cohort(
+    athlete_ids: Optional[str] = Query(None, description="Comma-separated athlete ids, default the whole roster"),
+    flagged_only: bool = Query(False)
+):
+    """CTL / ATL / TSB, weekly TSS, plan compliance and fatigue flags per athlete"""
+    ids = None
+    if athlete_ids:
+        try:
+            ids = [int(a) for a in athlete_ids.split(",") if a.strip()]
+        except ValueError:
+            raise HTTPException(400, "athlete_ids must be comma-separated integers")
+        if len(ids) > CohortConfig.MAX_ATHLETES:
+            raise HTTPException(400, f"At most {CohortConfig.MAX_ATHLETES} athlete_ids")
+    if not manager.pg_pool:
+        raise HTTPException(503, "PostgreSQL not available")
+    try:
+        cohort = await cohort_service.get_cohort(ids, flagged_only=flagged_only)
+        return FastJSONResponse({"success": True, **cohort})
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+
+@app.get("/api/v1/cohort/stats")
+async def get_cohort_stats():
+    """Requests served and the last concurrent refresh of the summary view"""
+    return {"success": True, "stats": cohort_service.stats()}
+
+# ========== MAINTENANCE ENDPOINTS ==========
+
+@app.get("/api/v1/maintenance/stats")
+async def get_maintenance_stats():
+    """Leadership and the last run of each scheduled maintenance job"""
+    return {"success": True, "stats": maintenance.stats()}
+
+@app.post("/api/v1/maintenance/jobs/{name}/run")
+async def run_maintenance_job(name: str):
+    """Run one maintenance job now, on this replica (jobs are idempotent)"""
+    if name not in maintenance.jobs:
+        raise HTTPException(404, f"Unknown maintenance job {name}")
+    if not manager.pg_pool:
+        raise HTTPException(503, "PostgreSQL not available")
+    try:
+        touched = await maintenance.run_job(name)
+        return {"success": True, "job": name, "athletes": touched}
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+
+# ========== FTP ESTIMATION ENDPOINTS ==========
+
+@app.post("/api/v1/ftp/estimate")
+async def estimate_ftp(
+    athlete_ids: Optional[List[int]] = Body(None),
+    force: bool = Body(False)
+):
+    """
+    Batch FTP review: re-estimate athletes whose power curve changed since
+    their last suggestion, store suggestions and update current_ftp
+    """
+    try:
+        result = await ftp_estimator.run(athlete_ids=athlete_ids, force=force)
+        return {"success": True, **result}
+    except Exception as e:
+        raise HTTPException(500, f"Error: {str(e)}")
+
 # Simple .ZWO file generator (no httpx dependency)
 def generate_zwo_file(workout: dict) -> str:
     """Generate .ZWO file content for Zwift"""
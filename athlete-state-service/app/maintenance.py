@@ -0,0 +1,258 @@
+"""
+MaintenanceScheduler - periodic, set-based athlete state maintenance
+Nothing reset substitution_count_this_week or recomputed the training load
+fields; the only periodic jobs lived in n8n. Every replica runs this
+scheduler, but only the one holding a Redis leader lock executes jobs. Each
+job is one SQL statement over all athletes, never a per-athlete
+update_state call:
+- weekly_reset: zero the substitution counters of rows from an earlier week
+- fatigue: re-derive CTL / ATL / TSB and acute_fatigue_level from ride TSS
+- warm_cache: load active athletes' states in one query into Redis
+- strava_tokens: refresh the Strava tokens about to expire (tokens.py)
+- ride_archive: export changed rides to the columnar archive (archive.py)
+- cohort: refresh the roster summary view concurrently (cohort.py)
+
+Last run times live in Redis, so a new leader continues the schedule.
+Jobs are idempotent: a run repeated by a leader that lost its lock
+mid-job does no harm.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List
+
+from jobs import JobConfig
+from tokens import TokenConfig
+from archive import ArchiveConfig
+from cohort import CohortConfig
+
+logger = logging.getLogger(__name__)
+
+
+class MaintenanceConfig:
+    """Maintenance scheduler configuration"""
+    ENABLED = os.getenv("MAINTENANCE_ENABLED", "true").lower() == "true"
+    LOCK_KEY = "athlete-state:scheduler:leader"
+    LAST_RUN_KEY = "athlete-state:scheduler:last-run"
+    LOCK_TTL = 60  # seconds; renewed every tick
+    TICK = 15  # seconds between schedule checks
+    # Job intervals (seconds). The reset only changes rows once the week
+    # rolls; checking often keeps Monday's first substitutions from being
+    # counted in a week that is about to be zeroed
+    WEEKLY_RESET_INTERVAL = 300
+    FATIGUE_INTERVAL = 3600
+    WARM_CACHE_INTERVAL = 900
+    ACTIVE_DAYS = 14  # rides or state updates within this window
+    # Training load: exponentially weighted daily TSS
+    CTL_DAYS = 42
+    ATL_DAYS = 7
+    LOAD_LOOKBACK_DAYS = 180  # older rides weigh < 2% of CTL
+    FATIGUE_HIGH_TSB = -25  # tsb below this: high
+    FATIGUE_MODERATE_TSB = -10  # tsb below this: moderate, else low
+
+
+# Compare-and-set on the lock owner, so a replica never extends or frees a
+# lock that expired and was taken over by another replica
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderLock:
+    """Redis lease held by at most one replica"""
+
+    def __init__(self, redis_client, key: str, ttl: int, owner: str):
+        self.redis = redis_client
+        self.key = key
+        self.ttl = ttl
+        self.owner = owner
+        self.held = False
+
+    async def hold(self) -> bool:
+        """Renew the lease if ours, else try to take it; True if we lead"""
+        if self.held and await self.redis.eval(_RENEW_SCRIPT, 1, self.key, self.owner, self.ttl):
+            return True
+        self.held = bool(await self.redis.set(self.key, self.owner, nx=True, ex=self.ttl))
+        return self.held
+
+    async def release(self):
+        if self.held:
+            self.held = False
+            await self.redis.eval(_RELEASE_SCRIPT, 1, self.key, self.owner)
+
+
+WEEKLY_RESET_SQL = """
+    UPDATE athlete_state
+    SET substitution_count_this_week = 0,
+        counter_week = date_trunc('week', NOW())::date,
+        updated_at = NOW()
+    WHERE counter_week < date_trunc('week', NOW())::date
+    RETURNING athlete_id
+"""
+
+# CTL_t = sum(tss_d / N * (1 - 1/N) ^ (t - d)): the closed form of the daily
+# update CTL += (TSS - CTL) / N. Athletes without rides in the lookback keep
+# their values (they may be maintained by hand).
+FATIGUE_SQL = """
+    WITH daily AS (
+        SELECT athlete_id, ride_date::date AS day, SUM(tss)::float AS tss
+        FROM rides
+        WHERE ride_date >= CURRENT_DATE - $1::int AND tss IS NOT NULL
+        GROUP BY athlete_id, ride_date::date
+    ),
+    load AS (
+        SELECT athlete_id,
+               round(SUM(tss / $2::float * power(1 - 1.0 / $2::float, CURRENT_DATE - day))::numeric, 1) AS ctl,
+               round(SUM(tss / $3::float * power(1 - 1.0 / $3::float, CURRENT_DATE - day))::numeric, 1) AS atl
+        FROM daily
+        GROUP BY athlete_id
+    ),
+    derived AS (
+        SELECT athlete_id, ctl, atl, ctl - atl AS tsb,
+               CASE WHEN ctl - atl < $4::numeric THEN 'high'
+                    WHEN ctl - atl < $5::numeric THEN 'moderate'
+                    ELSE 'low' END AS fatigue
+        FROM load
+    )
+    UPDATE athlete_state s
+    SET ctl_42d = d.ctl, atl_7d = d.atl, tsb = d.tsb,
+        acute_fatigue_level = d.fatigue, updated_at = NOW()
+    FROM derived d
+    WHERE s.athlete_id = d.athlete_id
+      AND (s.ctl_42d, s.atl_7d, s.tsb, s.acute_fatigue_level)
+          IS DISTINCT FROM (d.ctl, d.atl, d.tsb, d.fatigue)
+    RETURNING s.athlete_id
+"""
+
+
+class MaintenanceScheduler:
+    """Leader-elected in-process scheduler for bulk maintenance jobs"""
+
+    def __init__(self, manager, state_writer=None, token_manager=None, ride_archive=None,
+                 cohort=None):
+        self.manager = manager
+        # Flushed before the bulk updates so pending PATCHes land first
+        self.state_writer = state_writer
+        self.lock: Optional[LeaderLock] = None
+        self.jobs: Dict[str, tuple] = {
+            "weekly_reset": (MaintenanceConfig.WEEKLY_RESET_INTERVAL, self.weekly_reset),
+            "fatigue": (MaintenanceConfig.FATIGUE_INTERVAL, self.rederive_fatigue),
+            "warm_cache": (MaintenanceConfig.WARM_CACHE_INTERVAL, self.warm_cache),
+        }
+        if token_manager:
+            self.jobs["strava_tokens"] = (TokenConfig.REFRESH_INTERVAL, token_manager.refresh_due)
+        if ride_archive:
+            self.jobs["ride_archive"] = (ArchiveConfig.REFRESH_INTERVAL, ride_archive.refresh)
+        if cohort:
+            # After fatigue, so a tick running both publishes the fresh values
+            self.jobs["cohort"] = (CohortConfig.REFRESH_INTERVAL, cohort.refresh)
+        self._task: Optional[asyncio.Task] = None
+        self.runs: Dict[str, Dict[str, Any]] = {}
+
+    async def initialize(self):
+        if not self.manager.pg_pool or not self.manager.redis_client:
+            # Without Redis there is no leader election: never run unguarded
+            logger.warning("Maintenance scheduler disabled (needs PostgreSQL and Redis)")
+            return
+        self.lock = LeaderLock(self.manager.redis_client, MaintenanceConfig.LOCK_KEY,
+                               MaintenanceConfig.LOCK_TTL, JobConfig.WORKER_ID)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Maintenance scheduler started")
+
+    async def cleanup(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.lock:
+            try:
+                await self.lock.release()
+            except Exception as e:
+                logger.warning("Could not release the scheduler lock: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "leader": bool(self.lock and self.lock.held),
+            "jobs": self.runs,
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                if await self.lock.hold():
+                    await self.run_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Maintenance tick failed: %s", e)
+            await asyncio.sleep(MaintenanceConfig.TICK)
+
+    async def run_due(self) -> List[str]:
+        """Run every job whose interval has passed since its last run anywhere"""
+        last_runs = await self.manager.redis_client.hgetall(MaintenanceConfig.LAST_RUN_KEY)
+        ran = []
+        for name, (interval, job) in self.jobs.items():
+            if time.time() - float(last_runs.get(name) or 0) < interval:
+                continue
+            try:
+                await self.run_job(name)
+            except Exception:
+                continue  # logged; retried next tick, the other jobs still run
+            ran.append(name)
+        return ran
+
+    async def run_job(self, name: str) -> int:
+        """Run one job now; returns the athletes it touched"""
+        job = self.jobs[name][1]
+        started = time.time()
+        try:
+            touched = await job()
+        except Exception as e:
+            self.runs[name] = {"at": started, "error": str(e)}
+            logger.error("Maintenance job %s failed: %s", name, e)
+            raise
+        self.runs[name] = {"at": started, "athletes": touched,
+                           "seconds": round(time.time() - started, 3)}
+        if self.manager.redis_client:
+            await self.manager.redis_client.hset(MaintenanceConfig.LAST_RUN_KEY, name, started)
+        logger.info("Maintenance job %s touched %s athletes", name, touched)
+        return touched
+
+    # ---------- jobs ----------
+
+    async def weekly_reset(self) -> int:
+        return await self._bulk_update(WEEKLY_RESET_SQL)
+
+    async def rederive_fatigue(self) -> int:
+        return await self._bulk_update(
+            FATIGUE_SQL,
+            MaintenanceConfig.LOAD_LOOKBACK_DAYS,
+            MaintenanceConfig.CTL_DAYS,
+            MaintenanceConfig.ATL_DAYS,
+            MaintenanceConfig.FATIGUE_HIGH_TSB,
+            MaintenanceConfig.FATIGUE_MODERATE_TSB,
+        )
+
+    async def warm_cache(self) -> int:
+        states = await self.manager.load_active_states(MaintenanceConfig.ACTIVE_DAYS)
+        return await self.manager.cache_states(states)
+
+    async def _bulk_update(self, sql: str, *args) -> int:
+        if self.state_writer and self.manager.write_behind is self.state_writer:
+            await self.state_writer.flush()
+        async with self.manager.pg_pool.acquire() as conn:
+            rows = await conn.fetch(sql, *args)
+        athlete_ids = [row["athlete_id"] for row in rows]
+        await self.manager.invalidate_states(athlete_ids)
+        return len(athlete_ids)
@@ -0,0 +1,168 @@
+"""
+PlanStore - atomic, single round-trip persistence of generated training plans
+Replaces the row-by-row "Save Training Plan1" / "Save Planned Workout" nodes
+"""
+import logging
+import json
+from datetime import datetime, date
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Column order for the planned_workouts COPY
+WORKOUT_COLUMNS = [
+    "training_plan_id",
+    "athlete_id",
+    "scheduled_date",
+    "workout_type",
+    "description",
+    "duration_minutes",
+    "target_tss",
+    "intervals",
+    "interval_count",
+    "status",
+    "environment",
+    "variant",
+    "terrain_suggestion",
+    "created_at",
+]
+
+
+def _parse_date(value: Any, field_name: str) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid {field_name}: {value!r}")
+
+
+def _optional_int(value: Any) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    return int(round(float(value)))
+
+
+def month_starts(start: date, end: date) -> List[date]:
+    """First day of every month between two dates, inclusive"""
+    months = []
+    current = date(start.year, start.month, 1)
+    while current <= end:
+        months.append(current)
+        current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+    return months
+
+
+def build_workout_records(
+    plan_id: int,
+    athlete_id: int,
+    workouts: List[Dict[str, Any]],
+    created_at: datetime
+) -> List[Tuple]:
+    """Turn workflow workout dicts into COPY records (same defaults as the n8n node)"""
+    records = []
+    for workout in workouts:
+        intervals = workout.get("intervals")
+        if isinstance(intervals, list):
+            intervals = {"data": intervals}
+        variant = workout.get("variant") or "indoor"
+        description = workout.get("description")
+        if not isinstance(description, str) or not description.strip():
+            description = f"{workout.get('workout_type', 'Planned')} workout"
+
+        records.append((
+            plan_id,
+            athlete_id,
+            _parse_date(workout.get("scheduled_date"), "scheduled_date"),
+            workout.get("workout_type"),
+            description,
+            _optional_int(workout.get("duration_minutes")),
+            _optional_int(workout.get("target_tss")),
+            json.dumps(intervals) if intervals is not None else None,
+            _optional_int(workout.get("interval_count")) or 0,
+            workout.get("status") or "planned",
+            workout.get("environment") or variant,
+            variant,
+            workout.get("terrain_suggestion") or "",
+            created_at,
+        ))
+    return records
+
+
+class PlanStore:
+    """Writes a whole plan (plan row + workouts) in one transaction"""
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    async def save_plan(
+        self,
+        athlete_id: int,
+        workouts: List[Dict[str, Any]],
+        goal: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Deactivate the athlete's active plans, insert the new plan and COPY
+        all of its planned_workouts atomically, then drop stale calendar caches
+        """
+        if not workouts:
+            raise ValueError("A plan needs at least one workout")
+        if not self.manager.pg_pool:
+            raise RuntimeError("PostgreSQL not available")
+
+        dates = sorted(_parse_date(w.get("scheduled_date"), "scheduled_date") for w in workouts)
+        plan_start = _parse_date(start_date, "start_date") if start_date else dates[0]
+        plan_end = _parse_date(end_date, "end_date") if end_date else dates[-1]
+        if plan_end < plan_start:
+            raise ValueError("end_date must not be before start_date")
+
+        now = datetime.now()
+
+        async with self.manager.pg_pool.acquire() as conn:
+            async with conn.transaction():
+                replaced = await conn.fetch("""
+                    UPDATE training_plans
+                    SET status = 'replaced'
+                    WHERE athlete_id = $1 AND status = 'active'
+                    RETURNING id, start_date, end_date
+                """, athlete_id)
+
+                plan_id = await conn.fetchval("""
+                    INSERT INTO training_plans
+                    (athlete_id, start_date, end_date, goal, status, created_at)
+                    VALUES ($1, $2, $3, $4, 'active', $5)
+                    RETURNING id
+                """, athlete_id, plan_start, plan_end, goal or "AI Generated Plan", now)
+
+                records = build_workout_records(plan_id, athlete_id, workouts, now)
+                await conn.copy_records_to_table(
+                    "planned_workouts",
+                    records=records,
+                    columns=WORKOUT_COLUMNS
+                )
+
+        # Months covered by the new plan and by any plan it replaced
+        touched = set(dates)
+        for row in replaced:
+            touched.update(month_starts(row["start_date"], row["end_date"]))
+        await self.manager.invalidate_plan_views(athlete_id, touched)
+
+        total_tss = sum(r[6] or 0 for r in records)
+        logger.info("Saved plan %s for athlete %s: %s workouts, replaced %s plan(s)",
+                    plan_id, athlete_id, len(records), len(replaced))
+
+        return {
+            "plan_id": plan_id,
+            "athlete_id": athlete_id,
+            "start_date": plan_start.isoformat(),
+            "end_date": plan_end.isoformat(),
+            "workouts_created": len(records),
+            "total_tss": total_tss,
+            "replaced_plan_ids": [row["id"] for row in replaced]
+        }
@@ -0,0 +1,210 @@
+"""
+Vectorized ride analytics over raw 1 Hz power / heart-rate streams
+Normalized power, IF, TSS, zone histograms and best-effort power curve,
+each computed in a handful of NumPy passes (10 h rides in milliseconds)
+"""
+from typing import Optional, Dict, Any, List, Sequence
+import numpy as np
+
+# Durations (seconds) of the mean-maximal power curve, 1 s to 60 min
+POWER_CURVE_DURATIONS = np.array([
+    1, 2, 3, 5, 10, 15, 20, 30, 45,
+    60, 90, 120, 180, 240, 300, 360, 420, 480, 600, 720,
+    900, 1200, 1500, 1800, 2400, 3000, 3600,
+], dtype=np.int32)
+
+# Coggan power zones as fractions of FTP (Z1 recovery .. Z7 neuromuscular)
+COGGAN_ZONE_FRACTIONS = [0.0, 0.55, 0.75, 0.90, 1.05, 1.20, 1.50]
+# Heart-rate zones as fractions of max HR when no custom zones are set
+DEFAULT_HR_ZONE_FRACTIONS = [0.0, 0.60, 0.70, 0.80, 0.90]
+
+NP_WINDOW = 30  # seconds
+# Time-stream gaps longer than this are stopped time (auto-pause, cafe stop)
+# and are cut out; shorter gaps are sensor dropouts while moving, filled with 0
+MAX_GAP_S = 5
+
+
+def validate_streams(time: Optional[Sequence[int]], *streams: Optional[Sequence[float]]) -> Optional[str]:
+    """Reason the streams can't be analyzed together, or None if they can"""
+    if time is None:
+        return None
+    if not len(time):
+        return "empty time stream"
+    for stream in streams:
+        if stream is not None and len(stream) and len(stream) != len(time):
+            return f"stream length {len(stream)} does not match time stream length {len(time)}"
+    if np.any(np.diff(np.asarray(time, dtype=np.int64)) <= 0):
+        return "time stream is not strictly increasing"
+    return None
+
+
+def moving_offsets(time: Sequence[int]) -> np.ndarray:
+    """Second offsets with stopped gaps collapsed, so only moving time remains"""
+    offsets = np.asarray(time, dtype=np.int64)
+    steps = np.diff(offsets)
+    steps[steps > MAX_GAP_S] = 1
+    return np.concatenate(([0], np.cumsum(steps)))
+
+
+def to_1hz(values: Sequence[float], time: Optional[Sequence[int]] = None) -> np.ndarray:
+    """
+    Stream as a float64 1 Hz array over moving time. With a Strava `time`
+    stream (validated by validate_streams), samples are placed at their
+    second offsets, short dropouts become 0 and stopped time is removed.
+    """
+    data = np.asarray(values, dtype=np.float64)
+    data = np.nan_to_num(data, nan=0.0, posinf=0.0, neginf=0.0)
+    np.maximum(data, 0.0, out=data)
+    if time is None:
+        return data
+
+    if not len(time):
+        return np.zeros(0)
+    offsets = moving_offsets(time)
+    out = np.zeros(int(offsets[-1]) + 1)
+    out[offsets] = data[:offsets.size]
+    return out
+
+
+def rolling_mean(data: np.ndarray, window: int) -> np.ndarray:
+    """Trailing moving average of full windows via a cumulative sum"""
+    if data.size < window:
+        return np.empty(0)
+    csum = np.cumsum(data, dtype=np.float64)
+    csum = np.concatenate(([0.0], csum))
+    return (csum[window:] - csum[:-window]) / window
+
+
+def normalized_power(watts: np.ndarray) -> float:
+    """NP: fourth-root of the mean of the 30 s rolling average to the 4th power"""
+    if watts.size == 0:
+        return 0.0
+    rolled = rolling_mean(watts, NP_WINDOW)
+    if rolled.size == 0:
+        return float(watts.mean())
+    return float(np.mean(rolled ** 4) ** 0.25)
+
+
+def intensity_factor(np_watts: float, ftp: Optional[float]) -> Optional[float]:
+    if not ftp or ftp <= 0:
+        return None
+    return np_watts / ftp
+
+
+def training_stress_score(duration_s: int, np_watts: float, ftp: Optional[float]) -> Optional[float]:
+    """TSS = (seconds x NP x IF) / (FTP x 3600) x 100"""
+    intensity = intensity_factor(np_watts, ftp)
+    if intensity is None:
+        return None
+    return duration_s * np_watts * intensity / (ftp * 3600) * 100
+
+
+def zone_edges_from_ftp(ftp: float) -> np.ndarray:
+    return np.asarray(COGGAN_ZONE_FRACTIONS) * ftp
+
+
+def zone_edges_from_max_hr(max_hr: float) -> np.ndarray:
+    return np.asarray(DEFAULT_HR_ZONE_FRACTIONS) * max_hr
+
+
+def zone_edges_from_strava(zones: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """Lower bounds from a Strava zones list ([{"min": .., "max": ..}, ...])"""
+    if not zones:
+        return None
+    lows = [z.get("min") for z in zones]
+    if any(v is None for v in lows):
+        return None
+    return np.asarray(sorted(lows), dtype=np.float64)
+
+
+def zone_seconds(data: np.ndarray, lower_edges: np.ndarray) -> np.ndarray:
+    """Seconds spent in each zone; zone i covers [edge_i, edge_i+1)"""
+    if data.size == 0:
+        return np.zeros(len(lower_edges), dtype=np.int64)
+    index = np.searchsorted(lower_edges, data, side="right") - 1
+    np.clip(index, 0, len(lower_edges) - 1, out=index)
+    return np.bincount(index, minlength=len(lower_edges))
+
+
+def zone_buckets(data: np.ndarray, lower_edges: np.ndarray) -> List[Dict[str, Any]]:
+    """Zone times in Strava's distribution_buckets shape (max -1 = open ended)"""
+    seconds = zone_seconds(data, lower_edges)
+    buckets = []
+    for i, low in enumerate(lower_edges):
+        high = lower_edges[i + 1] if i + 1 < len(lower_edges) else -1
+        buckets.append({"min": int(round(low)), "max": int(round(high)), "time": int(seconds[i])})
+    return buckets
+
+
+def power_curve(watts: np.ndarray, durations: np.ndarray = POWER_CURVE_DURATIONS) -> np.ndarray:
+    """
+    Best mean power for every duration (NaN where the ride is too short),
+    one cumulative sum plus one vectorized difference per duration
+    """
+    curve = np.full(len(durations), np.nan, dtype=np.float32)
+    if watts.size == 0:
+        return curve
+    csum = np.concatenate(([0.0], np.cumsum(watts, dtype=np.float64)))
+    for i, duration in enumerate(durations):
+        if duration > watts.size:
+            break
+        curve[i] = np.max(csum[duration:] - csum[:-duration]) / duration
+    return curve
+
+
+def analyze_ride(
+    watts: Optional[Sequence[float]] = None,
+    heart_rate: Optional[Sequence[float]] = None,
+    time: Optional[Sequence[int]] = None,
+    ftp: Optional[float] = None,
+    max_hr: Optional[float] = None,
+    power_zone_edges: Optional[np.ndarray] = None,
+    hr_zone_edges: Optional[np.ndarray] = None
+) -> Dict[str, Any]:
+    """
+    All ride metrics for one activity's streams. Durations, NP, TSS and zone
+    times cover moving time only; malformed streams yield an empty analysis
+    with the reason in "invalid_streams".
+    """
+    result: Dict[str, Any] = {"has_power": False, "has_heartrate": False}
+
+    problem = validate_streams(time, watts, heart_rate)
+    if problem:
+        result["invalid_streams"] = problem
+        return result
+
+    if time is not None:
+        result["elapsed_s"] = int(time[-1] - time[0]) + 1
+
+    if watts is not None and len(watts):
+        power = to_1hz(watts, time)
+        np_watts = normalized_power(power)
+        edges = power_zone_edges
+        if edges is None and ftp:
+            edges = zone_edges_from_ftp(ftp)
+        result.update({
+            "has_power": True,
+            "duration_s": int(power.size),
+            "avg_power": float(power.mean()),
+            "max_power": float(power.max()),
+            "np_watts": np_watts,
+            "intensity_factor": intensity_factor(np_watts, ftp),
+            "tss": training_stress_score(power.size, np_watts, ftp),
+            "power_zones": zone_buckets(power, edges) if edges is not None else None,
+            "power_curve": power_curve(power),
+        })
+
+    if heart_rate is not None and len(heart_rate):
+        hr = to_1hz(heart_rate, time)
+        edges = hr_zone_edges
+        if edges is None:
+            edges = zone_edges_from_max_hr(max_hr or float(hr.max()))
+        recorded = hr[hr > 0]
+        result.update({
+            "has_heartrate": True,
+            "avg_heart_rate": float(recorded.mean()) if recorded.size else None,
+            "max_heart_rate": float(hr.max()),
+            "hr_zones": zone_buckets(recorded, edges),
+        })
+
+    return result
@@ -0,0 +1,157 @@
+"""
+PowerCurveStore - per-athlete daily mean-maximal power curves
+Each ride's curve is merged into its day with an elementwise max in SQL, so
+history is never rescanned; 42/90-day bests are a max over at most 90 rows.
+"""
+import logging
+import json
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, Any, List, Sequence
+import numpy as np
+
+from power import POWER_CURVE_DURATIONS
+
+logger = logging.getLogger(__name__)
+
+
+class PowerCurveConfig:
+    """Power curve configuration"""
+    DEFAULT_WINDOWS = (42, 90)  # days
+    MAX_WINDOW = 365
+    CACHE_TTL = 3600  # 1 hour; invalidated when a merge raises the curve
+
+
+# Returns nothing when the merged curve equals the stored one, so callers
+# can tell whether the athlete's curve actually changed
+MERGE_CURVE_SQL = """
+    INSERT INTO athlete_power_curves (athlete_id, curve_date, curve, updated_at)
+    VALUES ($1, $2, $3::real[], NOW())
+    ON CONFLICT (athlete_id, curve_date) DO UPDATE SET
+        curve = power_curve_max(athlete_power_curves.curve, EXCLUDED.curve),
+        updated_at = NOW()
+    WHERE power_curve_max(athlete_power_curves.curve, EXCLUDED.curve)
+          IS DISTINCT FROM athlete_power_curves.curve
+    RETURNING curve_date
+"""
+
+
+def curve_to_db(curve: np.ndarray) -> List[Optional[float]]:
+    """float32 curve -> REAL[] values (NaN becomes NULL)"""
+    return [None if np.isnan(v) else round(float(v), 1) for v in curve]
+
+
+def curve_from_db(values: Optional[Sequence[Optional[float]]]) -> np.ndarray:
+    """REAL[] values -> float32 curve (NULL becomes NaN)"""
+    curve = np.full(len(POWER_CURVE_DURATIONS), np.nan, dtype=np.float32)
+    if values:
+        data = np.array([np.nan if v is None else v for v in values], dtype=np.float32)
+        curve[:min(data.size, curve.size)] = data[:curve.size]
+    return curve
+
+
+def merge_curves(curves: Sequence[np.ndarray]) -> np.ndarray:
+    """Elementwise best of several curves, ignoring NaN"""
+    if not len(curves):
+        return np.full(len(POWER_CURVE_DURATIONS), np.nan, dtype=np.float32)
+    with np.errstate(invalid="ignore"):
+        return np.fmax.reduce(np.vstack(curves), axis=0).astype(np.float32)
+
+
+def window_curves(rows: Sequence[Dict[str, Any]], windows: Sequence[int], as_of: date) -> Dict[int, np.ndarray]:
+    """Best curve for each trailing window (in days, inclusive of as_of)"""
+    if not rows:
+        return {w: merge_curves([]) for w in windows}
+    dates = np.array([r["curve_date"] for r in rows], dtype="datetime64[D]")
+    stacked = np.vstack([curve_from_db(r["curve"]) for r in rows])
+    age = (np.datetime64(as_of, "D") - dates).astype(np.int64)
+    return {w: merge_curves(stacked[(age >= 0) & (age < w)]) for w in windows}
+
+
+class PowerCurveStore:
+    """Incremental power curve storage with cached window lookups"""
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    def _cache_key(self, athlete_id: int) -> str:
+        return f"athlete:power_curve:{athlete_id}"
+
+    async def merge_ride(self, athlete_id: int, ride_date: Any, curve: np.ndarray, conn=None) -> bool:
+        """
+        Merge one ride's curve into its day. Returns True when the stored
+        curve was created or raised.
+        """
+        if isinstance(ride_date, datetime):
+            ride_date = ride_date.date()
+        if ride_date is None or curve is None or np.all(np.isnan(curve)):
+            return False
+
+        values = curve_to_db(curve)
+        if conn is None:
+            async with self.manager.pg_pool.acquire() as conn:
+                changed = await conn.fetchval(MERGE_CURVE_SQL, athlete_id, ride_date, values)
+        else:
+            changed = await conn.fetchval(MERGE_CURVE_SQL, athlete_id, ride_date, values)
+
+        if changed is not None:
+            await self.invalidate(athlete_id)
+        return changed is not None
+
+    async def invalidate(self, athlete_id: int):
+        if not self.manager.redis_client:
+            return
+        try:
+            await self.manager.redis_client.delete(self._cache_key(athlete_id))
+        except Exception as e:
+            logger.warning("Redis power curve invalidation error: %s", e)
+
+    async def _load_rows(self, athlete_id: int, since: date) -> List[Dict[str, Any]]:
+        async with self.manager.pg_pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT curve_date, curve
+                FROM athlete_power_curves
+                WHERE athlete_id = $1 AND curve_date >= $2
+                ORDER BY curve_date
+            """, athlete_id, since)
+        return [dict(r) for r in rows]
+
+    async def get_windows(
+        self,
+        athlete_id: int,
+        windows: Sequence[int] = PowerCurveConfig.DEFAULT_WINDOWS,
+        as_of: Optional[date] = None
+    ) -> Dict[str, Any]:
+        """Best power for each duration over trailing day windows"""
+        as_of = as_of or date.today()
+        windows = sorted(set(windows))
+        use_cache = tuple(windows) == tuple(PowerCurveConfig.DEFAULT_WINDOWS) and as_of == date.today()
+
+        if use_cache and self.manager.redis_client:
+            try:
+                cached = await self.manager.redis_client.get(self._cache_key(athlete_id))
+                if cached:
+                    data = json.loads(cached)
+                    # Windows roll over at midnight
+                    if data.get("as_of") == as_of.isoformat():
+                        return data
+            except Exception as e:
+                logger.warning("Redis power curve read error: %s", e)
+
+        rows = await self._load_rows(athlete_id, as_of - timedelta(days=max(windows) - 1))
+        curves = window_curves(rows, windows, as_of)
+        result = {
+            "athlete_id": athlete_id,
+            "as_of": as_of.isoformat(),
+            "durations": POWER_CURVE_DURATIONS.tolist(),
+            "windows": {str(w): curve_to_db(curves[w]) for w in windows},
+            "days_with_data": len(rows),
+        }
+
+        if use_cache and self.manager.redis_client:
+            try:
+                await self.manager.redis_client.setex(
+                    self._cache_key(athlete_id), PowerCurveConfig.CACHE_TTL, json.dumps(result)
+                )
+            except Exception as e:
+                logger.warning("Redis power curve write error: %s", e)
+        return result
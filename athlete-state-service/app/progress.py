@@ -0,0 +1,103 @@
+"""
+ProgressBroker - pushes plan generation progress to server-sent event streams
+Replaces dashboard polling of the Generation_Status_Checker workflow. Events
+come from PostgreSQL NOTIFY (plan_generation_jobs and planned_workouts
+triggers, via CacheInvalidationListener), so every replica sees jobs run by
+any replica and plans written by n8n. A waiting client costs one idle
+queue: no polling and no queries until something actually changes.
+"""
+import json
+import asyncio
+import logging
+from typing import Optional, Dict, Any, Set, List, Callable, AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressConfig:
+    """Progress stream configuration"""
+    QUEUE_SIZE = 100  # per subscriber; oldest events dropped beyond this
+    KEEPALIVE = 15  # seconds between SSE comments so proxies keep the stream open
+    MAX_STREAM_SECONDS = 900  # EventSource reconnects on its own after this
+    RETRY_MS = 3000  # reconnect delay advertised to EventSource
+
+
+def job_event(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Stream event for a job snapshot (PlanJob.to_dict() or a NOTIFY payload)"""
+    return {
+        "type": "job",
+        "job_id": str(job.get("job_id") or job.get("id")),
+        "status": job.get("status"),
+        "complete": job.get("status") == "completed",
+        "progress": job.get("progress"),
+        "message": job.get("message"),
+    }
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+class ProgressBroker:
+    """In-process fan-out of per-athlete progress events"""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, athlete_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=ProgressConfig.QUEUE_SIZE)
+        self._subscribers.setdefault(athlete_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, athlete_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(athlete_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[athlete_id]
+
+    def publish(self, athlete_id: int, event: Dict[str, Any]):
+        for queue in self._subscribers.get(athlete_id, ()):
+            if queue.full():
+                # A stalled client loses its oldest update, not the newest
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+        self.published += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "athletes": len(self._subscribers),
+            "subscribers": sum(len(q) for q in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+    async def stream(self, athlete_id: int, queue: asyncio.Queue, initial: List[Dict[str, Any]],
+                     until: Optional[Callable[[Dict[str, Any]], bool]] = None) -> AsyncIterator[str]:
+        """
+        SSE body for a queue from subscribe(): the initial snapshot, then live
+        events until `until(event)` is true or MAX_STREAM_SECONDS pass.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + ProgressConfig.MAX_STREAM_SECONDS
+        try:
+            yield f"retry: {ProgressConfig.RETRY_MS}\n\n"
+            for event in initial:
+                yield format_sse(event)
+                if until and until(event):
+                    return
+            while loop.time() < deadline:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=ProgressConfig.KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+                if until and until(event):
+                    return
+        finally:
+            self.unsubscribe(athlete_id, queue)
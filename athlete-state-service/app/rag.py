@@ -0,0 +1,170 @@
+"""
+RagRetriever - batched knowledge-base retrieval for plan generation
+Embeds every day's query in one Ollama call and fetches top-k chunks
+for all of them in a single PostgreSQL round trip
+"""
+import logging
+import json
+from typing import Optional, Dict, Any, List, Tuple
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class RagConfig:
+    """RAG configuration"""
+    OLLAMA_EMBED_URL = "http://host.docker.internal:11434/api/embed"
+    EMBED_MODEL = "nomic-embed-text"
+    EMBED_DIMENSIONS = 768
+    EMBED_TIMEOUT = 60  # seconds
+    DEFAULT_TOP_K = 3
+    MAX_TOP_K = 10
+    MAX_QUERIES = 64
+    # Same filter the n8n "Query Vector DB" node uses
+    DEFAULT_SOURCE_PATTERNS = ["%zwift%", "%zwo%"]
+
+
+def dedupe_queries(queries: List[Dict[str, Any]]) -> Tuple[List[str], List[Optional[int]]]:
+    """
+    Collapse identical query texts.
+    Returns the unique texts and, for every input query, the index of its
+    unique text (None for rest days / empty queries that skip RAG).
+    """
+    unique_texts: List[str] = []
+    positions: Dict[str, int] = {}
+    mapping: List[Optional[int]] = []
+
+    for item in queries:
+        text = (item.get("query") or "").strip()
+        if not text or item.get("skip_rag"):
+            mapping.append(None)
+            continue
+        if text not in positions:
+            positions[text] = len(unique_texts)
+            unique_texts.append(text)
+        mapping.append(positions[text])
+
+    return unique_texts, mapping
+
+
+class RagRetriever:
+    """Batch embedding + vector search over training_knowledge"""
+
+    def __init__(self):
+        self.pg_pool = None
+        self.http_client: Optional[httpx.AsyncClient] = None
+
+    async def initialize(self, pg_pool):
+        """Share the manager's pool and open a pooled HTTP client for Ollama"""
+        self.pg_pool = pg_pool
+        self.http_client = httpx.AsyncClient(timeout=RagConfig.EMBED_TIMEOUT)
+        logger.info("RAG retriever ready")
+
+    async def cleanup(self):
+        """Close the HTTP client"""
+        if self.http_client:
+            await self.http_client.aclose()
+            self.http_client = None
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed all texts with a single Ollama /api/embed call"""
+        if not texts:
+            return []
+        if not self.http_client:
+            raise RuntimeError("RAG retriever not initialized")
+
+        response = await self.http_client.post(
+            RagConfig.OLLAMA_EMBED_URL,
+            json={"model": RagConfig.EMBED_MODEL, "input": texts}
+        )
+        response.raise_for_status()
+        embeddings = response.json().get("embeddings") or []
+
+        if len(embeddings) != len(texts):
+            raise ValueError(
+                f"Expected {len(texts)} embeddings from Ollama, got {len(embeddings)}"
+            )
+        for embedding in embeddings:
+            if len(embedding) != RagConfig.EMBED_DIMENSIONS:
+                raise ValueError(
+                    f"Embedding has {len(embedding)} dimensions, "
+                    f"expected {RagConfig.EMBED_DIMENSIONS}"
+                )
+        return embeddings
+
+    async def search_batch(
+        self,
+        embeddings: List[List[float]],
+        top_k: int,
+        source_patterns: List[str]
+    ) -> List[List[Dict[str, Any]]]:
+        """Top-k neighbours for every embedding in one query (LATERAL join)"""
+        if not embeddings:
+            return []
+        if not self.pg_pool:
+            raise RuntimeError("PostgreSQL not available")
+
+        # pgvector accepts the '[x, y, ...]' text form, so no codec is needed
+        vectors = [json.dumps(e) for e in embeddings]
+
+        async with self.pg_pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT q.idx, k.content, k.source,
+                       ROUND((1 - k.distance)::numeric, 3) AS similarity
+                FROM (
+                    SELECT idx, vec::vector AS vec
+                    FROM unnest($1::text[]) WITH ORDINALITY AS u(vec, idx)
+                ) q
+                CROSS JOIN LATERAL (
+                    SELECT content, source, embedding <=> q.vec AS distance
+                    FROM training_knowledge
+                    WHERE source LIKE ANY($3::text[])
+                    ORDER BY embedding <=> q.vec
+                    LIMIT $2
+                ) k
+                ORDER BY q.idx, k.distance
+            """, vectors, top_k, source_patterns)
+
+        results: List[List[Dict[str, Any]]] = [[] for _ in embeddings]
+        for row in rows:
+            results[row['idx'] - 1].append({
+                "content": row['content'],
+                "source": row['source'],
+                "similarity": float(row['similarity'])
+            })
+        return results
+
+    async def retrieve_batch(
+        self,
+        queries: List[Dict[str, Any]],
+        top_k: int = RagConfig.DEFAULT_TOP_K,
+        source_patterns: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Resolve RAG context for every day of a plan.
+        Each query is {"key": ..., "query": ..., "skip_rag": bool}; results
+        come back in the same order, keyed the same way.
+        """
+        unique_texts, mapping = dedupe_queries(queries)
+        logger.info("RAG batch: %s queries, %s unique", len(queries), len(unique_texts))
+
+        embeddings = await self.embed_batch(unique_texts)
+        matches = await self.search_batch(
+            embeddings,
+            top_k,
+            source_patterns or RagConfig.DEFAULT_SOURCE_PATTERNS
+        )
+
+        results = []
+        for position, (item, unique_index) in enumerate(zip(queries, mapping)):
+            results.append({
+                "key": item.get("key", position),
+                "skipped": unique_index is None,
+                "rag_results": matches[unique_index] if unique_index is not None else []
+            })
+
+        return {
+            "total_queries": len(queries),
+            "unique_queries": len(unique_texts),
+            "results": results
+        }
@@ -0,0 +1,249 @@
+"""
+Redis access layer - sized connection pool and tracked client-side cache
+redis.from_url gave every worker an unbounded pool: a burst opened as many
+sockets as there were concurrent requests, and a Redis stall turned into
+"Too many connections" instead of back-pressure. create_client builds a
+BlockingConnectionPool sized by REDIS_MAX_CONNECTIONS whose callers wait up
+to REDIS_POOL_TIMEOUT for a free connection.
+
+TrackedCache keeps recently read athlete:state: values in process memory.
+Redis 6+ server-assisted client-side caching keeps it coherent: a
+dedicated connection enables CLIENT TRACKING in broadcast mode for the
+tracked prefixes, redirecting invalidations to a second connection
+subscribed to __redis__:invalidate (the RESP2 form, so it works with
+redis-py's RESP2 connections). Any write to a tracked key, from any
+replica, evicts it locally. Against older servers, or while the
+invalidation connections are down, the cache is off and every read goes
+to Redis.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+
+from metrics import registry, REDIS_ERRORS
+
+logger = logging.getLogger(__name__)
+
+
+class RedisConfig:
+    """Redis pool and client-side cache configuration"""
+    MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))  # per worker
+    POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "2"))  # seconds waiting for a connection
+    SOCKET_TIMEOUT = 5
+    HEALTH_CHECK_INTERVAL = 30  # idle pooled connections are PINGed before reuse
+    TRACKING = os.getenv("REDIS_CLIENT_TRACKING", "true").lower() == "true"
+    TRACKED_PREFIXES = ("athlete:state:",)
+    LOCAL_MAX_KEYS = int(os.getenv("REDIS_LOCAL_CACHE_KEYS", "10000"))
+    # Bounds staleness should an invalidation ever be lost with the connection
+    # still up; invalidations normally evict within a round trip
+    LOCAL_TTL = 60  # seconds
+    HEARTBEAT = 5  # seconds between PINGs on the invalidation connections
+    RECONNECT_DELAY = 2  # seconds, doubled up to 30 while Redis is unreachable
+    INVALIDATE_CHANNEL = "__redis__:invalidate"
+
+
+def create_client(url: str) -> redis.Redis:
+    """Redis client over an explicitly sized, blocking connection pool"""
+    pool = redis.BlockingConnectionPool.from_url(
+        url,
+        max_connections=RedisConfig.MAX_CONNECTIONS,
+        timeout=RedisConfig.POOL_TIMEOUT,
+        encoding="utf-8",
+        decode_responses=True,
+        socket_connect_timeout=5,
+        socket_timeout=RedisConfig.SOCKET_TIMEOUT,
+        health_check_interval=RedisConfig.HEALTH_CHECK_INTERVAL,
+    )
+    registry.gauge(
+        "redis_pool_connections", "Redis pool connections by state", ["state"],
+        lambda: pool_stats(pool)
+    )
+    # from_pool: closing the client also closes its pool
+    return redis.Redis.from_pool(pool)
+
+
+def pool_stats(pool) -> Dict[Tuple[str], int]:
+    in_use = len(getattr(pool, "_in_use_connections", ()))
+    # BlockingConnectionPool pre-fills its queue with None placeholders
+    idle = sum(1 for c in getattr(pool, "_available_connections", ()) if c is not None)
+    return {("in_use",): in_use, ("idle",): idle, ("max",): pool.max_connections}
+
+
+class TrackedCache:
+    """In-process cache of tracked Redis keys, evicted by server invalidations"""
+
+    def __init__(self, client, prefixes=RedisConfig.TRACKED_PREFIXES,
+                 max_keys: int = RedisConfig.LOCAL_MAX_KEYS):
+        self.client = client
+        self.prefixes = tuple(prefixes)
+        self.max_keys = max_keys
+        self.enabled = False  # invalidations are flowing
+        self.supported = True  # False once the server refused CLIENT TRACKING
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # key -> token of the read in flight; an invalidation during the read
+        # removes it, so a value that may already be stale is never stored
+        self._pending: Dict[str, object] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._tracking_conn = None
+        self._subscriber = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.flushes = 0
+        self.reconnects = 0
+
+    async def initialize(self):
+        if not RedisConfig.TRACKING:
+            logger.info("Redis client-side caching disabled")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def cleanup(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._disconnect()
+
+    def tracks(self, key: str) -> bool:
+        return key.startswith(self.prefixes)
+
+    async def get(self, key: str):
+        """GET through the local cache; plain GET while it is disabled"""
+        if not self.enabled or not self.tracks(key):
+            return await self.client.get(key)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+        self.misses += 1
+        token = object()
+        self._pending[key] = token
+        try:
+            value = await self.client.get(key)
+        finally:
+            stored = self._pending.get(key) is token
+            if stored:
+                del self._pending[key]
+        # Absent keys are not cached: the first write is what fills them
+        if stored and value is not None and self.enabled:
+            self._entries[key] = (time.monotonic() + RedisConfig.LOCAL_TTL, value)
+            if len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, keys):
+        """Apply an invalidation message; None means flush everything"""
+        if keys is None:
+            self.flush()
+            return
+        if isinstance(keys, str):
+            keys = [keys]
+        for key in keys:
+            self._entries.pop(key, None)
+            self._pending.pop(key, None)
+            self.invalidations += 1
+
+    def flush(self):
+        self._entries.clear()
+        self._pending.clear()
+        self.flushes += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "supported": self.supported,
+            "keys": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+            "flushes": self.flushes,
+            "reconnects": self.reconnects,
+        }
+
+    # ---------- invalidation connections ----------
+
+    async def _run(self):
+        delay = RedisConfig.RECONNECT_DELAY
+        while True:
+            try:
+                await self._connect()
+                delay = RedisConfig.RECONNECT_DELAY
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except ResponseError as e:
+                # Redis < 6 (or CLIENT disabled by ACL): stay on plain GETs
+                self.supported = False
+                logger.info("Redis client-side caching unavailable: %s", e)
+                await self._disconnect()
+                return
+            except Exception as e:
+                REDIS_ERRORS.inc("tracking")
+                logger.warning("Redis invalidation connection lost, local cache off: %s", e)
+            await self._disconnect()
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    async def _connect(self):
+        pool = self.client.connection_pool
+        self._subscriber = pool.make_connection()
+        await self._subscriber.connect()
+        await self._subscriber.send_command("CLIENT", "ID")
+        subscriber_id = await self._subscriber.read_response()
+        await self._subscriber.send_command("SUBSCRIBE", RedisConfig.INVALIDATE_CHANNEL)
+        await self._subscriber.read_response()
+
+        self._tracking_conn = pool.make_connection()
+        await self._tracking_conn.connect()
+        args = ["CLIENT", "TRACKING", "ON", "REDIRECT", subscriber_id, "BCAST"]
+        for prefix in self.prefixes:
+            args.extend(["PREFIX", prefix])
+        await self._tracking_conn.send_command(*args)
+        await self._tracking_conn.read_response()
+        # Entries kept while disconnected may have missed invalidations
+        self.flush()
+        self.enabled = True
+        logger.info("Redis client-side caching on for %s", ", ".join(self.prefixes))
+
+    async def _listen(self):
+        last_ping = time.monotonic()
+        while True:
+            message = await self._subscriber.read_response(timeout=RedisConfig.HEARTBEAT)
+            if message is not None:
+                self._on_message(message)
+            if time.monotonic() - last_ping >= RedisConfig.HEARTBEAT:
+                # Tracking ends silently if its connection drops: prove both alive
+                await self._tracking_conn.send_command("PING")
+                await self._tracking_conn.read_response()
+                await self._subscriber.send_command("PING")
+                last_ping = time.monotonic()
+
+    def _on_message(self, message):
+        # ["message", "__redis__:invalidate", [keys] | None]; PING replies
+        # arrive as ["pong", ""] while subscribed
+        if isinstance(message, list) and len(message) == 3 and message[0] == "message":
+            self.invalidate(message[2])
+
+    async def _disconnect(self):
+        self.enabled = False
+        self.flush()
+        for conn in (self._tracking_conn, self._subscriber):
+            if conn is not None:
+                try:
+                    await conn.disconnect()
+                except Exception:
+                    pass
+        self._tracking_conn = self._subscriber = None
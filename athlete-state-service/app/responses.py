@@ -0,0 +1,142 @@
+"""
+Fast JSON rendering and response compression
+FastJSONResponse renders with orjson (datetime, date, UUID and numpy arrays
+natively; Decimal as float) instead of FastAPI's jsonable_encoder +
+json.dumps. Endpoints with large payloads return it directly, which also
+skips FastAPI's per-field pre-encoding pass.
+
+CompressionMiddleware compresses complete (single-message) responses above
+COMPRESS_MIN_SIZE with brotli when the client accepts it and the optional
+brotli package is installed, otherwise gzip. Streaming responses (server-sent
+events, file downloads) pass through untouched.
+"""
+import os
+import gzip
+import decimal
+from typing import Any, Optional
+
+import orjson
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+from metrics import HTTP_RESPONSE_BYTES
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+class ResponseConfig:
+    """Response rendering / compression configuration"""
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))  # bytes
+    GZIP_LEVEL = 5
+    BROTLI_QUALITY = 4  # close to gzip speed, noticeably smaller on JSON
+    COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "text/csv")
+
+
+def _default(value: Any):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(
+        content, default=_default,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def accepted_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """"br" or "gzip" from an Accept-Encoding header, None for identity"""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=ResponseConfig.BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=ResponseConfig.GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """ASGI middleware: compress complete responses above a size threshold"""
+
+    def __init__(self, app, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = ResponseConfig.COMPRESS_MIN_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = accepted_encoding(Headers(scope=scope).get("accept-encoding"))
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Held until the first body chunk shows whether it is complete
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            response_start, start = start, None
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                await send(response_start)  # streaming: pass through
+                await send(message)
+                return
+            headers = MutableHeaders(raw=response_start["headers"])
+            used = None
+            if self._compressible(response_start, headers, body):
+                headers.add_vary_header("Accept-Encoding")
+                used = encoding
+            if used:
+                HTTP_RESPONSE_BYTES.inc(used, "rendered", amount=len(body))
+                body = compress(body, used)
+                headers["Content-Encoding"] = used
+                headers["Content-Length"] = str(len(body))
+                message = {**message, "body": body}
+            HTTP_RESPONSE_BYTES.inc(used or "identity", "sent", amount=len(body))
+            await send(response_start)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, start, headers: MutableHeaders, body: bytes) -> bool:
+        if len(body) < self.minimum_size or start["status"] in (204, 206, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        return content_type in ResponseConfig.COMPRESSIBLE_TYPES
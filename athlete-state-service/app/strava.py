@@ -0,0 +1,305 @@
+"""
+Strava API access - pooled HTTP client, per-athlete rate limiting and the
+activity -> rides row transform (port of the n8n "Tranform rides now" and
+"zone transformer" nodes)
+"""
+import logging
+import os
+import json
+import time
+import asyncio
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+import httpx
+
+from power import training_stress_score
+
+logger = logging.getLogger(__name__)
+
+
+class StravaConfig:
+    """Strava API configuration"""
+    API_BASE = os.getenv("STRAVA_API_BASE", "https://www.strava.com/api/v3")
+    REQUEST_TIMEOUT = 20  # seconds
+    MAX_CONNECTIONS = 20
+    # Per-athlete politeness: burst of 4 requests, refilling 1 per second
+    ATHLETE_BURST = 4
+    ATHLETE_RATE = 1.0
+    DEFAULT_FTP = 242  # same fallback as the n8n transform
+
+
+STREAM_KEYS = "time,watts,heartrate"
+
+
+class StravaRateLimited(Exception):
+    """Strava answered 429; retry_after is in seconds"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Strava rate limit hit, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class StravaAuthError(Exception):
+    """Strava rejected the athlete's access token"""
+
+
+class TokenBucket:
+    """Classic token bucket; acquire() waits until a token is available"""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate  # tokens per second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, tokens: float = 1) -> float:
+        """Seconds until `tokens` are available (0 if available now)"""
+        self._refill()
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1):
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep(self.wait_time(tokens))
+
+
+class StravaClient:
+    """Shared, connection-pooled Strava API client"""
+
+    def __init__(self, api_base: str = StravaConfig.API_BASE):
+        self.api_base = api_base.rstrip("/")
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self._athlete_buckets: Dict[int, TokenBucket] = {}
+
+    async def initialize(self):
+        self.http_client = httpx.AsyncClient(
+            base_url=self.api_base,
+            timeout=StravaConfig.REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=StravaConfig.MAX_CONNECTIONS,
+                max_keepalive_connections=StravaConfig.MAX_CONNECTIONS
+            )
+        )
+
+    async def cleanup(self):
+        if self.http_client:
+            await self.http_client.aclose()
+            self.http_client = None
+
+    def _bucket(self, athlete_id: int) -> TokenBucket:
+        bucket = self._athlete_buckets.get(athlete_id)
+        if bucket is None:
+            bucket = TokenBucket(StravaConfig.ATHLETE_BURST, StravaConfig.ATHLETE_RATE)
+            self._athlete_buckets[athlete_id] = bucket
+        return bucket
+
+    async def get(self, athlete_id: int, access_token: str, path: str,
+                  params: Optional[Dict[str, Any]] = None) -> Any:
+        """GET a Strava resource on behalf of an athlete"""
+        await self._bucket(athlete_id).acquire()
+
+        response = await self.http_client.get(
+            path,
+            params=params,
+            headers={"Authorization": f"Bearer {access_token.strip()}"}
+        )
+        if response.status_code == 429:
+            raise StravaRateLimited(float(response.headers.get("Retry-After", 60)))
+        if response.status_code == 401:
+            raise StravaAuthError(f"Strava rejected token for athlete {athlete_id}")
+        response.raise_for_status()
+        return response.json()
+
+    async def get_activity_bundle(
+        self, athlete_id: int, access_token: str, activity_id: int
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, List[float]]]:
+        """Fetch an activity, its zones and its raw streams concurrently"""
+        activity, zones, streams = await asyncio.gather(
+            self.get(athlete_id, access_token, f"/activities/{activity_id}"),
+            self.get(athlete_id, access_token, f"/activities/{activity_id}/zones"),
+            self.get(athlete_id, access_token, f"/activities/{activity_id}/streams",
+                     params={"keys": STREAM_KEYS, "key_by_type": "true"}),
+            return_exceptions=True
+        )
+        if isinstance(activity, Exception):
+            raise activity
+        # Zones need a Summit subscription on some accounts and manual
+        # activities have no streams; the ride still counts without them
+        for name, value in (("Zones", zones), ("Streams", streams)):
+            if isinstance(value, StravaRateLimited):
+                raise value
+            if isinstance(value, Exception):
+                logger.warning("%s unavailable for activity %s: %s", name, activity_id, value)
+        if isinstance(zones, Exception):
+            zones = []
+        if isinstance(streams, Exception) or not isinstance(streams, dict):
+            streams = {}
+        return activity, zones or [], {k: v.get("data") or [] for k, v in streams.items()}
+
+
+def _to_int(value: Any) -> Optional[int]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return int(round(value))
+
+
+def _to_float(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return round(float(value), 2)
+
+
+def transform_zones(zones: List[Dict[str, Any]]) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """Split /activities/{id}/zones into (heart rate, power) JSONB values"""
+    heart_rate_zones = None
+    power_zones = None
+    for zone in zones:
+        if zone.get("type") == "heartrate":
+            heart_rate_zones = {
+                "zones": zone.get("distribution_buckets"),
+                "custom_zones": zone.get("custom_zones", False),
+                "score": zone.get("score"),
+                "sensor_based": zone.get("sensor_based"),
+                "points": zone.get("points")
+            }
+        elif zone.get("type") == "power":
+            power_zones = {
+                "zones": zone.get("distribution_buckets"),
+                "sensor_based": zone.get("sensor_based")
+            }
+    return heart_rate_zones, power_zones
+
+
+def transform_activity(activity: Dict[str, Any], zones: List[Dict[str, Any]],
+                       athlete_id: int, ftp: Optional[int],
+                       analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Build a rides row from a Strava activity. When stream analytics are
+    available they replace the summary-derived NP, TSS and zone times.
+    """
+    ftp = ftp or StravaConfig.DEFAULT_FTP
+    np_watts = _to_int(activity.get("weighted_average_watts"))
+    moving_time = activity.get("moving_time") or 0
+    duration_min = _to_int(moving_time / 60)
+
+    # Same formula (and scale: 1 h at FTP = 100) as the stream analytics
+    tss = None
+    if np_watts and ftp > 0 and moving_time:
+        tss = round(training_stress_score(moving_time, np_watts, ftp), 2)
+    if tss is None:
+        tss = _to_float(activity.get("suffer_score"))
+
+    heart_rate_zones, power_zones = transform_zones(zones)
+
+    if analysis and analysis.get("has_power"):
+        np_watts = int(round(analysis["np_watts"]))
+        if analysis.get("tss") is not None:
+            tss = round(analysis["tss"], 2)
+        if analysis.get("power_zones"):
+            power_zones = {"zones": analysis["power_zones"], "sensor_based": True, "source": "stream"}
+    if analysis and analysis.get("has_heartrate") and analysis.get("hr_zones"):
+        heart_rate_zones = {
+            **(heart_rate_zones or {}),
+            "zones": analysis["hr_zones"],
+            "sensor_based": True,
+            "source": "stream"
+        }
+
+    ride_date = activity.get("start_date_local") or activity.get("start_date")
+
+    return {
+        "athlete_id": athlete_id,
+        "strava_activity_id": activity["id"],
+        "ride_date": datetime.fromisoformat(ride_date.replace("Z", "")) if ride_date else None,
+        "title": activity.get("name"),
+        "distance_km": round((activity.get("distance") or 0) / 1000, 2),
+        "duration_min": duration_min,
+        "avg_power_watts": _to_int(activity.get("average_watts")),
+        "avg_heart_rate": _to_int(activity.get("average_heartrate")),
+        "tss": tss,
+        "source": "strava",
+        "external_id": activity["id"],
+        "np_watts": np_watts,
+        "time_in_power_zones": json.dumps(power_zones) if power_zones else None,
+        "time_in_heart_rate_zones": json.dumps(heart_rate_zones) if heart_rate_zones else None,
+        "strava_external_id": activity.get("external_id"),
+        "max_power_watts": _to_int(activity.get("max_watts")),
+        "max_heart_rate": _to_int(activity.get("max_heartrate")),
+        "avg_cadence": _to_int(activity.get("average_cadence")),
+        "max_cadence": _to_int(activity.get("max_cadence")),
+        "elevation_gain": _to_int(activity.get("total_elevation_gain")),
+        "elevation_high": _to_float(activity.get("elev_high")),
+        "elevation_low": _to_float(activity.get("elev_low")),
+        "avg_temperature": _to_float(activity.get("average_temp")),
+        "kilojoules": _to_int(activity.get("kilojoules")),
+        "calories": _to_int(activity.get("calories")),
+        "workout_type": _to_int(activity.get("workout_type")),
+        "device_name": activity.get("device_name"),
+        "description": activity.get("description"),
+        "gear_id": activity.get("gear_id"),
+        "has_heartrate": bool(activity.get("has_heartrate")),
+        "has_power": bool(activity.get("has_power")),
+        "heartrate_opt_out": bool(activity.get("heartrate_opt_out")),
+        "display_hide_heartrate_option": bool(activity.get("display_hide_heartrate_option")),
+        "perceived_exertion": _to_float(activity.get("perceived_exertion")),
+    }
+
+
+RIDE_COLUMNS = [
+    "athlete_id", "strava_activity_id", "ride_date", "title", "distance_km",
+    "duration_min", "avg_power_watts", "avg_heart_rate", "tss", "source",
+    "external_id", "np_watts", "time_in_power_zones", "time_in_heart_rate_zones",
+    "strava_external_id", "max_power_watts", "max_heart_rate", "avg_cadence",
+    "max_cadence", "elevation_gain", "elevation_high", "elevation_low",
+    "avg_temperature", "kilojoules", "calories", "workout_type", "device_name",
+    "description", "gear_id", "has_heartrate", "has_power", "heartrate_opt_out",
+    "display_hide_heartrate_option", "perceived_exertion",
+]
+
+# Explicit casts let asyncpg bind python values regardless of the column type
+_COLUMN_CASTS = {
+    "time_in_power_zones": "::jsonb",
+    "time_in_heart_rate_zones": "::jsonb",
+    "external_id": "::bigint",
+}
+
+
+def _insert_rides_sql(on_conflict: str) -> str:
+    placeholders = ", ".join(
+        f"${i}{_COLUMN_CASTS.get(column, '')}"
+        for i, column in enumerate(RIDE_COLUMNS, start=1)
+    )
+    return f"""
+    INSERT INTO rides ({", ".join(RIDE_COLUMNS)})
+    VALUES ({placeholders})
+    ON CONFLICT (strava_activity_id) {on_conflict}
+    """
+
+
+_RIDE_UPDATES = ",\n        ".join(
+    f"{column} = EXCLUDED.{column}"
+    for column in RIDE_COLUMNS if column not in ("athlete_id", "strava_activity_id")
+)
+UPSERT_RIDE_SQL = _insert_rides_sql(f"DO UPDATE SET\n        {_RIDE_UPDATES}\n    RETURNING id")
+# Backfill: a ride already ingested from a webhook (with stream analytics) wins
+INSERT_RIDE_IF_NEW_SQL = _insert_rides_sql("DO NOTHING")
+
+
+def ride_values(ride: Dict[str, Any]) -> List[Any]:
+    """Positional values for UPSERT_RIDE_SQL"""
+    return [ride.get(column) for column in RIDE_COLUMNS]
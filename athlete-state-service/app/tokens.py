@@ -0,0 +1,289 @@
+"""
+StravaTokenManager - batched OAuth token refresh and cached token lookups
+Replaces the hourly n8n refresh (one athlete, sequential HTTP nodes) and
+per-athlete token reads. The manager keeps an expiry-ordered heap of
+connected athletes; each maintenance run pops only the tokens expiring
+within REFRESH_WINDOW, refreshes them over a pooled HTTPS client with at
+most CONCURRENCY requests in flight, and writes every new token back with
+one UPDATE ... FROM unnest(...). Access tokens are cached in Redis until
+shortly before they expire, so ingestion reads them without PostgreSQL.
+"""
+import os
+import json
+import time
+import heapq
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List, Tuple
+import httpx
+
+from strava import StravaRateLimited
+
+logger = logging.getLogger(__name__)
+
+
+class TokenConfig:
+    """Strava OAuth token refresh configuration"""
+    OAUTH_URL = os.getenv("STRAVA_OAUTH_URL", "https://www.strava.com/oauth/token")
+    CLIENT_ID = os.getenv("STRAVA_CLIENT_ID", "")
+    CLIENT_SECRET = os.getenv("STRAVA_CLIENT_SECRET", "")
+    # Strava access tokens live 6 hours; refreshing earlier returns the same token
+    REFRESH_WINDOW = 1800  # seconds before expiry
+    REFRESH_INTERVAL = 300  # seconds between maintenance runs
+    CONCURRENCY = 8  # refresh requests in flight
+    REQUEST_TIMEOUT = 15  # seconds
+    INDEX_RELOAD = 900  # seconds; picks up athletes connected through n8n
+    MIN_VALIDITY = 120  # seconds; a token closer to expiry is refreshed on read
+
+
+class TokenRevoked(Exception):
+    """Strava refused the refresh token (athlete deauthorized the app)"""
+
+
+LOAD_INDEX_SQL = """
+    SELECT id, extract(epoch FROM token_expires_at)::float8 AS expires_at
+    FROM athletes
+    WHERE strava_refresh_token IS NOT NULL AND token_expires_at IS NOT NULL
+"""
+
+LOAD_TOKENS_SQL = """
+    SELECT id, strava_access_token, strava_refresh_token,
+           extract(epoch FROM token_expires_at)::float8 AS expires_at
+    FROM athletes
+    WHERE id = ANY($1::int[]) AND strava_refresh_token IS NOT NULL
+"""
+
+SAVE_TOKENS_SQL = """
+    UPDATE athletes a
+    SET strava_access_token = t.access_token,
+        strava_refresh_token = t.refresh_token,
+        token_expires_at = to_timestamp(t.expires_at)
+    FROM unnest($1::int[], $2::text[], $3::text[], $4::float8[])
+         AS t(id, access_token, refresh_token, expires_at)
+    WHERE a.id = t.id
+"""
+
+
+class StravaTokenManager:
+    """Expiry-indexed token refresh with a Redis token cache"""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.http_client: Optional[httpx.AsyncClient] = None
+        # athlete_id -> expires_at (epoch); heap entries not matching it are stale
+        self._expiry: Dict[int, float] = {}
+        self._heap: List[Tuple[float, int]] = []
+        self._index_loaded_at: Optional[float] = None
+        self._loads: Dict[int, asyncio.Future] = {}  # single-flight per athlete
+        self.stats_counters = {
+            "refreshed": 0,
+            "failed": 0,
+            "revoked": 0,
+            "rate_limited": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+        }
+
+    async def initialize(self):
+        self.http_client = httpx.AsyncClient(
+            timeout=TokenConfig.REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=TokenConfig.CONCURRENCY,
+                max_keepalive_connections=TokenConfig.CONCURRENCY
+            )
+        )
+        if not TokenConfig.CLIENT_ID or not TokenConfig.CLIENT_SECRET:
+            logger.warning("STRAVA_CLIENT_ID / STRAVA_CLIENT_SECRET not set; token refresh will fail")
+
+    async def cleanup(self):
+        if self.http_client:
+            await self.http_client.aclose()
+            self.http_client = None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            **self.stats_counters,
+            "tracked": len(self._expiry),
+            "due": sum(1 for e in self._expiry.values() if e <= now + TokenConfig.REFRESH_WINDOW),
+            "next_expiry_in": round(self._heap[0][0] - now, 1) if self._heap else None,
+        }
+
+    # ---------- expiry index ----------
+
+    async def load_index(self):
+        async with self.manager.pg_pool.acquire() as conn:
+            rows = await conn.fetch(LOAD_INDEX_SQL)
+        self._expiry = {row["id"]: row["expires_at"] for row in rows}
+        self._heap = [(expires_at, athlete_id) for athlete_id, expires_at in self._expiry.items()]
+        heapq.heapify(self._heap)
+        self._index_loaded_at = time.time()
+
+    def track(self, athlete_id: int, expires_at: float):
+        self._expiry[athlete_id] = expires_at
+        heapq.heappush(self._heap, (expires_at, athlete_id))
+
+    def untrack(self, athlete_id: int):
+        self._expiry.pop(athlete_id, None)  # its heap entry is skipped as stale
+
+    def pop_due(self, window: float) -> List[int]:
+        """Athletes whose token expires within `window` seconds, soonest first"""
+        horizon = time.time() + window
+        due = []
+        while self._heap and self._heap[0][0] <= horizon:
+            expires_at, athlete_id = heapq.heappop(self._heap)
+            if self._expiry.get(athlete_id) == expires_at:
+                due.append(athlete_id)
+        return due
+
+    # ---------- refresh ----------
+
+    async def refresh_due(self) -> int:
+        """Refresh every token expiring within REFRESH_WINDOW; returns how many"""
+        if (self._index_loaded_at is None
+                or time.time() - self._index_loaded_at >= TokenConfig.INDEX_RELOAD):
+            await self.load_index()
+        due = self.pop_due(TokenConfig.REFRESH_WINDOW)
+        if not due:
+            return 0
+        async with self.manager.pg_pool.acquire() as conn:
+            rows = await conn.fetch(LOAD_TOKENS_SQL, due)
+        found = {row["id"] for row in rows}
+        for athlete_id in due:
+            if athlete_id not in found:
+                self.untrack(athlete_id)  # disconnected since the index load
+        refreshed = await self._refresh_rows([dict(row) for row in rows])
+        return len(refreshed)
+
+    async def _refresh_rows(self, rows: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """Refresh the given token rows concurrently, then save and cache the results"""
+        semaphore = asyncio.Semaphore(TokenConfig.CONCURRENCY)
+        rate_limited = asyncio.Event()
+
+        async def refresh(row):
+            async with semaphore:
+                if not rate_limited.is_set():
+                    try:
+                        return await self._request_refresh(row["strava_refresh_token"])
+                    except StravaRateLimited as e:
+                        self.stats_counters["rate_limited"] += 1
+                        logger.warning("%s; remaining token refreshes wait for the next run", e)
+                        rate_limited.set()
+                    except TokenRevoked:
+                        self.stats_counters["revoked"] += 1
+                        logger.warning("Strava refresh token revoked for athlete %s", row["id"])
+                        self.untrack(row["id"])
+                        return None
+                    except Exception as e:
+                        self.stats_counters["failed"] += 1
+                        logger.warning("Token refresh failed for athlete %s: %s", row["id"], e)
+                # Not refreshed: keep the old expiry, so it is due again next run
+                if row["expires_at"] is not None:
+                    self.track(row["id"], row["expires_at"])
+                return None
+
+        results = await asyncio.gather(*[refresh(row) for row in rows])
+        tokens = {row["id"]: token for row, token in zip(rows, results) if token}
+        if not tokens:
+            return {}
+
+        ids = list(tokens)
+        async with self.manager.pg_pool.acquire() as conn:
+            await conn.execute(
+                SAVE_TOKENS_SQL,
+                ids,
+                [tokens[a]["access_token"] for a in ids],
+                [tokens[a]["refresh_token"] for a in ids],
+                [float(tokens[a]["expires_at"]) for a in ids],
+            )
+        for athlete_id, token in tokens.items():
+            self.track(athlete_id, float(token["expires_at"]))
+        await self._cache_tokens(tokens)
+        self.stats_counters["refreshed"] += len(tokens)
+        logger.info("Refreshed %s Strava tokens", len(tokens))
+        return tokens
+
+    async def _request_refresh(self, refresh_token: str) -> Dict[str, Any]:
+        response = await self.http_client.post(TokenConfig.OAUTH_URL, data={
+            "client_id": TokenConfig.CLIENT_ID,
+            "client_secret": TokenConfig.CLIENT_SECRET,
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+        })
+        if response.status_code == 429:
+            raise StravaRateLimited(float(response.headers.get("Retry-After", 900)))
+        if response.status_code in (400, 401):
+            raise TokenRevoked(response.text)
+        response.raise_for_status()
+        return response.json()
+
+    # ---------- lookups ----------
+
+    def _cache_key(self, athlete_id: int) -> str:
+        return f"strava:token:{athlete_id}"
+
+    async def _cache_tokens(self, tokens: Dict[int, Dict[str, Any]]):
+        redis_client = self.manager.redis_client
+        if not redis_client:
+            return
+        now = time.time()
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for athlete_id, token in tokens.items():
+                    ttl = int(float(token["expires_at"]) - now - TokenConfig.MIN_VALIDITY)
+                    if ttl > 0:
+                        pipe.set(self._cache_key(athlete_id), json.dumps({
+                            "access_token": token["access_token"],
+                            "expires_at": float(token["expires_at"]),
+                        }), ex=ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Redis token cache write error: %s", e)
+
+    async def get_access_token(self, athlete_id: int) -> Optional[str]:
+        """A valid access token for the athlete, refreshed first if about to expire"""
+        redis_client = self.manager.redis_client
+        if redis_client:
+            try:
+                cached = await redis_client.get(self._cache_key(athlete_id))
+                if cached:
+                    token = json.loads(cached)
+                    if token["expires_at"] - time.time() > TokenConfig.MIN_VALIDITY:
+                        self.stats_counters["cache_hits"] += 1
+                        return token["access_token"]
+            except Exception as e:
+                logger.warning("Redis token cache read error: %s", e)
+        self.stats_counters["cache_misses"] += 1
+
+        load = self._loads.get(athlete_id)
+        if load is None:
+            load = asyncio.ensure_future(self._load_token(athlete_id))
+            self._loads[athlete_id] = load
+            load.add_done_callback(lambda _: self._loads.pop(athlete_id, None))
+        return await asyncio.shield(load)
+
+    async def _load_token(self, athlete_id: int) -> Optional[str]:
+        async with self.manager.pg_pool.acquire() as conn:
+            rows = await conn.fetch(LOAD_TOKENS_SQL, [athlete_id])
+        if not rows:
+            return None
+        row = dict(rows[0])
+        if row["expires_at"] is None or row["expires_at"] - time.time() <= TokenConfig.MIN_VALIDITY:
+            token = (await self._refresh_rows([row])).get(athlete_id)
+            if token:
+                return token["access_token"]
+            # Refresh failed: the old token is still usable until it expires
+            if row["expires_at"] and row["expires_at"] > time.time():
+                return row["strava_access_token"]
+            return None
+        await self._cache_tokens({athlete_id: {"access_token": row["strava_access_token"],
+                                               "expires_at": row["expires_at"]}})
+        return row["strava_access_token"]
+
+    async def forget(self, athlete_id: int):
+        """Drop a cached token Strava rejected; the next lookup re-reads it"""
+        if self.manager.redis_client:
+            try:
+                await self.manager.redis_client.delete(self._cache_key(athlete_id))
+            except Exception as e:
+                logger.warning("Redis token cache delete error: %s", e)
@@ -0,0 +1,92 @@
+"""
+StateWarmup - fills Redis with recently active athletes' states on startup
+After a deploy or a Redis restart every athlete's first request used to pay
+the full get_state miss path. The warm-up reads the states of athletes
+active in the last WARMUP_DAYS days with one query and writes the missing
+ones to Redis in pipelined chunks. /ready reports 503 until it finishes (or
+gives up after WARMUP_TIMEOUT), so a rollout only routes traffic to warm
+replicas.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupConfig:
+    """Startup cache warm-up configuration"""
+    ENABLED = os.getenv("STATE_WARMUP", "true").lower() == "true"
+    ACTIVE_DAYS = int(os.getenv("STATE_WARMUP_DAYS", "7"))
+    CHUNK = 500  # states per Redis pipeline
+    # Readiness never waits longer than this: a slow warm-up must not block
+    # a rollout, the cold path still works
+    TIMEOUT = 60  # seconds
+
+
+class StateWarmup:
+    """Background warm-up whose progress gates readiness"""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.total: Optional[int] = None
+        self.cached = 0
+        self.skipped = 0  # already in Redis (warm Redis, or a request got there first)
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def initialize(self):
+        self.started_at = time.time()
+        if not WarmupConfig.ENABLED or not self.manager.pg_pool or not self.manager.redis_client:
+            logger.info("State warm-up skipped")
+            self.finished_at = self.started_at
+            return
+        self._task = asyncio.create_task(self.run())
+
+    async def cleanup(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run(self):
+        try:
+            states = await self.manager.load_active_states(WarmupConfig.ACTIVE_DAYS)
+            self.total = len(states)
+            for start in range(0, len(states), WarmupConfig.CHUNK):
+                chunk = states[start:start + WarmupConfig.CHUNK]
+                written = await self.manager.cache_states(chunk, chunk=WarmupConfig.CHUNK)
+                self.cached += written
+                self.skipped += len(chunk) - written
+            logger.info("Warmed %s athlete states (%s already cached) in %.1fs",
+                        self.cached, self.skipped, time.time() - self.started_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = str(e)
+            logger.warning("State warm-up failed, serving cold: %s", e)
+        finally:
+            self.finished_at = time.time()
+
+    @property
+    def ready(self) -> bool:
+        if self.finished_at is not None:
+            return True
+        return self.started_at is not None and time.time() - self.started_at >= WarmupConfig.TIMEOUT
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.cached + self.skipped
+        return {
+            "ready": self.ready,
+            "finished": self.finished_at is not None,
+            "total": self.total,
+            "cached": self.cached,
+            "skipped": self.skipped,
+            "progress": round(done / self.total, 3) if self.total else (1.0 if self.finished_at else 0.0),
+            "seconds": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else None,
+            "error": self.error,
+        }
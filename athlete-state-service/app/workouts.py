@@ -0,0 +1,211 @@
+"""
+WorkoutListingService - versioned, read-through listing of an athlete's plan
+Replaces the Athletes_API_-_Get_Workouts workflow the dashboard calls on
+every load. Every planned_workouts write bumps a per-athlete version
+(migration 014), which serves as:
+- the ETag, so an unchanged plan is answered with 304 after one primary-key
+  lookup;
+- the validator of the Redis copy of the listing, so a cached listing is
+  never served stale even if an invalidation was missed;
+- the delta cursor: ?since=<version> returns only workouts written after it
+  plus the ids of workouts removed since (tombstones).
+"""
+import json
+import logging
+from datetime import date
+from typing import Optional, Dict, Any, List
+
+from managers import json_default
+from metrics import REDIS_ERRORS
+
+logger = logging.getLogger(__name__)
+
+
+class WorkoutListingConfig:
+    """Workouts listing configuration"""
+    CACHE_TTL = 3600  # 1 hour; validated against the version on every read
+    # The listed plan is the newest one with more than five workouts, as in
+    # the n8n workflow: a plan still being written row by row is skipped
+    MIN_PLAN_WORKOUTS = 6
+
+
+def workouts_etag(athlete_id: int, version: int) -> str:
+    return f'W/"workouts-{athlete_id}-{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, so W/ prefixes are ignored)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == wanted:
+            return True
+    return False
+
+
+def _workout(row) -> Dict[str, Any]:
+    workout = dict(row)
+    intervals = workout.get("intervals")
+    if isinstance(intervals, str):
+        workout["intervals"] = json.loads(intervals)
+    if isinstance(workout.get("scheduled_date"), date):
+        workout["scheduled_date"] = workout["scheduled_date"].isoformat()
+    return workout
+
+
+class WorkoutListingService:
+    """ETag / delta listing of the current plan's workouts"""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.stats_counters = {
+            "not_modified": 0,
+            "cache_hits": 0,
+            "loads": 0,
+            "deltas": 0,
+            "full_resyncs": 0,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.stats_counters)
+
+    def _key(self, athlete_id: int) -> str:
+        return f"athlete:workouts:{athlete_id}"
+
+    async def current_version(self, athlete_id: int) -> int:
+        async with self.manager.pg_pool.acquire() as conn:
+            version = await conn.fetchval(
+                "SELECT version FROM athlete_workout_versions WHERE athlete_id = $1", athlete_id
+            )
+        return version or 0
+
+    def not_modified(self):
+        self.stats_counters["not_modified"] += 1
+
+    async def listing(self, athlete_id: int, version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        {"athlete_id", "plan_id", "version", "workouts"}; each workout carries
+        the version it was last written at
+        """
+        if version is None:
+            version = await self.current_version(athlete_id)
+        cached = await self._cached(athlete_id)
+        if cached and cached["version"] == version:
+            self.stats_counters["cache_hits"] += 1
+            return cached
+        listing = await self._load(athlete_id)
+        await self._cache(listing)
+        return listing
+
+    async def changes(self, athlete_id: int, since: int, version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Workouts written after `since` and the ids removed since. Falls back
+        to the full listing ("delta": false) when `since` cannot be applied,
+        e.g. the listed plan is not the one the client has.
+        """
+        listing = await self.listing(athlete_id, version)
+        current = listing["version"]
+        if since == current:
+            self.stats_counters["deltas"] += 1
+            return self._delta(listing, [], [])
+        if since < 0 or since > current:
+            return self._full(listing)
+
+        async with self.manager.pg_pool.acquire() as conn:
+            tombstones = await conn.fetch("""
+                SELECT workout_id, training_plan_id
+                FROM planned_workout_tombstones
+                WHERE athlete_id = $1 AND version > $2 AND version <= $3
+                ORDER BY version
+            """, athlete_id, since, current)
+
+        plan_id = listing["plan_id"]
+        unchanged = sum(1 for w in listing["workouts"] if w["version"] <= since)
+        # Safe to diff only if the client was listing this same plan at
+        # `since`: it already had enough of its rows, and no other plan lost
+        # rows (which could have moved the listing from that plan to this one)
+        if plan_id is None or unchanged < WorkoutListingConfig.MIN_PLAN_WORKOUTS or \
+                any(t["training_plan_id"] != plan_id for t in tombstones):
+            return self._full(listing)
+
+        self.stats_counters["deltas"] += 1
+        changed = [w for w in listing["workouts"] if w["version"] > since]
+        return self._delta(listing, changed, [t["workout_id"] for t in tombstones])
+
+    def _delta(self, listing: Dict[str, Any], changed: List[Dict[str, Any]], removed: List[int]) -> Dict[str, Any]:
+        return {
+            "athlete_id": listing["athlete_id"],
+            "plan_id": listing["plan_id"],
+            "version": listing["version"],
+            "delta": True,
+            "workouts": changed,
+            "removed": removed,
+        }
+
+    def _full(self, listing: Dict[str, Any]) -> Dict[str, Any]:
+        self.stats_counters["full_resyncs"] += 1
+        return {**listing, "delta": False, "removed": []}
+
+    async def _load(self, athlete_id: int) -> Dict[str, Any]:
+        self.stats_counters["loads"] += 1
+        async with self.manager.pg_pool.acquire() as conn:
+            # One snapshot for the version and the rows it describes
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                header = await conn.fetchrow("""
+                    SELECT
+                        (SELECT version FROM athlete_workout_versions WHERE athlete_id = $1) AS version,
+                        (SELECT tp.id
+                         FROM training_plans tp
+                         JOIN planned_workouts p ON p.training_plan_id = tp.id
+                         WHERE tp.athlete_id = $1
+                         GROUP BY tp.id
+                         HAVING COUNT(p.id) >= $2
+                         ORDER BY tp.id DESC
+                         LIMIT 1) AS plan_id
+                """, athlete_id, WorkoutListingConfig.MIN_PLAN_WORKOUTS)
+                rows = []
+                if header["plan_id"] is not None:
+                    rows = await conn.fetch("""
+                        SELECT id, scheduled_date, workout_type, description,
+                               duration_minutes, target_tss, intervals,
+                               row_version AS version
+                        FROM planned_workouts
+                        WHERE training_plan_id = $1
+                        ORDER BY scheduled_date, id
+                    """, header["plan_id"])
+        return {
+            "athlete_id": athlete_id,
+            "plan_id": header["plan_id"],
+            "version": header["version"] or 0,
+            "workouts": [_workout(r) for r in rows],
+        }
+
+    async def _cached(self, athlete_id: int) -> Optional[Dict[str, Any]]:
+        redis = self.manager.redis_client
+        if not redis:
+            return None
+        try:
+            cached = await redis.get(self._key(athlete_id))
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            REDIS_ERRORS.inc("workouts_read")
+            logger.warning("Redis workouts read error: %s", e)
+            return None
+
+    async def _cache(self, listing: Dict[str, Any]):
+        redis = self.manager.redis_client
+        if not redis:
+            return
+        try:
+            await redis.setex(
+                self._key(listing["athlete_id"]),
+                WorkoutListingConfig.CACHE_TTL,
+                json.dumps(listing, default=json_default)
+            )
+        except Exception as e:
+            REDIS_ERRORS.inc("workouts_write")
+            logger.warning("Redis workouts write error: %s", e)
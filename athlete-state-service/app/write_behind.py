@@ -0,0 +1,238 @@
+"""
+StateWriteBehind - coalesced, batched athlete_state persistence
+With write-behind enabled, update_state applies changes to the Redis cache
+immediately and records the changed columns here instead of upserting the
+whole row on every PATCH. Pending updates for an athlete coalesce (latest
+state, union of changed columns) and are flushed every FLUSH_INTERVAL, or
+sooner once MAX_BATCH athletes are dirty, as one transaction that only
+overwrites the changed columns.
+
+Durability: every update is appended to a local JSONL journal before it is
+acknowledged. A flush rotates the journal into a segment and deletes the
+segment once PostgreSQL has committed; segments left behind by a crash are
+replayed on startup.
+"""
+import os
+import glob
+import json
+import time
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List, Set, Tuple, Iterable
+
+from models import AthleteState
+from managers import STATE_ATTRIBUTE_COLUMNS, state_upsert_sql, state_row, json_default
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindConfig:
+    """Write-behind state persistence configuration"""
+    ENABLED = os.getenv("STATE_WRITE_BEHIND", "true").lower() == "true"
+    JOURNAL_PATH = os.getenv("STATE_JOURNAL_PATH", "/app/data/state-journal.jsonl")
+    FLUSH_INTERVAL = 1.0  # seconds
+    MAX_BATCH = 500  # dirty athletes that trigger an early flush
+    # fsync each journal append: survives host crashes, not just process crashes
+    FSYNC = os.getenv("STATE_JOURNAL_FSYNC", "false").lower() == "true"
+    MAX_BACKOFF = 30  # seconds
+
+
+def changed_columns(attributes: Iterable[str]) -> Set[str]:
+    """athlete_state columns behind the changed AthleteState attributes"""
+    return {STATE_ATTRIBUTE_COLUMNS[a] for a in attributes if a in STATE_ATTRIBUTE_COLUMNS}
+
+
+class StateWriteBehind:
+    """Journaled dirty-column tracking with batched flushes"""
+
+    def __init__(self, manager, journal_path: Optional[str] = None):
+        self.manager = manager
+        self.journal_path = journal_path or WriteBehindConfig.JOURNAL_PATH
+        # athlete_id -> (latest state, dirty columns)
+        self._dirty: Dict[int, Tuple[AthleteState, Set[str]]] = {}
+        # Rotated journal files whose updates are not committed yet
+        self._segments: List[str] = []
+        self._journal = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.stats_counters = {
+            "updates": 0,
+            "coalesced": 0,
+            "flushes": 0,
+            "rows_written": 0,
+            "failures": 0,
+            "replayed": 0,
+        }
+
+    async def initialize(self):
+        if not self.manager.pg_pool:
+            logger.warning("State write-behind disabled (no PostgreSQL)")
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+        self._replay()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        if self._dirty:
+            try:
+                await self.flush()
+            except Exception as e:
+                # Kept in memory and on disk; the flush loop retries
+                logger.warning("Replayed state updates not flushed yet: %s", e)
+        self.manager.write_behind = self
+        self._task = asyncio.create_task(self._run())
+        logger.info("State write-behind started (journal %s)", self.journal_path)
+
+    async def cleanup(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.manager.write_behind is self:
+            self.manager.write_behind = None
+        if self._dirty:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Final state flush failed, %s athletes left in the journal: %s",
+                             len(self._dirty), e)
+        if self._journal:
+            empty = self._journal.tell() == 0
+            self._journal.close()
+            self._journal = None
+            if empty and not self._dirty:
+                os.remove(self.journal_path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            "dirty": len(self._dirty),
+            "segments": len(self._segments),
+            "running": self._task is not None and not self._task.done(),
+        }
+
+    # ---------- recording ----------
+
+    def record(self, state: AthleteState, attributes: Iterable[str]):
+        """Journal an applied update and mark its columns dirty"""
+        columns = changed_columns(attributes)
+        self._append({"athlete_id": state.athlete_id, "columns": sorted(columns),
+                      "state": state.to_dict()})
+        self._merge(state, columns)
+        self.stats_counters["updates"] += 1
+        if len(self._dirty) >= WriteBehindConfig.MAX_BATCH:
+            self._wakeup.set()
+
+    def overlay(self, state: AthleteState):
+        """Apply unflushed updates to a state freshly read from PostgreSQL"""
+        pending = self._dirty.get(state.athlete_id)
+        if not pending:
+            return
+        dirty_state, columns = pending
+        for attribute, column in STATE_ATTRIBUTE_COLUMNS.items():
+            if column in columns:
+                setattr(state, attribute, getattr(dirty_state, attribute))
+        state.updated_at = dirty_state.updated_at
+
+    def _merge(self, state: AthleteState, columns: Set[str]):
+        pending = self._dirty.get(state.athlete_id)
+        if pending:
+            self.stats_counters["coalesced"] += 1
+            columns = columns | pending[1]
+        # Own copy: callers keep mutating the instance they passed in
+        self._dirty[state.athlete_id] = (AthleteState.from_dict(state.to_dict()), columns)
+
+    def _append(self, entry: Dict[str, Any]):
+        self._journal.write(json.dumps(entry, default=json_default) + "\n")
+        self._journal.flush()
+        if WriteBehindConfig.FSYNC:
+            os.fsync(self._journal.fileno())
+
+    def _rotate(self):
+        """Move the live journal aside as a segment covering everything dirty now"""
+        if self._journal is None or self._journal.tell() == 0:
+            return
+        self._journal.close()
+        segment = f"{self.journal_path}.{time.time_ns():020d}"
+        os.rename(self.journal_path, segment)
+        self._segments.append(segment)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _replay(self):
+        """Load updates journaled by a previous process that never got flushed"""
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path):
+            os.rename(self.journal_path, f"{self.journal_path}.{time.time_ns():020d}")
+        segments = sorted(glob.glob(glob.escape(self.journal_path) + ".*"))
+        for segment in segments:
+            with open(segment, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        state = AthleteState.from_dict(entry["state"])
+                    except (ValueError, KeyError, TypeError):
+                        continue  # torn final line of a crashed write
+                    self._merge(state, set(entry.get("columns") or ()))
+                    self.stats_counters["replayed"] += 1
+        self._segments = segments
+        if self._dirty:
+            logger.warning("Replaying %s journaled state updates for %s athletes",
+                           self.stats_counters["replayed"], len(self._dirty))
+
+    # ---------- flushing ----------
+
+    async def _run(self):
+        backoff = WriteBehindConfig.FLUSH_INTERVAL
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=WriteBehindConfig.FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                backoff = WriteBehindConfig.FLUSH_INTERVAL
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("State flush failed, retrying in %.0fs: %s", backoff, e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, WriteBehindConfig.MAX_BACKOFF)
+
+    async def flush(self) -> int:
+        """Write every dirty athlete in one transaction; returns rows written"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            batch, self._dirty = self._dirty, {}
+            self._rotate()
+            segments = list(self._segments)
+            try:
+                await self._write(batch)
+            except BaseException:
+                self.stats_counters["failures"] += 1
+                # Updates recorded meanwhile are newer: keep their state
+                for athlete_id, (state, columns) in batch.items():
+                    newer = self._dirty.get(athlete_id)
+                    self._dirty[athlete_id] = (newer[0], newer[1] | columns) if newer else (state, columns)
+                raise
+            for segment in segments:
+                try:
+                    os.remove(segment)
+                except FileNotFoundError:
+                    pass
+                self._segments.remove(segment)
+            self.stats_counters["flushes"] += 1
+            self.stats_counters["rows_written"] += len(batch)
+            return len(batch)
+
+    async def _write(self, batch: Dict[int, Tuple[AthleteState, Set[str]]]):
+        # One statement per distinct set of changed columns; in practice a
+        # handful (e.g. counters vs fatigue flags vs FTP)
+        groups: Dict[frozenset, List[tuple]] = {}
+        for state, columns in batch.values():
+            groups.setdefault(frozenset(columns), []).append(state_row(state))
+        async with self.manager.pg_pool.acquire() as conn:
+            async with conn.transaction():
+                for columns, rows in groups.items():
+                    await conn.executemany(state_upsert_sql(columns), rows)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Event-loop stall benchmark for logging (app/logs.py)
+
+Concurrent coroutines log while a monitor task measures how late its 1 ms
+sleeps wake up. Output goes to a deliberately slow stream (simulating a
+blocked container log pipe) so synchronous writes show up as loop lag.
+
+    python bench_logging.py --tasks 50 --lines 200 --write-delay-ms 0.2
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from logs import setup_logging, stop_logging
+
+
+class SlowStream:
+    """File-like object whose every write blocks for `delay` seconds"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.lines = 0
+
+    def write(self, text: str):
+        time.sleep(self.delay)
+        self.lines += text.count("\n")
+
+    def flush(self):
+        pass
+
+
+async def monitor_lag(stop: asyncio.Event, samples: list):
+    interval = 0.001
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - started - interval) * 1000)
+
+
+async def run(emit, tasks: int, lines: int):
+    stop = asyncio.Event()
+    lag: list = []
+    monitor = asyncio.create_task(monitor_lag(stop, lag))
+
+    async def worker(n: int):
+        for i in range(lines):
+            emit(n, i)
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(tasks)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+    return elapsed, lag
+
+
+def report(name: str, elapsed: float, lag: list, total: int):
+    lag = sorted(lag) or [0.0]
+    p99 = lag[min(len(lag) - 1, int(len(lag) * 0.99))]
+    print(f"  {name:<14} {total / elapsed:9.0f} lines/s  loop lag "
+          f"p50={statistics.median(lag):6.2f} ms  p99={p99:6.2f} ms  max={lag[-1]:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--write-delay-ms", type=float, default=0.2)
+    args = parser.parse_args()
+
+    delay = args.write_delay_ms / 1000
+    total = args.tasks * args.lines
+    print(f"{args.tasks} tasks x {args.lines} lines, {args.write_delay_ms:g} ms per write")
+
+    stream = SlowStream(delay)
+
+    def emit_print(n, i):
+        # What print() would write, as a single call (print writes the newline separately)
+        stream.write(f"🚴 Upserted ride {i} for athlete {n}\n")
+
+    elapsed, lag = asyncio.run(run(emit_print, args.tasks, args.lines))
+    report("print", elapsed, lag, total)
+
+    stream = SlowStream(delay)
+    setup_logging("INFO", stream)
+    logger = logging.getLogger("bench")
+
+    def emit_log(n, i):
+        logger.info("Upserted ride %s for athlete %s", i, n)
+
+    elapsed, lag = asyncio.run(run(emit_log, args.tasks, args.lines))
+    # Time to drain the queue is not on the loop; report it separately
+    dropped = logging.getLogger().handlers[0].dropped
+    drain_started = time.perf_counter()
+    stop_logging()
+    report("queue logging", elapsed, lag, total)
+    print(f"  writer thread drained remaining lines in "
+          f"{(time.perf_counter() - drain_started) * 1000:.0f} ms ({stream.lines} written, {dropped} dropped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for ride analytics (app/power.py)
+
+Generates a synthetic 1 Hz power / heart-rate stream and times each metric.
+
+    python bench_power.py --hours 10 --repeat 20
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from power import (
+    normalized_power, zone_seconds, zone_edges_from_ftp, power_curve, analyze_ride
+)
+
+
+def synthetic_ride(seconds: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    watts = np.clip(rng.normal(210, 60, seconds), 0, None)
+    watts[rng.random(seconds) < 0.05] = 0  # coasting
+    heart_rate = np.clip(rng.normal(145, 10, seconds), 90, 195)
+    return watts, heart_rate
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--ftp", type=float, default=250)
+    args = parser.parse_args()
+
+    seconds = int(args.hours * 3600)
+    watts, heart_rate = synthetic_ride(seconds)
+    watts_list, heart_rate_list = watts.tolist(), heart_rate.tolist()
+    edges = zone_edges_from_ftp(args.ftp)
+
+    cases = {
+        "normalized_power": lambda: normalized_power(watts),
+        "zone_seconds": lambda: zone_seconds(watts, edges),
+        "power_curve": lambda: power_curve(watts),
+        "analyze_ride (json lists)": lambda: analyze_ride(
+            watts=watts_list, heart_rate=heart_rate_list, ftp=args.ftp, max_hr=195
+        ),
+    }
+
+    print(f"{seconds} samples ({args.hours:g} h at 1 Hz), {args.repeat} repeats")
+    for name, fn in cases.items():
+        samples = timed(fn, args.repeat)
+        print(f"  {name:<28} median={statistics.median(samples):7.2f} ms  "
+              f"min={min(samples):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
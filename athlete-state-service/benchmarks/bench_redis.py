@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Redis commands per second per worker, before and after app/redis_layer.py
+
+Runs the state service's Redis mix against a real Redis (6+ for the
+client-side cache) from one process, i.e. one uvicorn worker:
+- reads of athlete:state: keys, skewed towards a hot set of athletes
+- plan view invalidations (calendar DEL + context version INCR)
+- state writes (SETEX)
+
+"before" uses redis.from_url's default pool with one command per
+operation; "after" uses create_client's sized pool, the tracked local
+cache for state reads and the pipelined invalidation. Both report
+operations/s (what the service can serve) and Redis commands/s (what the
+worker sends).
+
+    python bench_redis.py --redis-url redis://localhost:6379 --concurrency 64 --seconds 10
+"""
+import os
+import sys
+import time
+import json
+import random
+import asyncio
+import argparse
+
+import redis.asyncio as redis
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from redis_layer import create_client, TrackedCache, RedisConfig
+
+KEY_PREFIX = "bench:"  # keeps the run away from real keys
+
+
+def state_key(athlete_id: int) -> str:
+    return f"{KEY_PREFIX}athlete:state:{athlete_id}"
+
+
+def pick_athlete(rng: random.Random, athletes: int, hot: int) -> int:
+    # 80% of reads hit the hot set: the athletes with an open dashboard
+    if rng.random() < 0.8:
+        return rng.randrange(min(hot, athletes))
+    return rng.randrange(athletes)
+
+
+class Counters:
+    def __init__(self):
+        self.operations = 0
+        self.commands = 0
+
+
+async def seed(client, athletes: int):
+    payload = json.dumps({"ctl_42d": 55.0, "atl_7d": 48.0, "tsb": 7.0, "current_ftp": 250,
+                          "name": "Bench Rider", "training_goal": "Gran Fondo"})
+    async with client.pipeline(transaction=False) as pipe:
+        for athlete_id in range(athletes):
+            pipe.set(state_key(athlete_id), payload, ex=600)
+        await pipe.execute()
+
+
+async def worker(mode, client, cache, counters, args, deadline, seed_value):
+    rng = random.Random(seed_value)
+    while time.perf_counter() < deadline:
+        roll = rng.random()
+        athlete_id = pick_athlete(rng, args.athletes, args.hot)
+        if roll < args.write_ratio:
+            await client.setex(state_key(athlete_id), 600, json.dumps({"tsb": rng.random()}))
+            counters.commands += 1
+        elif roll < args.write_ratio + args.invalidate_ratio:
+            calendar = [f"{KEY_PREFIX}athlete:calendar:{athlete_id}:2026-{m:02d}" for m in (11, 12)]
+            version = f"{KEY_PREFIX}athlete:context_version:{athlete_id}"
+            if mode == "before":
+                await client.delete(*calendar)
+                await client.incr(version)
+                counters.commands += 2
+            else:
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.delete(*calendar)
+                    pipe.incr(version)
+                    await pipe.execute()
+                counters.commands += 2
+        else:
+            key = state_key(athlete_id)
+            if cache is not None and cache.enabled:
+                misses = cache.misses
+                await cache.get(key)
+                counters.commands += cache.misses - misses  # local hits send nothing
+            else:
+                await client.get(key)
+                counters.commands += 1
+        counters.operations += 1
+
+
+async def run(mode: str, args) -> dict:
+    if mode == "before":
+        client = redis.from_url(args.redis_url, encoding="utf-8", decode_responses=True,
+                                socket_connect_timeout=5, socket_timeout=5)
+        cache = None
+    else:
+        client = create_client(args.redis_url)
+        cache = TrackedCache(client, prefixes=(f"{KEY_PREFIX}athlete:state:",))
+        await cache.initialize()
+        for _ in range(50):  # wait for the tracking handshake
+            if cache.enabled or not cache.supported:
+                break
+            await asyncio.sleep(0.05)
+    try:
+        await seed(client, args.athletes)
+        counters = Counters()
+        started = time.perf_counter()
+        deadline = started + args.seconds
+        await asyncio.gather(*[
+            worker(mode, client, cache, counters, args, deadline, i) for i in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+        result = {
+            "mode": mode,
+            "ops_per_s": counters.operations / elapsed,
+            "commands_per_s": counters.commands / elapsed,
+            "local_cache": cache.stats() if cache else None,
+        }
+    finally:
+        if cache:
+            await cache.cleanup()
+        await client.close()
+    return result
+
+
+async def cleanup_keys(url: str):
+    client = redis.from_url(url, decode_responses=True)
+    try:
+        keys = [key async for key in client.scan_iter(match=f"{KEY_PREFIX}*", count=1000)]
+        for start in range(0, len(keys), 1000):
+            await client.delete(*keys[start:start + 1000])
+    finally:
+        await client.close()
+
+
+async def main_async(args):
+    results = [await run("before", args), await run("after", args)]
+    await cleanup_keys(args.redis_url)
+    print(f"{args.concurrency} concurrent tasks, {args.seconds:.0f}s per mode, "
+          f"pool max {RedisConfig.MAX_CONNECTIONS}, {args.athletes} athletes ({args.hot} hot)")
+    for result in results:
+        line = (f"  {result['mode']:<6} {result['ops_per_s']:>10.0f} ops/s  "
+                f"{result['commands_per_s']:>10.0f} redis commands/s")
+        local = result["local_cache"]
+        if local is not None:
+            line += (f"  local cache {'on' if local['enabled'] else 'off'}"
+                     f" (hit ratio {local['hit_ratio']})")
+        print(line)
+    before, after = results
+    print(f"  speed-up {after['ops_per_s'] / before['ops_per_s']:.2f}x operations/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://localhost:6379"))
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--athletes", type=int, default=5000)
+    parser.add_argument("--hot", type=int, default=200)
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    parser.add_argument("--invalidate-ratio", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
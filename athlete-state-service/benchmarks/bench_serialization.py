@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Serialization cost per endpoint payload (app/responses.py)
+
+Builds synthetic payloads shaped like the state, calendar, workouts listing
+and workout detail responses and times FastAPI's default rendering
+(jsonable_encoder + json.dumps) against FastJSONResponse (orjson), then
+the size and cost of gzip / brotli on the rendered body.
+
+    python bench_serialization.py --repeat 200 --interval-steps 12
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from decimal import Decimal
+from datetime import date, datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import responses
+from models import AthleteState
+from responses import dumps, compress
+
+
+def intervals(steps: int):
+    return {"data": [
+        {"duration_seconds": 300 + 30 * i, "power_ftp_percent": round(0.55 + 0.03 * (i % 12), 2),
+         "cadence": 90, "description": f"Block {i + 1}"}
+        for i in range(steps)
+    ]}
+
+
+def workout_row(day: date, workout_id: int, steps: int):
+    return {
+        "id": workout_id,
+        "training_plan_id": 40,
+        "athlete_id": 7,
+        "scheduled_date": day,
+        "workout_type": "Sweet Spot",
+        "description": "2x20 min at 88-92% FTP with 5 min recoveries",
+        "duration_minutes": 75,
+        "target_tss": Decimal("68"),
+        "intervals": intervals(steps),
+        "status": "planned",
+        "created_at": datetime(2026, 10, 19, 8, 30, 15, 250000),
+    }
+
+
+def payloads(steps: int):
+    start = date(2026, 11, 1)
+    month = [workout_row(start + timedelta(days=d), 100 + d, steps) for d in range(30)]
+    plan = [workout_row(start + timedelta(days=d), 200 + d, steps) for d in range(42)]
+    state = AthleteState(athlete_id=7, name="Rider", training_goal="Gran Fondo", current_ftp=265)
+    return {
+        "state": {"success": True, "state": state.to_dict()},
+        "calendar month": {"success": True, "athlete_id": 7, "month": "2026-11", "days": month},
+        "workouts listing": {"success": True, "athlete_id": 7, "plan_id": 40, "version": 84,
+                             "workouts": plan},
+        "workout details": {"success": True, "workout": month[0], "coaching_events": []},
+    }
+
+
+def fastapi_default(content):
+    # What JSONResponse.render does after FastAPI's jsonable_encoder pass
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--interval-steps", type=int, default=12, help="interval blocks per workout")
+    args = parser.parse_args()
+
+    encodings = ["gzip"] + (["br"] if responses.brotli is not None else [])
+    print(f"median of {args.repeat} runs; {args.interval_steps} interval blocks per workout"
+          + ("" if "br" in encodings else "; brotli not installed"))
+    for name, content in payloads(args.interval_steps).items():
+        body = dumps(content)
+        default_ms = timed(lambda: fastapi_default(content), args.repeat)
+        fast_ms = timed(lambda: dumps(content), args.repeat)
+        print(f"  {name:<17} {len(body):>7} B  default={default_ms:6.3f} ms  "
+              f"orjson={fast_ms:6.3f} ms  ({default_ms / fast_ms:4.1f}x)")
+        for encoding in encodings:
+            size = len(compress(body, encoding))
+            ms = timed(lambda: compress(body, encoding), max(1, args.repeat // 4))
+            print(f"  {'':<17} {encoding:>4}: {size:>7} B ({size / len(body):5.1%})  {ms:6.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
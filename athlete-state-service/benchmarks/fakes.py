@@ -0,0 +1,241 @@
+"""
+In-process stand-ins for Redis and PostgreSQL used by the load suite
+
+They answer only the commands and statements behind the benchmarked
+endpoints (state read/update, calendar month, workout file download) and
+can add a fixed per-call latency to approximate a network round trip.
+Anything else raises UnsupportedStatement naming the SQL, and is recorded
+on the FakeDatabase: the service turns most database errors into fallbacks,
+so the load suite checks the record and fails the run rather than silently
+measuring a no-op.
+"""
+import re
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+WORKOUT_TYPES = ["endurance", "threshold", "recovery", "vo2max", "tempo"]
+
+# Column order of the AthleteStateManager._save_to_database upsert
+STATE_COLUMNS = (
+    "athlete_id", "ctl_42d", "atl_7d", "tsb", "needs_macro_review",
+    "acute_fatigue_level", "substitution_count_this_week", "time_availability_profile",
+    "created_at", "updated_at", "current_ftp",
+)
+
+
+class UnsupportedStatement(Exception):
+    """A statement the fakes do not model"""
+
+    def __init__(self, method: str, sql: str):
+        super().__init__(f"FakeConnection.{method} does not support: {sql}")
+        self.method = method
+        self.sql = sql
+
+
+class FakeRedis:
+    """Dict-backed subset of redis.asyncio.Redis (decode_responses=True)"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.data: Dict[str, Any] = {}
+        self.expires: Dict[str, float] = {}
+        self.calls = 0
+
+    async def _round_trip(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+    def _live(self, key: str) -> Optional[Any]:
+        expires = self.expires.get(key)
+        if expires is not None and expires < time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    async def ping(self):
+        await self._round_trip()
+        return True
+
+    async def get(self, key: str):
+        await self._round_trip()
+        return self._live(key)
+
+    async def mget(self, *keys):
+        await self._round_trip()
+        if len(keys) == 1 and isinstance(keys[0], (list, tuple)):
+            keys = keys[0]
+        return [self._live(k) for k in keys]
+
+    async def set(self, key: str, value, ex: Optional[int] = None):
+        await self._round_trip()
+        self.data[key] = value
+        if ex:
+            self.expires[key] = time.monotonic() + ex
+        else:
+            self.expires.pop(key, None)
+        return True
+
+    async def setex(self, key: str, ttl: int, value):
+        return await self.set(key, value, ex=ttl)
+
+    async def delete(self, *keys):
+        await self._round_trip()
+        removed = 0
+        for key in keys:
+            removed += self.data.pop(key, None) is not None
+            self.expires.pop(key, None)
+        return removed
+
+    async def incr(self, key: str):
+        await self._round_trip()
+        value = int(self._live(key) or 0) + 1
+        self.data[key] = str(value)
+        return value
+
+    async def close(self):
+        pass
+
+
+class FakeConnection:
+    """Statement dispatcher over FakeDatabase tables"""
+
+    def __init__(self, db: "FakeDatabase"):
+        self.db = db
+
+    async def _round_trip(self, query: str):
+        self.db.statements += 1
+        await asyncio.sleep(self.db.latency)
+        return " ".join(query.split())
+
+    def _unsupported(self, method: str, sql: str) -> UnsupportedStatement:
+        key = f"{method}: {sql}"
+        self.db.unsupported[key] = self.db.unsupported.get(key, 0) + 1
+        return UnsupportedStatement(method, sql)
+
+    async def fetchrow(self, query: str, *args):
+        sql = await self._round_trip(query)
+        if "FROM athletes WHERE id" in sql:
+            return self.db.athletes.get(args[0])
+        if "FROM athlete_state WHERE athlete_id" in sql:
+            return self.db.athlete_state.get(args[0])
+        if "FROM planned_workouts WHERE id" in sql:
+            workout = self.db.workouts.get(args[0])
+            return workout if workout and workout["athlete_id"] == args[1] else None
+        raise self._unsupported("fetchrow", sql)
+
+    async def fetchval(self, query: str, *args):
+        sql = await self._round_trip(query)
+        raise self._unsupported("fetchval", sql)
+
+    async def fetch(self, query: str, *args):
+        sql = await self._round_trip(query)
+        if "FROM calendar_view" in sql:
+            athlete_id, year, month = args[:3]
+            return [
+                w for w in self.db.workouts.values()
+                if w["athlete_id"] == athlete_id
+                and w["scheduled_date"].year == year and w["scheduled_date"].month == month
+            ]
+        raise self._unsupported("fetch", sql)
+
+    def transaction(self):
+        return _FakeTransaction()
+
+    async def execute(self, query: str, *args):
+        sql = await self._round_trip(query)
+        return self._apply(sql, args, "execute")
+
+    async def executemany(self, query: str, args_list):
+        # asyncpg pipelines the whole batch: one round trip
+        sql = await self._round_trip(query)
+        for args in args_list:
+            self._apply(sql, args, "executemany")
+
+    def _apply(self, sql: str, args, method: str):
+        if sql.startswith("INSERT INTO athlete_state") and "ON CONFLICT (athlete_id) DO UPDATE" in sql:
+            values = dict(zip(STATE_COLUMNS, args))
+            row = self.db.athlete_state.get(args[0])
+            if row is None:
+                self.db.athlete_state[args[0]] = values
+                return "INSERT 0 1"
+            # Only the columns the statement overwrites on conflict
+            for column in re.findall(r"(\w+) = EXCLUDED\.", sql):
+                row[column] = values[column]
+            return "INSERT 0 1"
+        if sql.startswith("UPDATE planned_workouts"):
+            return "UPDATE 1" if args[-1] in self.db.workouts else "UPDATE 0"
+        raise self._unsupported(method, sql)
+
+
+class _FakeTransaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeDatabase:
+    """asyncpg pool stand-in seeded with athletes and a month of workouts each"""
+
+    def __init__(self, athletes: int, latency_ms: float = 0.0, pool_size: int = 5,
+                 month: Optional[date] = None):
+        self.latency = latency_ms / 1000
+        self.statements = 0
+        # "method: sql" -> count of statements the fakes could not answer
+        self.unsupported: Dict[str, int] = {}
+        self._size = pool_size
+        self._slots = asyncio.Semaphore(pool_size)
+        self.athletes: Dict[int, Dict[str, Any]] = {}
+        self.athlete_state: Dict[int, Dict[str, Any]] = {}
+        self.workouts: Dict[int, Dict[str, Any]] = {}
+
+        month = month or date.today().replace(day=1)
+        workout_id = 1
+        for athlete_id in range(1, athletes + 1):
+            self.athletes[athlete_id] = {
+                "id": athlete_id,
+                "name": f"Athlete {athlete_id}",
+                "training_goal": "General Fitness",
+                "weekly_hours_available": 8,
+                "environment_preference": "mixed",
+                "strava_ftp": 200 + athlete_id % 100,
+            }
+            for day in range(0, 28, 2):
+                self.workouts[workout_id] = {
+                    "id": workout_id,
+                    "workout_id": workout_id,
+                    "athlete_id": athlete_id,
+                    "scheduled_date": month + timedelta(days=day),
+                    "workout_type": WORKOUT_TYPES[workout_id % len(WORKOUT_TYPES)],
+                    "description": "Synthetic benchmark workout",
+                    "duration_minutes": 60 + 15 * (day % 4),
+                    "target_tss": 55.0 + day,
+                    "status": "scheduled",
+                }
+                workout_id += 1
+
+    def workout_ids(self, athlete_id: int) -> List[int]:
+        return [w["id"] for w in self.workouts.values() if w["athlete_id"] == athlete_id]
+
+    # asyncpg.Pool surface used by InstrumentedPool
+    async def acquire(self) -> FakeConnection:
+        await self._slots.acquire()
+        return FakeConnection(self)
+
+    async def release(self, conn: FakeConnection):
+        self._slots.release()
+
+    def get_size(self) -> int:
+        return self._size
+
+    def get_idle_size(self) -> int:
+        return self._slots._value
+
+    def get_max_size(self) -> int:
+        return self._size
+
+    async def close(self):
+        pass
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Load test for Strava webhook ingestion
+
+Fires webhook events (with deliberate retries/updates for the same
+activities) at athlete-state-service, reports ack latency, then waits for
+the queue to drain and checks how many Strava fetches the fake API served.
+
+    uvicorn fake_strava:app --port 9100              (from tests/)
+    STRAVA_API_BASE=http://localhost:9100/api/v3 uvicorn main:app --port 8000
+    python strava_webhook_load.py --events 5000 --activities 1000
+"""
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import httpx
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def fire_events(client, url, events, concurrency):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(event):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(url, json=event)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    await asyncio.gather(*(send(e) for e in events))
+    return latencies, errors
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--service", default="http://localhost:8000")
+    parser.add_argument("--fake-strava", default="http://localhost:9100")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--activities", type=int, default=500)
+    parser.add_argument("--owners", type=int, default=50, help="distinct Strava owner ids")
+    parser.add_argument("--owner-base", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--drain-timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    events = []
+    for _ in range(args.events):
+        activity_id = rng.randint(1, args.activities)
+        events.append({
+            "object_type": "activity",
+            "object_id": activity_id,
+            "aspect_type": rng.choice(["create", "update", "update"]),
+            "owner_id": args.owner_base + activity_id % args.owners,
+            "subscription_id": 1,
+            "event_time": int(time.time()),
+        })
+    unique = len({e["object_id"] for e in events})
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        started = time.perf_counter()
+        latencies, errors = await fire_events(
+            client, f"{args.service}/api/v1/strava/webhook", events, args.concurrency
+        )
+        elapsed = time.perf_counter() - started
+
+        print(f"Sent {len(events)} events for {unique} activities in {elapsed:.2f}s "
+              f"({len(events) / elapsed:.0f} events/s), {errors} errors")
+        print(f"Ack latency ms: p50={percentile(latencies, 50):.1f} "
+              f"p95={percentile(latencies, 95):.1f} p99={percentile(latencies, 99):.1f} "
+              f"mean={statistics.mean(latencies):.1f}")
+
+        deadline = time.monotonic() + args.drain_timeout
+        stats = {}
+        while time.monotonic() < deadline:
+            stats = (await client.get(f"{args.service}/api/v1/strava/ingestion/stats")).json()["stats"]
+            if stats["buffered"] == 0 and stats["queued"] == 0:
+                break
+            await asyncio.sleep(1)
+        drained = time.perf_counter() - started
+        print(f"Drained after {drained:.1f}s: {stats}")
+
+        try:
+            calls = (await client.get(f"{args.fake_strava}/_calls")).json()
+            print(f"Fake Strava fetches: {calls} (unique activities: {unique})")
+        except httpx.HTTPError:
+            print("Fake Strava not reachable, skipping fetch count")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
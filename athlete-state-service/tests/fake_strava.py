@@ -0,0 +1,197 @@
+"""
+Fake Strava API for local load tests
+Serves deterministic activities and zones for any activity id, a paged
+activity history per access token, and an OAuth token endpoint for the
+token refresh.
+
+Run it next to the service and point ingestion at it:
+    uvicorn fake_strava:app --port 9100
+    STRAVA_API_BASE=http://localhost:9100/api/v3 \
+    STRAVA_OAUTH_URL=http://localhost:9100/oauth/token uvicorn main:app
+
+Environment knobs:
+    FAKE_STRAVA_LATENCY_MS   per-request latency (default 50)
+    FAKE_STRAVA_RATE_LIMIT   requests allowed per 15 minutes, 0 = unlimited
+    FAKE_STRAVA_HISTORY      activities in each athlete's history (default 450)
+"""
+import os
+import time
+import zlib
+import random
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+from urllib.parse import parse_qs
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+
+LATENCY = int(os.getenv("FAKE_STRAVA_LATENCY_MS", "50")) / 1000
+RATE_LIMIT = int(os.getenv("FAKE_STRAVA_RATE_LIMIT", "0"))
+HISTORY = int(os.getenv("FAKE_STRAVA_HISTORY", "450"))
+
+app = FastAPI(title="Fake Strava API")
+calls = Counter()
+_window = {"started": time.monotonic(), "count": 0}
+
+
+async def _simulate(response: Response, authorization: str):
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(401, "Authorization Error")
+
+    if RATE_LIMIT:
+        now = time.monotonic()
+        if now - _window["started"] >= 900:
+            _window.update(started=now, count=0)
+        _window["count"] += 1
+        response.headers["X-RateLimit-Limit"] = f"{RATE_LIMIT},{RATE_LIMIT * 10}"
+        response.headers["X-RateLimit-Usage"] = f"{_window['count']},{_window['count']}"
+        if _window["count"] > RATE_LIMIT:
+            retry_after = int(900 - (now - _window["started"])) + 1
+            raise HTTPException(429, "Rate Limit Exceeded", headers={"Retry-After": str(retry_after)})
+
+    if LATENCY:
+        await asyncio.sleep(LATENCY * random.uniform(0.5, 1.5))
+
+
+def fake_activity(activity_id: int) -> dict:
+    rng = random.Random(activity_id)
+    moving_time = rng.randint(1800, 14400)
+    average_watts = rng.uniform(140, 260)
+    start = datetime(2026, 1, 1) + timedelta(hours=activity_id % 5000)
+    return {
+        "id": activity_id,
+        "name": f"Fake ride {activity_id}",
+        "athlete": {"id": 1000 + activity_id % 50},
+        "start_date": start.isoformat() + "Z",
+        "start_date_local": start.isoformat() + "Z",
+        "distance": moving_time * rng.uniform(7, 10),
+        "moving_time": moving_time,
+        "average_watts": average_watts,
+        "weighted_average_watts": average_watts * rng.uniform(1.02, 1.12),
+        "max_watts": average_watts * rng.uniform(2.5, 4),
+        "average_heartrate": rng.uniform(120, 160),
+        "max_heartrate": rng.uniform(165, 190),
+        "average_cadence": rng.uniform(80, 95),
+        "total_elevation_gain": rng.uniform(50, 2500),
+        "kilojoules": average_watts * moving_time / 1000,
+        "device_watts": True,
+        "has_heartrate": True,
+        "external_id": f"garmin_{activity_id}.fit",
+        "device_name": "Fake Edge",
+    }
+
+
+def fake_zones(activity_id: int) -> list:
+    rng = random.Random(activity_id * 7)
+    def buckets(edges):
+        return [{"min": lo, "max": hi, "time": rng.randint(0, 1800)} for lo, hi in edges]
+    return [
+        {"type": "heartrate", "sensor_based": True, "custom_zones": False, "score": rng.randint(10, 200),
+         "distribution_buckets": buckets([(0, 120), (120, 140), (140, 155), (155, 170), (170, -1)])},
+        {"type": "power", "sensor_based": True,
+         "distribution_buckets": buckets([(0, 140), (140, 190), (190, 230), (230, 270), (270, 320), (320, -1)])},
+    ]
+
+
+@app.get("/api/v3/activities/{activity_id}")
+async def get_activity(activity_id: int, response: Response, authorization: str = Header("")):
+    await _simulate(response, authorization)
+    calls["activity"] += 1
+    return fake_activity(activity_id)
+
+
+@app.get("/api/v3/activities/{activity_id}/zones")
+async def get_activity_zones(activity_id: int, response: Response, authorization: str = Header("")):
+    await _simulate(response, authorization)
+    calls["zones"] += 1
+    return fake_zones(activity_id)
+
+
+def fake_history(authorization: str) -> list:
+    """The token owner's activities, newest first: one every 18 hours, every fifth a run"""
+    owner = zlib.crc32(authorization.encode()) % 10000
+    newest = int(time.time()) // 86400 * 86400 - 3600
+    history = []
+    for i in range(HISTORY):
+        started = (datetime(1970, 1, 1) + timedelta(seconds=newest - i * 64800)).isoformat() + "Z"
+        kind = "Run" if i % 5 == 4 else ("VirtualRide" if i % 7 == 3 else "Ride")
+        history.append({**fake_activity(owner * 100000 + i), "start_date": started,
+                        "start_date_local": started, "type": kind, "sport_type": kind})
+    return history
+
+
+@app.get("/api/v3/athlete/activities")
+async def list_athlete_activities(response: Response, authorization: str = Header(""),
+                                  before: Optional[int] = None, after: Optional[int] = None,
+                                  page: int = 1, per_page: int = 30):
+    await _simulate(response, authorization)
+    calls["activities"] += 1
+    per_page = min(per_page, 200)
+    history = [
+        a for a in fake_history(authorization)
+        if (before is None or _epoch(a["start_date"]) < before)
+        and (after is None or _epoch(a["start_date"]) > after)
+    ]
+    return history[(page - 1) * per_page:page * per_page]
+
+
+def _epoch(iso: str) -> int:
+    return int((datetime.fromisoformat(iso.rstrip("Z")) - datetime(1970, 1, 1)).total_seconds())
+
+
+def fake_streams(activity_id: int) -> dict:
+    rng = random.Random(activity_id * 13)
+    moving_time = fake_activity(activity_id)["moving_time"]
+    base = rng.uniform(140, 260)
+    watts = [max(0, int(rng.gauss(base, 40))) for _ in range(moving_time)]
+    heartrate = [int(120 + 40 * min(1.0, i / 600) + rng.gauss(0, 3)) for i in range(moving_time)]
+    return {
+        "time": {"data": list(range(moving_time)), "series_type": "time", "original_size": moving_time},
+        "watts": {"data": watts, "series_type": "time", "original_size": moving_time},
+        "heartrate": {"data": heartrate, "series_type": "time", "original_size": moving_time},
+    }
+
+
+@app.get("/api/v3/activities/{activity_id}/streams")
+async def get_activity_streams(activity_id: int, response: Response, authorization: str = Header("")):
+    await _simulate(response, authorization)
+    calls["streams"] += 1
+    return fake_streams(activity_id)
+
+
+# Refresh tokens starting with "revoked" are refused like a deauthorized athlete's
+oauth = {"in_flight": 0, "max_in_flight": 0, "issued": 0}
+
+
+@app.post("/oauth/token")
+async def oauth_token(request: Request):
+    # Parsed by hand: form parsing would need python-multipart
+    form = {k: v[0] for k, v in parse_qs((await request.body()).decode()).items()}
+    calls["oauth_token"] += 1
+    if not form.get("client_id") or not form.get("client_secret"):
+        raise HTTPException(401, "Authorization Error")
+    refresh_token = form.get("refresh_token", "")
+    if form.get("grant_type") != "refresh_token" or refresh_token.startswith("revoked"):
+        raise HTTPException(400, "Bad Request")
+    oauth["in_flight"] += 1
+    oauth["max_in_flight"] = max(oauth["max_in_flight"], oauth["in_flight"])
+    try:
+        if LATENCY:
+            await asyncio.sleep(LATENCY * random.uniform(0.5, 1.5))
+        oauth["issued"] += 1
+        expires_in = 21600
+        return {
+            "token_type": "Bearer",
+            "access_token": f"access-{refresh_token}-{oauth['issued']}",
+            "expires_at": int(time.time()) + expires_in,
+            "expires_in": expires_in,
+            "refresh_token": refresh_token,
+        }
+    finally:
+        oauth["in_flight"] -= 1
+
+
+@app.get("/_calls")
+async def get_calls():
+    """Request counters, used by load tests to verify de-duplication"""
+    return dict(calls)
@@ -0,0 +1,201 @@
+"""
+Tests for the incrementally refreshed, memory-mapped columnar ride archive
+"""
+import sys
+import os
+import json
+import asyncio
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import archive
+from archive import (
+    RideArchive, ArchiveConfig, ARCHIVE_COLUMNS, zone_times, weekly_summary,
+    VERSIONS_SQL, CHANGED_RIDES_SQL, REMOVED_RIDES_SQL, PRUNE_TOMBSTONES_SQL
+)
+
+FORMATS = ["npy"] + (["arrow"] if archive.pyarrow is not None else [])
+
+
+class ArchiveConnection:
+    def __init__(self, db):
+        self.db = db
+
+    async def fetch(self, query, *args):
+        self.db.queries.append(query)
+        if query == VERSIONS_SQL:
+            return [{"athlete_id": a, "version": v} for a, v in self.db.versions.items()]
+        athlete_id, since = args
+        if query == CHANGED_RIDES_SQL:
+            return [dict(ride) for ride in self.db.rides.values()
+                    if ride["athlete_id"] == athlete_id and ride["archive_version"] > since]
+        assert query == REMOVED_RIDES_SQL
+        return [{"ride_id": ride_id} for a, version, ride_id in self.db.tombstones
+                if a == athlete_id and version > since]
+
+    async def execute(self, query, *args):
+        assert query == PRUNE_TOMBSTONES_SQL
+        watermarks = dict(zip(*args))
+        self.db.tombstones = [t for t in self.db.tombstones if t[1] > watermarks.get(t[0], -1)]
+
+
+class VersionedRides:
+    """rides plus what migration 017's triggers maintain"""
+
+    def __init__(self):
+        self.rides = {}
+        self.versions = {}
+        self.tombstones = []
+        self.queries = []
+        self.next_id = 1
+
+    def _bump(self, athlete_id):
+        self.versions[athlete_id] = self.versions.get(athlete_id, 0) + 1
+        return self.versions[athlete_id]
+
+    def add(self, athlete_id, day, tss=50.0, power_zones=None, **values):
+        ride = {"id": self.next_id, "athlete_id": athlete_id, "ride_date": datetime.combine(day, datetime.min.time()),
+                "tss": tss, "duration_min": 60, "time_in_power_zones": power_zones,
+                "time_in_heart_rate_zones": None, **values}
+        for name in archive._METRICS:
+            ride.setdefault(name, None)
+        ride["archive_version"] = self._bump(athlete_id)
+        self.rides[ride["id"]] = ride
+        self.next_id += 1
+        return ride["id"]
+
+    def update(self, ride_id, **values):
+        ride = self.rides[ride_id]
+        ride.update(values, archive_version=self._bump(ride["athlete_id"]))
+
+    def delete(self, ride_id):
+        ride = self.rides.pop(ride_id)
+        self.tombstones.append((ride["athlete_id"], self._bump(ride["athlete_id"]), ride_id))
+
+    def acquire(self):
+        db = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return ArchiveConnection(db)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+class Manager:
+    def __init__(self, db):
+        self.pg_pool = db
+
+
+def _buckets(*seconds):
+    return json.dumps({"zones": [{"min": i * 50, "max": -1, "time": s} for i, s in enumerate(seconds)]})
+
+
+@pytest.mark.parametrize("file_format", FORMATS)
+def test_refresh_exports_only_changed_athletes_and_merges_changes(tmp_path, file_format):
+    db = VersionedRides()
+    start = date(2026, 1, 5)
+    first = [db.add(1, start + timedelta(days=d), tss=float(d)) for d in range(10, 0, -1)]
+    db.add(2, start, tss=80.0)
+    ride_archive = RideArchive(Manager(db), str(tmp_path), file_format)
+
+    async def refresh():
+        db.queries.clear()
+        return await ride_archive.refresh()
+
+    assert asyncio.run(refresh()) == 2
+    columns = ride_archive.scan(1, ["ride_id", "tss"])
+    assert columns["tss"].tolist() == [float(d) for d in range(1, 11)]  # sorted by date
+
+    # Nothing changed: only the versions are read
+    assert asyncio.run(refresh()) == 0
+    assert db.queries == [VERSIONS_SQL]
+
+    db.update(first[0], tss=99.0)  # the ride on day 10
+    db.delete(first[-1])  # the ride on day 1
+    added = db.add(1, start + timedelta(days=20), tss=7.0)
+    assert asyncio.run(refresh()) == 1
+    assert db.queries.count(CHANGED_RIDES_SQL) == 1
+    columns = ride_archive.scan(1, ["ride_id", "tss"])
+    assert columns["tss"].tolist() == [2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 99.0, 7.0]
+    assert columns["ride_id"][-1] == added
+    assert ride_archive.scan(2, ["tss"])["tss"].tolist() == [80.0]
+
+    # Tombstones applied to a saved manifest are pruned on the next refresh
+    asyncio.run(refresh())
+    assert db.tombstones == []
+    stats = ride_archive.stats()
+    assert (stats["athletes"], stats["rides_written"], stats["rides_removed"]) == (2, 13, 1)
+
+
+def test_scans_are_memory_mapped_and_filtered_by_date(tmp_path):
+    db = VersionedRides()
+    for d in range(30):
+        db.add(1, date(2026, 3, 1) + timedelta(days=d))
+    ride_archive = RideArchive(Manager(db), str(tmp_path), "npy")
+    asyncio.run(ride_archive.refresh())
+
+    columns = ride_archive.scan(1, ["tss"], start=date(2026, 3, 10), end=date(2026, 3, 20))
+    assert len(columns["tss"]) == 10
+    assert isinstance(columns["tss"], np.memmap)
+    assert ride_archive.scan(3) is None  # never exported
+    with pytest.raises(ValueError):
+        ride_archive.scan(1, ["title"])
+
+
+def test_an_athlete_without_rides_left_reads_as_empty(tmp_path):
+    db = VersionedRides()
+    ride_id = db.add(1, date(2026, 3, 1))
+    ride_archive = RideArchive(Manager(db), str(tmp_path), "npy")
+    asyncio.run(ride_archive.refresh())
+    db.delete(ride_id)
+    asyncio.run(ride_archive.refresh())
+
+    assert ride_archive.scan(1)["ride_id"].dtype == np.int64
+    assert len(ride_archive.scan(1)["ride_id"]) == 0
+    assert not os.path.exists(ride_archive._path(1))
+
+
+def test_a_format_change_re_exports_everything(tmp_path):
+    db = VersionedRides()
+    db.add(1, date(2026, 3, 1))
+    asyncio.run(RideArchive(Manager(db), str(tmp_path), "npy").refresh())
+    other = RideArchive(Manager(db), str(tmp_path), "other")
+    assert other.scan(1) is None
+    assert other._load_manifest()["athletes"] == {}
+
+
+def test_zone_buckets_flatten_to_fixed_columns():
+    assert np.isnan(zone_times(None, 5)).all()
+    assert zone_times(_buckets(10, 20), 5).tolist() == [10, 20, 0, 0, 0]
+    # Strava's power distribution has more buckets than zones: the rest go in the last
+    assert zone_times(_buckets(*range(1, 10)), 7).tolist() == [1, 2, 3, 4, 5, 6, 7 + 8 + 9]
+    assert zone_times({"zones": [{"time": 30}]}, 2).tolist() == [30, 0]
+
+
+def test_weekly_summary_bins_rides_by_iso_week(tmp_path):
+    db = VersionedRides()
+    today = date(2026, 10, 21)  # a Wednesday
+    db.add(1, date(2026, 10, 19), tss=40.0, power_zones=_buckets(600, 1200))
+    db.add(1, date(2026, 10, 20), tss=60.0)
+    db.add(1, date(2026, 10, 12), tss=30.0)
+    db.add(1, date(2026, 8, 1), tss=500.0)  # outside the window
+    ride_archive = RideArchive(Manager(db), str(tmp_path), "npy")
+    asyncio.run(ride_archive.refresh())
+
+    summary = weekly_summary(ride_archive.scan(1), 2, today)
+    last_week, this_week = summary["weeks"]
+    assert (last_week["week_start"], this_week["week_start"]) == (date(2026, 10, 12), date(2026, 10, 19))
+    assert (last_week["tss"], this_week["tss"], this_week["rides"]) == (30.0, 100.0, 2)
+    assert this_week["hours"] == 2.0
+    assert this_week["power_zone_seconds"][:3] == [600, 1200, 0]
+    assert (summary["rides"], summary["tss"]) == (3, 130.0)
+    assert set(ride_archive.scan(1)) == set(ARCHIVE_COLUMNS)
+    assert ArchiveConfig.FORMAT in ("arrow", "npy")
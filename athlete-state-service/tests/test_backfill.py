@@ -0,0 +1,214 @@
+"""
+Tests for the rate-budgeted, resumable Strava history backfill against the fake Strava API
+"""
+import sys
+import os
+import time
+import asyncio
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import fake_strava
+from strava import StravaClient, RIDE_COLUMNS, INSERT_RIDE_IF_NEW_SQL
+from backfill import (
+    StravaBackfill, BackfillConfig, RateBudget,
+    DISCOVER_SQL, REQUEST_SQL, LOAD_PENDING_SQL, SAVE_PAGE_SQL, FAIL_SQL, STATUS_SQL
+)
+
+
+class BackfillConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def transaction(self):
+        class _Transaction:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Transaction()
+
+    async def execute(self, query, *args):
+        if query == DISCOVER_SQL:
+            for athlete_id in self.db.connected:
+                self.db.backfill.setdefault(athlete_id, self.db.new_row(athlete_id, *args))
+        elif query == REQUEST_SQL:
+            athlete_id, before, after, force = args
+            row = self.db.backfill.get(athlete_id)
+            if row is None or force or row["status"] == "failed":
+                self.db.backfill[athlete_id] = self.db.new_row(athlete_id, before, after)
+        elif query == SAVE_PAGE_SQL:
+            athlete_id, next_page, rides, status = args
+            row = self.db.backfill[athlete_id]
+            row.update(next_page=next_page, pages=row["pages"] + 1, rides=row["rides"] + rides,
+                       status=status, attempts=0, error=None)
+        else:
+            raise AssertionError(query)
+
+    async def executemany(self, query, args_list):
+        assert query == INSERT_RIDE_IF_NEW_SQL
+        self.db.batches += 1
+        for args in args_list:
+            ride = dict(zip(RIDE_COLUMNS, args))
+            self.db.rides.setdefault(ride["strava_activity_id"], ride)  # DO NOTHING
+
+    async def fetch(self, query, *args):
+        assert query == LOAD_PENDING_SQL
+        return [{**{k: row[k] for k in ("athlete_id", "before_ts", "after_ts", "next_page")},
+                 "strava_ftp": 250}
+                for row in self.db.backfill.values() if row["status"] == "pending"]
+
+    async def fetchval(self, query, *args):
+        assert query == FAIL_SQL
+        athlete_id, error, max_attempts = args
+        row = self.db.backfill[athlete_id]
+        row["attempts"] += 1
+        row["error"] = error
+        if row["attempts"] >= max_attempts:
+            row["status"] = "failed"
+        return row["status"]
+
+    async def fetchrow(self, query, *args):
+        assert query == STATUS_SQL
+        return self.db.backfill.get(args[0])
+
+
+class BackfillDatabase:
+    def __init__(self, connected):
+        self.connected = list(connected)
+        self.backfill = {}
+        self.rides = {}
+        self.batches = 0
+
+    @staticmethod
+    def new_row(athlete_id, before, after):
+        return {"athlete_id": athlete_id, "status": "pending", "before_ts": before,
+                "after_ts": after, "next_page": 1, "pages": 0, "rides": 0,
+                "attempts": 0, "error": None}
+
+    def acquire(self):
+        db = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return BackfillConnection(db)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+class Manager:
+    def __init__(self, db):
+        self.pg_pool = db
+        self.redis_client = None
+        self.context_invalidations = []
+
+    async def invalidate_context(self, athlete_id):
+        self.context_invalidations.append(athlete_id)
+
+
+class StubTokens:
+    def __init__(self, fail_first=()):
+        self.failures = set(fail_first)
+
+    async def get_access_token(self, athlete_id):
+        if athlete_id in self.failures:
+            self.failures.discard(athlete_id)
+            raise ConnectionError("token cache unavailable")
+        return f"athlete-{athlete_id}"
+
+    async def forget(self, athlete_id):
+        pass
+
+
+def _backfill(db, tokens, monkeypatch):
+    monkeypatch.setattr(fake_strava, "LATENCY", 0)
+    monkeypatch.setattr(fake_strava, "HISTORY", 450)
+    fake_strava.calls.clear()
+    strava = StravaClient()
+    strava.http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_strava.app),
+                                           base_url="http://fake/api/v3")
+    return StravaBackfill(Manager(db), strava, tokens)
+
+
+def test_history_is_paged_per_athlete_and_only_rides_are_inserted(monkeypatch):
+    db = BackfillDatabase(connected=[1, 2])
+    backfill = _backfill(db, StubTokens(), monkeypatch)
+
+    async def scenario():
+        pages = await backfill.run_pending()
+        again = await backfill.run_pending()
+        await backfill.strava.cleanup()
+        return pages, again
+
+    pages, again = asyncio.run(scenario())
+    # 450 activities: pages of 200, 200 and 50 for each athlete, nothing left after
+    assert (pages, again) == (6, 0)
+    assert fake_strava.calls["activities"] == 6
+    assert {row["status"] for row in db.backfill.values()} == {"done"}
+    assert db.backfill[1]["pages"] == 3 and db.backfill[1]["next_page"] == 4
+    assert db.backfill[1]["rides"] == 360  # every fifth activity is a run
+    assert len(db.rides) == 720
+    assert {r["athlete_id"] for r in db.rides.values()} == {1, 2}
+    assert sorted(backfill.manager.context_invalidations) == [1, 2]
+
+
+def test_backfill_resumes_from_the_saved_page(monkeypatch):
+    db = BackfillDatabase(connected=[1])
+    db.backfill[1] = BackfillDatabase.new_row(1, int(time.time()), int(time.time()) - 365 * 86400)
+    db.backfill[1].update(next_page=3, pages=2, rides=320)
+    # The first attempt of this pass fails before any request
+    backfill = _backfill(db, StubTokens(fail_first=[1]), monkeypatch)
+
+    async def scenario():
+        pages = await backfill.run_pending()
+        await backfill.strava.cleanup()
+        return pages
+
+    assert asyncio.run(scenario()) == 1
+    assert fake_strava.calls["activities"] == 1  # only page 3 was fetched
+    assert db.backfill[1]["status"] == "done"
+    assert db.backfill[1]["rides"] == 320 + 40
+    assert backfill.stats()["failures"] == 1
+
+
+def test_request_requeues_only_failed_or_forced(monkeypatch):
+    db = BackfillDatabase(connected=[])
+    backfill = _backfill(db, StubTokens(), monkeypatch)
+
+    async def scenario():
+        first = await backfill.request(5)
+        db.backfill[5].update(status="done", next_page=4)
+        kept = await backfill.request(5)
+        forced = await backfill.request(5, force=True)
+        return first, kept["status"], forced["next_page"]
+
+    first, kept, forced_page = asyncio.run(scenario())
+    assert first["status"] == "pending"
+    assert first["before_ts"] - first["after_ts"] == BackfillConfig.HISTORY_DAYS * 86400
+    assert (kept, forced_page) == ("done", 1)
+
+
+def test_budget_spends_both_buckets_and_honours_a_pause():
+    budget = RateBudget(fifteen_minute=3, daily=100)
+
+    async def scenario():
+        for _ in range(3):
+            await budget.acquire()
+        exhausted = budget.wait_time()
+        budget.short.tokens = 1
+        budget.pause(0.2)
+        started = time.monotonic()
+        await budget.acquire()
+        return exhausted, time.monotonic() - started
+
+    exhausted, paused = asyncio.run(scenario())
+    assert exhausted > 250  # one token per 300 s once the burst is spent
+    assert paused >= 0.19
+    assert round(budget.daily.tokens) == 96
@@ -0,0 +1,116 @@
+"""
+Tests for chat history cursors, summary prompts and background folds
+"""
+import sys
+import os
+import asyncio
+from datetime import datetime
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from chat import encode_cursor, decode_cursor, build_summary_prompt, ChatConfig, ChatHistoryService
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 4, 28, 18, 30, 12, 123456)
+
+    assert decode_cursor(encode_cursor(created_at, 4711)) == (created_at, 4711)
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_summary_prompt_keeps_previous_summary_and_caps_messages():
+    prompt = build_summary_prompt("Training for a gran fondo in June.", [
+        {"role": "user", "content": "My knee hurts after long rides"},
+        {"role": "assistant", "content": "x" * 5000},
+    ])
+
+    assert "Training for a gran fondo in June." in prompt
+    assert "Athlete: My knee hurts after long rides" in prompt
+    assert "Coach: " + "x" * ChatConfig.SUMMARY_MESSAGE_CHARS + "\n" not in prompt
+    assert prompt.endswith("x" * ChatConfig.SUMMARY_MESSAGE_CHARS)
+
+
+class SummaryConnection:
+    def __init__(self, db):
+        self.db = db
+
+    async def fetchrow(self, query, *args):
+        return {"summary": self.db["summary"], "last_message_id": self.db["last_id"],
+                "message_count": self.db["last_id"], "updated_at": None,
+                "pending": len(self.db["messages"]) - self.db["last_id"]}
+
+    async def fetch(self, query, *args):
+        return [m for m in self.db["messages"] if m["id"] > args[1]][:args[2]]
+
+    async def execute(self, query, *args):
+        self.db["summary"], self.db["last_id"] = args[1], args[2]
+
+
+class SummaryPool:
+    def __init__(self, db):
+        self.db = db
+
+    def acquire(self):
+        db = self.db
+
+        class _Acquire:
+            async def __aenter__(self):
+                return SummaryConnection(db)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+class SummaryManager:
+    def __init__(self, db):
+        self.pg_pool = SummaryPool(db)
+
+
+def test_summary_read_does_not_wait_for_fold():
+    db = {"summary": "old", "last_id": 0,
+          "messages": [{"id": i, "role": "user", "content": "hi"}
+                       for i in range(1, ChatConfig.SUMMARY_BATCH + 1)]}
+    service = ChatHistoryService(SummaryManager(db))
+    release = asyncio.Event()
+    prompts = []
+
+    async def slow_generate(prompt):
+        prompts.append(prompt)
+        await release.wait()
+        return "new"
+
+    service._generate = slow_generate
+
+    async def scenario():
+        first = await service.get_summary(1)
+        second = await service.get_summary(1)
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*service._folds.values())
+        third = await service.get_summary(1)
+        await service.cleanup()
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert (first["summary"], first["refreshing"]) == ("old", True)
+    assert second["summary"] == "old"
+    assert len(prompts) == 1
+    assert (third["summary"], third["pending"], third["refreshing"]) == ("new", 0, False)
+
+
+def test_summary_refresh_can_be_skipped():
+    db = {"summary": "", "last_id": 0,
+          "messages": [{"id": i, "role": "user", "content": "hi"}
+                       for i in range(1, ChatConfig.SUMMARY_BATCH + 1)]}
+    service = ChatHistoryService(SummaryManager(db))
+    result = asyncio.run(service.get_summary(1, refresh=False))
+
+    assert result["refreshing"] is False
+    assert service._folds == {}
@@ -0,0 +1,137 @@
+"""
+Tests for the cohort summary served from the concurrently refreshed view
+"""
+import sys
+import os
+import time
+import asyncio
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import asyncpg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from cohort import (
+    CohortService, CohortConfig, cohort_row,
+    REFRESH_SQL, POPULATE_SQL, COUNT_SQL, COHORT_SQL
+)
+
+TODAY = date(2026, 10, 19)
+REFRESHED = datetime(2026, 10, 19, 6, 0)
+
+
+def _row(athlete_id, **values):
+    row = {
+        "athlete_id": athlete_id, "name": f"Athlete {athlete_id}",
+        "ctl_42d": Decimal("60.0"), "atl_7d": Decimal("65.0"), "tsb": Decimal("-5.0"),
+        "acute_fatigue_level": "low",
+        "tss_this_week": 100.0, "tss_last_week": 400.0, "tss_7d": 400.0, "tss_28d": 1600.0,
+        "last_ride_date": TODAY - timedelta(days=1),
+        "planned_workouts": 16, "completed_workouts": 14, "planned_tss": 1500.0,
+        "refreshed_at": REFRESHED,
+    }
+    row.update(values)
+    return row
+
+
+class CohortConnection:
+    def __init__(self, db):
+        self.db = db
+
+    async def execute(self, query, *args):
+        self.db.executed.append(query)
+        if query == REFRESH_SQL and not self.db.populated:
+            raise asyncpg.ObjectNotInPrerequisiteStateError(
+                'CONCURRENTLY cannot be used when the materialized view is not populated')
+        self.db.populated = True
+
+    async def fetchval(self, query, *args):
+        assert query == COUNT_SQL
+        return len(self.db.rows)
+
+    async def fetch(self, query, *args):
+        assert query == COHORT_SQL
+        ids, = args
+        return [row for row in self.db.rows if ids is None or row["athlete_id"] in ids]
+
+
+class CohortDatabase:
+    def __init__(self, rows, populated=True):
+        self.rows = rows
+        self.populated = populated
+        self.executed = []
+
+    def acquire(self):
+        db = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return CohortConnection(db)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+class Manager:
+    def __init__(self, db):
+        self.pg_pool = db
+
+
+def test_flags_follow_the_configured_thresholds():
+    assert cohort_row(_row(1), TODAY)["flags"] == []
+    assert cohort_row(_row(1, acute_fatigue_level="high"), TODAY)["flags"] == ["high_fatigue"]
+    # 700 TSS this week against a 400 TSS weekly average
+    spike = cohort_row(_row(1, tss_7d=700.0), TODAY)
+    assert spike["acute_chronic_ratio"] == 1.75 and spike["flags"] == ["load_spike"]
+    # Too little history for a ratio
+    assert cohort_row(_row(1, tss_7d=90.0, tss_28d=90.0), TODAY)["acute_chronic_ratio"] is None
+    assert cohort_row(_row(1, completed_workouts=8), TODAY)["flags"] == ["low_compliance"]
+    assert cohort_row(_row(1, planned_workouts=2, completed_workouts=0), TODAY)["flags"] == []
+    assert cohort_row(_row(1, planned_workouts=0, completed_workouts=0), TODAY)["compliance"]["ratio"] is None
+    stale = TODAY - timedelta(days=CohortConfig.INACTIVE_DAYS + 1)
+    assert cohort_row(_row(1, last_ride_date=stale), TODAY)["flags"] == ["inactive"]
+    assert cohort_row(_row(1, last_ride_date=None), TODAY)["flags"] == ["inactive"]
+    assert cohort_row(_row(1), TODAY)["ctl_42d"] == 60.0
+
+
+def test_roster_is_one_read_with_flag_counts_and_filters():
+    rows = [_row(a) for a in range(1, 501)]
+    rows[9]["acute_fatigue_level"] = "high"
+    rows[19]["completed_workouts"] = 2
+    db = CohortDatabase(rows)
+    service = CohortService(Manager(db))
+
+    async def scenario():
+        started = time.perf_counter()
+        roster = await service.get_cohort(today=TODAY)
+        elapsed = time.perf_counter() - started
+        flagged = await service.get_cohort(flagged_only=True, today=TODAY)
+        some = await service.get_cohort([1, 10, 999], today=TODAY)
+        return roster, elapsed, flagged, some
+
+    roster, elapsed, flagged, some = asyncio.run(scenario())
+    assert roster["count"] == roster["roster_size"] == 500
+    assert elapsed < 0.5
+    assert roster["flag_counts"] == {"high_fatigue": 1, "low_compliance": 1}
+    assert roster["refreshed_at"] == REFRESHED
+    assert [a["athlete_id"] for a in flagged["athletes"]] == [10, 20]
+    assert flagged["roster_size"] == 500
+    assert [a["athlete_id"] for a in some["athletes"]] == [1, 10]
+    assert service.stats()["requests"] == 3
+
+
+def test_refresh_is_concurrent_and_populates_a_new_view_first():
+    db = CohortDatabase([_row(1), _row(2)], populated=False)
+    service = CohortService(Manager(db))
+
+    async def scenario():
+        first = await service.refresh()
+        second = await service.refresh()
+        return first, second
+
+    assert asyncio.run(scenario()) == (2, 2)
+    assert db.executed == [REFRESH_SQL, POPULATE_SQL, REFRESH_SQL]
+    assert service.stats()["refreshes"] == 2
@@ -0,0 +1,123 @@
+"""
+Tests for chat context snapshot versioning and invalidation
+"""
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from managers import AthleteStateManager
+from context import ContextService
+from invalidation import CacheInvalidationListener
+
+
+class DictRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def mget(self, *keys):
+        return [self.data.get(k) for k in keys]
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    async def incr(self, key):
+        self.data[key] = str(int(self.data.get(key) or 0) + 1)
+        return int(self.data[key])
+
+
+class ContextConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def fetchrow(self, query, *args):
+        if "WITH athlete AS" in query:
+            self.pool.builds += 1
+            return {
+                "capabilities": '{"athlete_id": 3, "ftp": 250}',
+                "goals": '{"training_goal": "Gran Fondo"}',
+                "training_load": {"recent_rides": [], "summary": {"total_rides": self.pool.builds}},
+                "current_phase": None,
+            }
+        return None
+
+
+class ContextPool:
+    def __init__(self):
+        self.builds = 0
+
+    def acquire(self):
+        pool = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return ContextConnection(pool)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+def _service():
+    manager = AthleteStateManager()
+    manager.pg_pool = ContextPool()
+    manager.redis_client = DictRedis()
+
+    async def no_state(athlete_id):
+        return None
+
+    manager.get_state = no_state
+    return manager, ContextService(manager)
+
+
+def test_snapshot_is_cached_until_version_bump():
+    manager, service = _service()
+
+    async def scenario():
+        first = await service.get_context(3)
+        second = await service.get_context(3)
+        await manager.invalidate_context(3)
+        third = await service.get_context(3)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert (first["cached"], second["cached"], third["cached"]) == (False, True, False)
+    assert second["training_load"] == first["training_load"]
+    assert third["version"] == first["version"] + 1
+    assert third["training_load"]["summary"]["total_rides"] == 2
+    assert manager.pg_pool.builds == 2
+
+
+def test_snapshot_built_at_old_version_is_ignored():
+    manager, service = _service()
+
+    async def scenario():
+        version, _ = await manager.get_cached_context(3)
+        await manager.invalidate_context(3)
+        # A rebuild that read the old version finishes after the bump
+        await manager.cache_context(3, {"version": version, "as_of": "2026-10-19"})
+        return await manager.get_cached_context(3)
+
+    version, snapshot = asyncio.run(scenario())
+    assert version == 1
+    assert snapshot is None
+
+
+def test_context_notification_bumps_version():
+    manager, service = _service()
+    listener = CacheInvalidationListener(manager)
+
+    async def scenario():
+        await service.get_context(3)
+        await listener.handle({"scope": "context", "athlete_id": 3})
+        return await service.get_context(3)
+
+    refreshed = asyncio.run(scenario())
+    assert refreshed["cached"] is False
+    assert listener.received == 1
+    assert manager.pg_pool.builds == 2
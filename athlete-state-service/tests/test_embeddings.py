@@ -0,0 +1,136 @@
+"""
+Tests for the chat embedding worker watermark and batching
+"""
+import sys
+import os
+import asyncio
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from embeddings import ChatEmbeddingWorker, EmbeddingWorkerConfig, chunked
+
+
+class WatermarkConnection:
+    def __init__(self, rows, stored=0, locked=None):
+        self.rows = rows
+        self.stored = stored
+        # Watermark another replica committed between our read and our write
+        self.locked = stored if locked is None else locked
+        self.queries = []
+        self.inserted = []
+
+    def transaction(self):
+        class _Transaction:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Transaction()
+
+    async def fetchval(self, query, *args):
+        self.queries.append(query)
+        if "RETURNING last_id" in query:
+            return self.locked
+        if "SELECT last_id" in query:
+            return self.stored
+        return self.rows[-1]["id"] if self.rows else 0
+
+    async def fetch(self, query, *args):
+        self.queries.append(query)
+        return self.rows
+
+    async def execute(self, query, *args):
+        self.queries.append(query)
+        if "INSERT INTO chat_messages" in query:
+            self.inserted.extend(args[5])
+        elif "UPDATE worker_watermarks" in query:
+            self.stored = max(self.stored, args[1])
+
+
+class WatermarkPool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        conn = self.conn
+
+        class _Acquire:
+            async def __aenter__(self):
+                return conn
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+class Manager:
+    def __init__(self, conn):
+        self.pg_pool = WatermarkPool(conn)
+
+
+class Embedder:
+    def __init__(self):
+        self.calls = []
+
+    async def embed_batch(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+
+def _rows(ids):
+    now = datetime(2026, 10, 19, 8, 0)
+    return [{"id": i, "athlete_id": 1, "role": "user", "content": f"message {i}", "created_at": now}
+            for i in ids]
+
+
+def test_batch_is_a_prefix_and_watermark_advances():
+    conn = WatermarkConnection(_rows([11, 12, 13]), stored=10)
+    worker = ChatEmbeddingWorker(Manager(conn), Embedder())
+
+    assert asyncio.run(worker.run_once()) == 3
+    batch_query = next(q for q in conn.queries if "FROM n8n_chat_histories h" in q)
+    assert "MIN(id)" in batch_query and "h.id < u.id" in batch_query
+    assert any("ON CONFLICT (name)" in q for q in conn.queries)
+    assert conn.inserted == [11, 12, 13]
+    assert conn.stored == 13
+    assert worker.watermark == 13
+
+
+def test_overlapping_run_drops_rows_another_replica_wrote():
+    conn = WatermarkConnection(_rows([11, 12, 13, 14]), stored=10, locked=12)
+    worker = ChatEmbeddingWorker(Manager(conn), Embedder())
+    asyncio.run(worker.run_once())
+
+    assert conn.inserted == [13, 14]
+    assert worker.stats()["embedded"] == 2
+    assert conn.stored == 14
+
+
+def test_tool_rows_only_move_the_watermark():
+    rows = _rows([5, 6])
+    rows[0]["role"] = None
+    rows[1]["content"] = "   "
+    conn = WatermarkConnection(rows)
+    embedder = Embedder()
+    worker = ChatEmbeddingWorker(Manager(conn), embedder)
+    asyncio.run(worker.run_once())
+
+    assert embedder.calls == []
+    assert conn.inserted == []
+    assert conn.stored == 6
+    assert worker.stats()["skipped"] == 2
+
+
+def test_embeddings_are_chunked_and_keep_order():
+    embedder = Embedder()
+    worker = ChatEmbeddingWorker(Manager(None), embedder)
+    texts = ["x" * i for i in range(1, EmbeddingWorkerConfig.EMBED_CHUNK * 2 + 3)]
+    vectors = asyncio.run(worker._embed(texts))
+
+    assert [len(c) for c in embedder.calls] == [32, 32, 2]
+    assert vectors == [[float(len(t))] for t in texts]
+    assert chunked([1, 2, 3], 2) == [[1, 2], [3]]
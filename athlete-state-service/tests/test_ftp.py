@@ -0,0 +1,125 @@
+"""
+Tests for batch FTP estimation
+"""
+import sys
+import os
+import asyncio
+from datetime import date
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from power import POWER_CURVE_DURATIONS
+from ftp import fit_critical_power, twenty_minute_ftp, estimate_ftp, detect_trend, FtpEstimator
+from managers import AthleteStateManager
+
+
+def hyperbolic_curve(cp, w_prime):
+    return (cp + w_prime / POWER_CURVE_DURATIONS).astype(np.float32)
+
+
+def test_critical_power_fit_recovers_model_for_every_athlete():
+    curves = np.vstack([hyperbolic_curve(250, 20000), hyperbolic_curve(310, 15000)])
+    cp, w_prime = fit_critical_power(curves)
+
+    assert np.allclose(cp, [250, 310], atol=0.5)
+    assert np.allclose(w_prime, [20000, 15000], rtol=0.01)
+
+
+def test_short_rides_only_fall_back_to_nothing():
+    curve = np.full(len(POWER_CURVE_DURATIONS), np.nan, dtype=np.float32)
+    curve[:10] = 400  # nothing longer than 90 s
+    result = estimate_ftp(curve[None, :])
+
+    assert np.isnan(result["cp"][0])
+    assert np.isnan(result["ftp"][0])
+
+
+def test_ftp_combines_cp_and_twenty_minutes():
+    curves = hyperbolic_curve(250, 20000)[None, :]
+    result = estimate_ftp(curves)
+    p20 = twenty_minute_ftp(curves)[0]
+
+    assert round(float(p20), 1) == round((250 + 20000 / 1200) * 0.95, 1)
+    assert abs(result["ftp"][0] - (result["cp"][0] + p20) / 2) < 0.01
+
+
+def test_trend_detection():
+    trend = detect_trend(np.array([260.0, 240.0, 251.0, np.nan]), np.array([250.0, 250.0, 250.0, 250.0]))
+
+    assert trend.tolist() == ["rising", "falling", "stable", "unknown"]
+
+
+class ReviewConnection:
+    def __init__(self):
+        self.reviewed = []
+        self.copied = []
+
+    async def fetch(self, query, *args):
+        if "athlete_ftp_reviews r" in query:
+            return [{"athlete_id": 1}, {"athlete_id": 2}]
+        short = [400.0] * 10  # athlete 2 has nothing longer than 90 s
+        return [
+            {"athlete_id": 1, "recent": hyperbolic_curve(250, 20000).tolist(), "prior": None,
+             "days": 3, "rides": 5},
+            {"athlete_id": 2, "recent": short, "prior": None, "days": 1, "rides": 1},
+        ]
+
+    async def execute(self, query, *args):
+        if "athlete_ftp_reviews" in query:
+            self.reviewed.extend(args[0])
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.copied.extend(records)
+
+
+class ReviewPool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        conn = self.conn
+
+        class _Acquire:
+            async def __aenter__(self):
+                return conn
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+class StateRecorder:
+    def __init__(self, pg_pool):
+        self.pg_pool = pg_pool
+        self.updates = []
+
+    async def update_state(self, athlete_id, updates):
+        self.updates.append((athlete_id, updates))
+        return True
+
+
+def test_run_marks_every_candidate_reviewed_and_counts_rides():
+    conn = ReviewConnection()
+    manager = StateRecorder(ReviewPool(conn))
+    result = asyncio.run(FtpEstimator(manager).run(as_of=date(2026, 10, 19)))
+
+    # Athlete 2 has no estimate but is still watermarked
+    assert sorted(conn.reviewed) == [1, 2]
+    (suggestion,) = result["suggestions"]
+    assert suggestion["athlete_id"] == 1
+    assert suggestion["rides_used"] == 5
+    assert conn.copied[0][2] == 5
+    assert manager.updates == [(1, {"current_ftp": suggestion["ftp_watts"]})]
+
+
+def test_rebuild_prefers_stored_ftp_over_strava_profile():
+    manager = AthleteStateManager()
+    athlete = {"id": 1, "name": "Rider", "strava_ftp": 240}
+
+    stored = manager._build_state_from_db({"athlete_id": 1, "current_ftp": 268}, athlete)
+    assert stored.current_ftp == 268
+
+    missing = manager._build_state_from_db({"athlete_id": 1, "current_ftp": None}, athlete)
+    assert missing.current_ftp == 240
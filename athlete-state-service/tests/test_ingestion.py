@@ -0,0 +1,89 @@
+"""
+Tests for Strava webhook coalescing and the subscription handshake
+"""
+import sys
+import os
+import asyncio
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import ingestion
+from ingestion import StravaIngestionService
+
+
+class StubStrava:
+    async def initialize(self):
+        pass
+
+    async def cleanup(self):
+        pass
+
+
+def _event(activity_id, aspect="update", owner_id=1001):
+    return {"object_type": "activity", "object_id": activity_id, "aspect_type": aspect,
+            "owner_id": owner_id, "subscription_id": 1, "event_time": 1760000000}
+
+
+def test_events_for_one_activity_coalesce_to_newest_aspect():
+    service = StravaIngestionService(None, strava_client=StubStrava(), power_curves=object())
+    service._wakeup = asyncio.Event()
+
+    assert service.accept_event(_event(7, "create"))
+    assert service.accept_event(_event(7, "update"))
+    assert service.accept_event(_event(7, "update"))
+    assert service.accept_event(_event(8, "create"))
+    assert not service.accept_event({**_event(9), "object_type": "athlete"})
+    assert not service.accept_event({"object_type": "activity", "object_id": "x"})
+
+    stats = service.stats()
+    assert stats["buffered"] == 2
+    assert stats["coalesced"] == 2
+    assert stats["ignored"] == 2
+    assert service._buffer[("activity", 7)][0]["aspect_type"] == "update"
+
+
+def test_burst_of_duplicate_deliveries_is_processed_once_per_activity(monkeypatch):
+    monkeypatch.setattr(ingestion.IngestionConfig, "COALESCE_WINDOW", 0.05)
+    processed = []
+
+    async def scenario():
+        service = StravaIngestionService(None, strava_client=StubStrava(), power_curves=object())
+
+        async def record(event):
+            processed.append((event["object_id"], event["aspect_type"]))
+
+        service._process = record
+        await service.initialize()
+        for activity_id in (1, 2, 1, 3, 1, 2):
+            service.accept_event(_event(activity_id))
+        service.accept_event(_event(3, "delete"))
+        await asyncio.sleep(0.3)
+        await service.cleanup()
+        return service.stats()
+
+    stats = asyncio.run(scenario())
+    assert sorted(processed) == [(1, "update"), (2, "update"), (3, "delete")]
+    assert stats["processed"] == 3
+    assert stats["buffered"] == 0
+
+
+def test_subscription_handshake_fails_closed_without_token(monkeypatch):
+    import main
+
+    async def challenge(token):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/v1/strava/webhook", params={
+                "hub.mode": "subscribe", "hub.challenge": "abc", "hub.verify_token": token
+            })
+
+    monkeypatch.setattr(main, "STRAVA_VERIFY_TOKEN", "")
+    assert asyncio.run(challenge("")).status_code == 503
+
+    monkeypatch.setattr(main, "STRAVA_VERIFY_TOKEN", "s3cret")
+    assert asyncio.run(challenge("wrong")).status_code == 403
+    response = asyncio.run(challenge("s3cret"))
+    assert response.status_code == 200
+    assert response.json() == {"hub.challenge": "abc"}
@@ -0,0 +1,178 @@
+"""
+Tests for plan generation job queueing, status transitions and retries
+"""
+import sys
+import os
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from jobs import PlanJobManager, JobConfig, retry_delay, is_retryable
+
+
+async def _wait_for(job, statuses, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while job.status not in statuses:
+        assert asyncio.get_running_loop().time() < deadline, job.status
+        await asyncio.sleep(0.01)
+
+
+async def _manager(handler, workers=1):
+    manager = PlanJobManager(worker_count=workers)
+    await manager.initialize(None)
+    await manager.http_client.aclose()
+    manager.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return manager
+
+
+def test_identical_requests_share_a_job_and_complete():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"plan_id": 42})
+
+    async def scenario():
+        manager = await _manager(handler)
+        first = await manager.enqueue(1, {"weeks": 8})
+        second = await manager.enqueue(1, {"weeks": 8})
+        await _wait_for(first, ("completed",))
+        await manager.cleanup()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+    assert len(calls) == 1
+    assert first.progress == 100
+    assert first.result == {"plan_id": 42}
+    assert first.finished_at is not None
+
+
+def test_round_robin_across_athletes():
+    manager = PlanJobManager()
+
+    async def scenario():
+        manager._wakeup = asyncio.Condition()
+        for athlete_id, weeks in ((1, 4), (1, 8), (2, 4)):
+            await manager.enqueue(athlete_id, {"weeks": weeks})
+        order = []
+        job = manager._next_job()
+        while job:
+            order.append(job.athlete_id)
+            job.status = "running"
+            job = manager._next_job()
+        return order
+
+    assert asyncio.run(scenario()) == [1, 2, 1]
+
+
+def test_timeout_after_send_fails_without_retry():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ReadTimeout("n8n did not answer", request=request)
+
+    async def scenario():
+        manager = await _manager(handler)
+        job = await manager.enqueue(3, {})
+        await _wait_for(job, ("failed",))
+        await manager.cleanup()
+        return job
+
+    job = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert job.attempts == 1
+    assert "did not answer" in job.error
+
+
+def test_connect_error_is_retried_with_backoff():
+    def handler(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    async def scenario():
+        manager = await _manager(handler)
+        job = await manager.enqueue(4, {})
+        await asyncio.sleep(0.1)
+        state = (job.status, job.attempts, job.next_attempt_at, job.id in manager._retry_timers)
+        await manager.cleanup()
+        return state
+
+    status, attempts, next_attempt_at, waiting = asyncio.run(scenario())
+    assert status == "queued"
+    assert attempts == 1
+    assert waiting
+    assert next_attempt_at > datetime.now() + timedelta(seconds=JobConfig.RETRY_BASE_DELAY - 5)
+
+
+def test_retry_policy():
+    assert retry_delay(1) == JobConfig.RETRY_BASE_DELAY
+    assert retry_delay(2) == 2 * JobConfig.RETRY_BASE_DELAY
+    assert retry_delay(20) == JobConfig.RETRY_MAX_DELAY
+    request = httpx.Request("POST", JobConfig.N8N_GENERATE_URL)
+    assert is_retryable(httpx.ConnectError("refused", request=request))
+    assert not is_retryable(httpx.ReadTimeout("slow", request=request))
+    assert not is_retryable(ValueError("bad response"))
+
+
+class _ReclaimConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    async def fetch(self, query, *args):
+        self.queries.append((query, args))
+        return self.rows
+
+
+class _Pool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        conn = self.conn
+
+        class _Acquire:
+            async def __aenter__(self):
+                return conn
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+def test_reclaim_only_takes_stale_jobs_and_respects_backoff():
+    import uuid
+    now = datetime.now()
+    rows = [
+        {"id": uuid.uuid4(), "athlete_id": 5, "status": "queued", "params": "{}",
+         "created_at": now, "locked_by": JobConfig.WORKER_ID},
+        {"id": uuid.uuid4(), "athlete_id": 6, "status": "queued", "params": "{}",
+         "created_at": now, "locked_by": JobConfig.WORKER_ID,
+         "next_attempt_at": now + timedelta(minutes=5)},
+    ]
+    conn = _ReclaimConnection(rows)
+
+    async def scenario():
+        manager = PlanJobManager()
+        manager._wakeup = asyncio.Condition()
+        manager.pg_pool = _Pool(conn)
+        await manager._reclaim_jobs()
+        await asyncio.sleep(0)
+        pending = {a: list(q) for a, q in manager._pending.items()}
+        delayed = set(manager._retry_timers)
+        for timer in manager._retry_timers.values():
+            timer.cancel()
+        return pending, delayed
+
+    pending, delayed = asyncio.run(scenario())
+    query, args = conn.queries[0]
+    assert "FOR UPDATE SKIP LOCKED" in query
+    assert "heartbeat_at <" in query
+    assert args == (JobConfig.WORKER_ID, JobConfig.LEASE_TIMEOUT)
+    assert pending == {5: [rows[0]["id"]]}
+    assert delayed == {rows[1]["id"]}
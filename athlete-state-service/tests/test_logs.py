@@ -0,0 +1,57 @@
+"""
+Tests for structured logging: sampling, JSON formatting and the bounded queue
+"""
+import os
+import sys
+import json
+import queue
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from logs import SamplingFilter, JsonFormatter, RequestIdFilter, request_id_var, _StructuredQueueHandler
+from metrics import LOG_RECORDS_DROPPED
+
+
+def _record(level=logging.INFO, msg="State cache hit", args=(), **extra):
+    record = logging.LogRecord("managers", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_sampling_keeps_one_in_n_and_all_warnings():
+    sampler = SamplingFilter({"cache_hit": 10})
+    kept = [sampler.filter(_record(event="cache_hit")) for _ in range(100)]
+    assert sum(kept) == 10
+    assert kept[0]
+
+    assert all(sampler.filter(_record(level=logging.WARNING, event="cache_hit")) for _ in range(5))
+    assert all(sampler.filter(_record(event="other")) for _ in range(5))
+
+
+def test_json_formatter_lifts_extra_fields_and_request_id():
+    token = request_id_var.set("abc123")
+    try:
+        record = _record(msg="Updated %s", args=("ftp",), event="state_updated", athlete_id=7)
+        RequestIdFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["msg"] == "Updated ftp"
+    assert entry["level"] == "info"
+    assert entry["request_id"] == "abc123"
+    assert entry["event"] == "state_updated"
+    assert entry["athlete_id"] == 7
+
+
+def test_full_queue_drops_and_counts_records():
+    handler = _StructuredQueueHandler(queue.Queue(maxsize=2))
+    before = LOG_RECORDS_DROPPED.get("info")
+    for i in range(5):
+        handler.handle(_record(msg="line %s", args=(i,)))
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+    assert LOG_RECORDS_DROPPED.get("info") - before == 3
+    assert handler.queue.get_nowait().msg == "line 0"
@@ -0,0 +1,213 @@
+"""
+Tests for the leader-elected maintenance scheduler and bulk state caching
+"""
+import sys
+import os
+import json
+import asyncio
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from managers import AthleteStateManager
+from models import AthleteState
+from maintenance import MaintenanceScheduler, MaintenanceConfig, LeaderLock
+
+
+class SharedRedis:
+    """The few commands the scheduler and bulk caching use, shared by 'replicas'"""
+
+    def __init__(self):
+        self.data = {}
+        self.hashes = {}
+        self.pipelines = 0
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, owner, *args):
+        if self.data.get(key) != owner:
+            return 0
+        if "'del'" in script:
+            del self.data[key]
+        return 1
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = str(value)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class _Pipeline:
+            def __init__(self):
+                self.commands = []
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            def set(self, key, value, ex=None, nx=False):
+                self.commands.append((key, value, nx))
+
+            async def execute(self):
+                redis.pipelines += 1
+                results = []
+                for key, value, nx in self.commands:
+                    results.append(None if nx and key in redis.data else True)
+                    if results[-1]:
+                        redis.data[key] = value
+                return results
+
+        return _Pipeline()
+
+
+class BulkConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def fetch(self, query, *args):
+        self.pool.queries.append(query)
+        if "FROM athlete_state s" in query:
+            return self.pool.active_rows
+        return [{"athlete_id": a} for a in self.pool.updated]
+
+
+class BulkPool:
+    def __init__(self, updated=(), active_rows=()):
+        self.updated = list(updated)
+        self.active_rows = list(active_rows)
+        self.queries = []
+
+    def acquire(self):
+        pool = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return BulkConnection(pool)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+class Writer:
+    def __init__(self):
+        self.flushes = 0
+
+    async def flush(self):
+        self.flushes += 1
+
+
+def _manager(redis, pool):
+    manager = AthleteStateManager()
+    manager.redis_client = redis
+    manager.pg_pool = pool
+    return manager
+
+
+def test_only_one_replica_leads_until_the_lock_is_released():
+    redis = SharedRedis()
+    first = LeaderLock(redis, "leader", 60, "replica-a")
+    second = LeaderLock(redis, "leader", 60, "replica-b")
+
+    async def scenario():
+        leads = [await first.hold(), await second.hold(), await first.hold()]
+        await first.release()
+        leads.append(await second.hold())
+        # A released (or expired) lease is not renewed by its old owner
+        await second.release()
+        leads.append(await first.hold())
+        return leads
+
+    assert asyncio.run(scenario()) == [True, False, True, True, True]
+
+
+def test_due_jobs_run_once_per_interval_and_failures_do_not_block_others():
+    redis = SharedRedis()
+    scheduler = MaintenanceScheduler(_manager(redis, BulkPool()))
+    calls = []
+
+    async def reset():
+        calls.append("weekly_reset")
+        return 3
+
+    async def fatigue():
+        calls.append("fatigue")
+        raise RuntimeError("statement timeout")
+
+    async def warm():
+        calls.append("warm_cache")
+        return 10
+
+    scheduler.jobs = {
+        "weekly_reset": (MaintenanceConfig.WEEKLY_RESET_INTERVAL, reset),
+        "fatigue": (MaintenanceConfig.FATIGUE_INTERVAL, fatigue),
+        "warm_cache": (MaintenanceConfig.WARM_CACHE_INTERVAL, warm),
+    }
+
+    async def scenario():
+        first = await scheduler.run_due()
+        second = await scheduler.run_due()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == ["weekly_reset", "warm_cache"]
+    # The failed job has no recorded run, so it is retried on the next tick
+    assert second == []
+    assert calls == ["weekly_reset", "fatigue", "warm_cache", "fatigue"]
+    assert set(redis.hashes[MaintenanceConfig.LAST_RUN_KEY]) == {"weekly_reset", "warm_cache"}
+    assert scheduler.stats()["jobs"]["fatigue"]["error"] == "statement timeout"
+
+
+def test_bulk_update_flushes_pending_writes_and_drops_changed_states():
+    redis = SharedRedis()
+    redis.data = {"athlete:state:1": "{}", "athlete:state:2": "{}", "athlete:state:3": "{}"}
+    manager = _manager(redis, BulkPool(updated=[1, 3]))
+    writer = Writer()
+    manager.write_behind = writer
+    manager._fallback_cache[1] = AthleteState(athlete_id=1)
+    scheduler = MaintenanceScheduler(manager, writer)
+
+    touched = asyncio.run(scheduler.run_job("weekly_reset"))
+
+    assert touched == 2
+    assert writer.flushes == 1
+    assert "substitution_count_this_week = 0" in manager.pg_pool.queries[0]
+    assert set(redis.data) == {"athlete:state:2"}
+    assert 1 not in manager._fallback_cache
+
+
+def test_warm_cache_loads_active_states_in_one_query_and_pipelines_writes():
+    rows = [{"athlete_id": a, "ctl_42d": 50.0 + a, "atl_7d": 40.0, "tsb": 10.0 + a,
+             "current_ftp": None, "needs_macro_review": False, "acute_fatigue_level": "low",
+             "substitution_count_this_week": 0, "time_availability_profile": None,
+             "created_at": datetime(2026, 10, 1), "updated_at": datetime(2026, 10, 18),
+             "name": f"Rider {a}", "training_goal": "Gran Fondo", "weekly_hours_available": 9,
+             "environment_preference": "outdoor", "strava_ftp": 240 + a}
+            for a in range(1, 1203)]
+    redis = SharedRedis()
+    manager = _manager(redis, BulkPool(active_rows=rows))
+    scheduler = MaintenanceScheduler(manager)
+
+    touched = asyncio.run(scheduler.run_job("warm_cache"))
+
+    assert touched == 1202
+    assert len(manager.pg_pool.queries) == 1
+    assert redis.pipelines == 3  # chunks of 500
+    cached = json.loads(redis.data["athlete:state:7"])
+    assert cached["athlete_id"] == 7
+    assert AthleteState.from_dict(cached).current_ftp == 247
+    assert cached["cache"]["expires_at"] > 0
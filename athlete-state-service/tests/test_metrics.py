@@ -0,0 +1,38 @@
+"""
+Tests for the in-process metrics registry
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from metrics import Registry, statement_labels
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency", ["route"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, "/api")
+
+    text = registry.render()
+
+    assert 'latency_seconds_bucket{route="/api",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{route="/api",le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{route="/api",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{route="/api"} 4' in text
+
+
+def test_counter_labels_are_escaped():
+    registry = Registry()
+    errors = registry.counter("errors_total", "Errors", ["operation"])
+    errors.inc('say "hi"')
+    errors.inc('say "hi"')
+
+    assert 'errors_total{operation="say \\"hi\\""} 2' in registry.render()
+
+
+def test_statement_labels():
+    assert statement_labels("SELECT * FROM athlete_state WHERE athlete_id = $1") == ("select", "athlete_state")
+    assert statement_labels("\n INSERT INTO public.rides (id) VALUES ($1)") == ("insert", "rides")
+    assert statement_labels("UPDATE planned_workouts SET status = $1") == ("update", "planned_workouts")
@@ -0,0 +1,134 @@
+"""
+Tests for plan saving and calendar cache invalidation
+"""
+import sys
+import os
+import asyncio
+from datetime import date, datetime
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from plans import PlanStore, build_workout_records, month_starts
+from invalidation import CacheInvalidationListener, parse_month
+
+
+class RecordingManager:
+    def __init__(self, pg_pool=None):
+        self.pg_pool = pg_pool
+        self.calendar_invalidations = []
+        self.context_invalidations = []
+
+    async def invalidate_calendar(self, athlete_id, dates):
+        self.calendar_invalidations.append((athlete_id, sorted(dates)))
+
+    async def invalidate_context(self, athlete_id):
+        self.context_invalidations.append(athlete_id)
+
+    async def invalidate_plan_views(self, athlete_id, dates=None):
+        await self.invalidate_calendar(athlete_id, dates)
+        await self.invalidate_context(athlete_id)
+
+
+class PlanConnection:
+    def __init__(self):
+        self.copied = []
+
+    def transaction(self):
+        class _Transaction:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Transaction()
+
+    async def fetch(self, query, *args):
+        # One active plan over Nov-Dec gets replaced
+        return [{"id": 3, "start_date": date(2026, 11, 2), "end_date": date(2026, 12, 20)}]
+
+    async def fetchval(self, query, *args):
+        return 9
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.copied.extend(records)
+
+
+class PlanPool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def acquire(self):
+        conn = self.conn
+
+        class _Acquire:
+            async def __aenter__(self):
+                return conn
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+def test_workout_records_apply_n8n_defaults():
+    created_at = datetime(2026, 10, 19, 8, 0)
+    (record,) = build_workout_records(9, 1, [{
+        "scheduled_date": "2026-11-03T00:00:00Z",
+        "workout_type": "threshold",
+        "description": "  ",
+        "duration_minutes": "59.6",
+        "intervals": [{"duration": 600}],
+    }], created_at)
+
+    assert record[2] == date(2026, 11, 3)
+    assert record[4] == "threshold workout"
+    assert record[5] == 60
+    assert record[7] == '{"data": [{"duration": 600}]}'
+    assert record[8:13] == (0, "planned", "indoor", "indoor", "")
+
+
+def test_invalid_workout_date_is_rejected():
+    with pytest.raises(ValueError):
+        build_workout_records(9, 1, [{"scheduled_date": "soon"}], datetime.now())
+
+
+def test_month_starts_cross_year():
+    assert month_starts(date(2026, 11, 20), date(2027, 1, 5)) == [
+        date(2026, 11, 1), date(2026, 12, 1), date(2027, 1, 1)
+    ]
+
+
+def test_save_plan_invalidates_new_and_replaced_months():
+    conn = PlanConnection()
+    manager = RecordingManager(PlanPool(conn))
+    result = asyncio.run(PlanStore(manager).save_plan(1, [
+        {"scheduled_date": "2027-01-04", "workout_type": "endurance", "target_tss": 50},
+        {"scheduled_date": "2027-02-01", "workout_type": "tempo", "target_tss": 70},
+    ]))
+
+    assert result["plan_id"] == 9
+    assert result["workouts_created"] == 2
+    assert result["total_tss"] == 120
+    assert result["replaced_plan_ids"] == [3]
+    (athlete_id, touched), = manager.calendar_invalidations
+    months = {(d.year, d.month) for d in touched}
+    assert athlete_id == 1
+    assert months == {(2026, 11), (2026, 12), (2027, 1), (2027, 2)}
+    assert manager.context_invalidations == [1]
+
+
+def test_notifications_invalidate_calendar_month():
+    manager = RecordingManager()
+    listener = CacheInvalidationListener(manager)
+
+    async def scenario():
+        await listener.handle({"scope": "calendar", "athlete_id": "4", "month": "2026-11"})
+        await listener.handle({"scope": "calendar", "month": "2026-11"})
+        listener._on_notify(None, 0, "athlete_cache", "{not json")
+
+    asyncio.run(scenario())
+    assert manager.calendar_invalidations == [(4, [date(2026, 11, 1)])]
+    assert listener.received == 1
+    assert parse_month("2026-13") is None
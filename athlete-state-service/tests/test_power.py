@@ -0,0 +1,98 @@
+"""
+Tests for vectorized ride analytics
+"""
+import sys
+import os
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from power import (
+    to_1hz, normalized_power, training_stress_score, zone_seconds,
+    zone_edges_from_ftp, power_curve, analyze_ride, POWER_CURVE_DURATIONS
+)
+
+
+def test_one_hour_at_ftp_is_100_tss():
+    watts = np.full(3600, 250.0)
+    np_watts = normalized_power(watts)
+
+    assert np_watts == 250.0
+    assert round(training_stress_score(3600, np_watts, 250), 6) == 100.0
+
+
+def test_normalized_power_weights_surges():
+    steady = np.full(1200, 200.0)
+    surging = np.tile(np.r_[np.full(60, 300.0), np.full(60, 100.0)], 10)
+
+    assert surging.mean() == steady.mean()
+    assert normalized_power(surging) > normalized_power(steady)
+
+
+def test_zone_seconds_cover_whole_ride():
+    watts = np.r_[np.zeros(100), np.full(200, 150.0), np.full(300, 280.0), np.full(50, 500.0)]
+    seconds = zone_seconds(watts, zone_edges_from_ftp(250))
+
+    assert seconds.sum() == watts.size
+    assert seconds[0] == 100     # coasting counts as Z1
+    assert seconds[1] == 200     # 150 W is Z2 (55-75%)
+    assert seconds[4] == 300     # 280 W is Z5 (105-120%)
+    assert seconds[6] == 50      # 500 W is Z7
+
+
+def test_power_curve_best_efforts():
+    watts = np.r_[np.full(600, 200.0), np.full(300, 320.0), np.full(600, 180.0)]
+    curve = power_curve(watts)
+    by_duration = dict(zip(POWER_CURVE_DURATIONS.tolist(), curve.tolist()))
+
+    assert by_duration[1] == 320.0
+    assert by_duration[300] == 320.0
+    assert np.all(np.diff(curve[~np.isnan(curve)]) <= 1e-3)
+    assert np.isnan(by_duration[3600])
+
+
+def test_short_time_stream_dropouts_become_zero():
+    data = to_1hz([100, 100, 100], time=[10, 11, 15])
+
+    assert data.tolist() == [100, 100, 0, 0, 0, 100]
+
+
+def test_analyze_ride_without_power():
+    result = analyze_ride(heart_rate=[0, 130, 140, 150], max_hr=190)
+
+    assert result["has_power"] is False
+    assert result["has_heartrate"] is True
+    assert result["avg_heart_rate"] == 140.0
+
+
+def test_paused_time_is_excluded_from_duration_and_tss():
+    # 30 min at FTP, a 1 h cafe stop, then 30 min more
+    time = list(range(1800)) + list(range(5400, 7200))
+    result = analyze_ride(watts=[250.0] * 3600, time=time, ftp=250)
+
+    assert result["duration_s"] == 3600
+    assert result["elapsed_s"] == 7200
+    assert result["np_watts"] == 250.0
+    assert round(result["tss"], 1) == 100.0
+    # No zero-watt hour inflating Z1
+    assert result["power_zones"][0]["time"] == 0
+
+
+def test_malformed_streams_give_empty_analysis():
+    for watts, time in (([100, 200], []), ([100, 200], [0, 1, 2]), ([100, 200, 300], [0, 2, 1])):
+        result = analyze_ride(watts=watts, time=time, ftp=250)
+
+        assert result["has_power"] is False
+        assert result["invalid_streams"]
+
+
+def test_summary_and_stream_tss_agree():
+    from strava import transform_activity
+
+    activity = {"id": 1, "moving_time": 3600, "weighted_average_watts": 250,
+                "start_date_local": "2026-10-19T08:00:00Z"}
+    summary = transform_activity(activity, [], athlete_id=1, ftp=250)
+    stream = analyze_ride(watts=[250.0] * 3600, ftp=250)
+
+    assert summary["tss"] == 100.0
+    assert summary["tss"] == round(stream["tss"], 2)
@@ -0,0 +1,42 @@
+"""
+Tests for power curve merging and window lookups
+"""
+import sys
+import os
+from datetime import date
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from power import POWER_CURVE_DURATIONS, power_curve
+from power_curves import curve_to_db, curve_from_db, merge_curves, window_curves
+
+
+def test_db_round_trip_keeps_missing_durations():
+    curve = power_curve(np.full(600, 250.0))
+    values = curve_to_db(curve)
+
+    assert values[0] == 250.0
+    assert values[-1] is None
+    assert np.array_equal(np.isnan(curve_from_db(values)), np.isnan(curve))
+
+
+def test_merge_is_elementwise_max_ignoring_missing():
+    sprint = power_curve(np.r_[np.full(10, 900.0), np.full(50, 150.0)])
+    long_ride = power_curve(np.full(3600, 220.0))
+    merged = merge_curves([sprint, long_ride])
+
+    assert merged[0] == 900.0
+    assert merged[-1] == 220.0
+    assert len(merged) == len(POWER_CURVE_DURATIONS)
+
+
+def test_window_curves_only_include_days_in_window():
+    rows = [
+        {"curve_date": date(2026, 1, 1), "curve": curve_to_db(power_curve(np.full(60, 400.0)))},
+        {"curve_date": date(2026, 3, 1), "curve": curve_to_db(power_curve(np.full(60, 300.0)))},
+    ]
+    curves = window_curves(rows, [42, 90], as_of=date(2026, 3, 10))
+
+    assert curves[42][0] == 300.0
+    assert curves[90][0] == 400.0
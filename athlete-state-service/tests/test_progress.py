@@ -0,0 +1,108 @@
+"""
+Tests for plan generation progress streams (server-sent events)
+"""
+import sys
+import os
+import json
+import asyncio
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from progress import ProgressBroker, ProgressConfig, job_event, format_sse
+from invalidation import CacheInvalidationListener
+from jobs import PlanJob
+
+
+def _events(body):
+    """(event, data) pairs of an SSE body, skipping retry and keepalive lines"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        if "event" in lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_broker_fans_out_and_drops_oldest_for_slow_clients(monkeypatch):
+    monkeypatch.setattr(ProgressConfig, "QUEUE_SIZE", 2)
+
+    async def scenario():
+        broker = ProgressBroker()
+        fast, slow = broker.subscribe(7), broker.subscribe(7)
+        other = broker.subscribe(8)
+        broker.publish(7, {"type": "job", "progress": 10})
+        await fast.get()
+        broker.publish(7, {"type": "job", "progress": 20})
+        broker.publish(7, {"type": "job", "progress": 30})
+        received = [(await slow.get())["progress"] for _ in range(slow.qsize())]
+        broker.unsubscribe(7, fast)
+        broker.unsubscribe(7, slow)
+        return broker, received, other.qsize()
+
+    broker, received, other_pending = asyncio.run(scenario())
+    assert received == [20, 30]
+    assert other_pending == 0
+    assert broker.stats() == {"athletes": 1, "subscribers": 1, "published": 3, "dropped": 1}
+
+
+def test_job_notification_is_forwarded_to_the_stream_callback():
+    forwarded = []
+    listener = CacheInvalidationListener(manager=None, on_event=lambda a, e: forwarded.append((a, e)))
+    payload = {"scope": "job", "athlete_id": "5", "job_id": "abc", "status": "running",
+               "progress": 40, "message": "Building week 2"}
+
+    asyncio.run(listener.handle(payload))
+    asyncio.run(listener.handle({"scope": "job"}))  # no athlete: ignored
+
+    assert forwarded == [(5, payload)]
+    assert job_event(payload) == {"type": "job", "job_id": "abc", "status": "running",
+                                  "complete": False, "progress": 40, "message": "Building week 2"}
+    assert format_sse({"type": "workouts", "month": "2026-10"}).startswith("event: workouts\ndata: ")
+
+
+def test_job_stream_ends_when_the_job_finishes(monkeypatch):
+    import main
+
+    job = PlanJob(athlete_id=9, status="running", progress=10, message="Generating")
+    other = PlanJob(athlete_id=9, status="completed")
+    broker = ProgressBroker()
+    monkeypatch.setattr(main, "progress_broker", broker)
+
+    async def get_job(job_id):
+        return job
+
+    monkeypatch.setattr(main.job_manager, "get_job", get_job)
+
+    async def progress():
+        while not broker.stats()["subscribers"]:
+            await asyncio.sleep(0.01)
+        # Database events: a calendar save, another job finishing, then ours
+        main._on_database_event(9, {"scope": "calendar", "athlete_id": 9, "month": "2026-11"})
+        broker.publish(9, job_event(other.to_dict()))
+        broker.publish(9, job_event({**job.to_dict(), "progress": 60}))
+        broker.publish(9, job_event({**job.to_dict(), "status": "completed", "progress": 100}))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            publisher = asyncio.create_task(progress())
+            response = await asyncio.wait_for(client.get(f"/api/v1/jobs/{job.id}/events"), 5)
+            await publisher
+            return response
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["x-accel-buffering"] == "no"
+    events = _events(response.text)
+    assert [(name, data.get("status"), data.get("progress")) for name, data in events] == [
+        ("job", "running", 10),
+        ("workouts", None, None),
+        ("job", "completed", 0),
+        ("job", "running", 60),
+        ("job", "completed", 100),
+    ]
+    assert events[-1][1]["complete"] is True
+    assert broker.stats()["subscribers"] == 0
@@ -0,0 +1,33 @@
+"""
+Tests for batched RAG query de-duplication
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from rag import dedupe_queries
+
+
+def test_identical_queries_share_one_embedding():
+    queries = [
+        {"key": "Monday-indoor", "query": "Find a Tempo workout"},
+        {"key": "Monday-outdoor", "query": "Find a Tempo workout "},
+        {"key": "Tuesday-indoor", "query": "Find a VO2Max workout"},
+    ]
+    unique_texts, mapping = dedupe_queries(queries)
+
+    assert unique_texts == ["Find a Tempo workout", "Find a VO2Max workout"]
+    assert mapping == [0, 0, 1]
+
+
+def test_rest_days_are_skipped():
+    queries = [
+        {"key": "Sunday-indoor", "query": None, "skip_rag": True},
+        {"key": "Sunday-outdoor", "query": "", "skip_rag": True},
+        {"key": "Monday-indoor", "query": "Find an Endurance workout"},
+    ]
+    unique_texts, mapping = dedupe_queries(queries)
+
+    assert unique_texts == ["Find an Endurance workout"]
+    assert mapping == [None, None, 0]
@@ -0,0 +1,236 @@
+"""
+Tests for the Redis access layer: tracked client-side cache and pipelined invalidation
+"""
+import sys
+import os
+import asyncio
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from managers import AthleteStateManager
+from models import AthleteState
+from redis_layer import TrackedCache, RedisConfig, pool_stats
+
+
+class CountingRedis:
+    def __init__(self, data=None):
+        self.data = dict(data or {})
+        self.gets = 0
+        self.round_trips = 0
+        self.commands = []
+        self.on_get = None  # runs while a GET is "in flight"
+
+    async def get(self, key):
+        self.gets += 1
+        self.round_trips += 1
+        value = self.data.get(key)
+        if self.on_get:
+            self.on_get(key)
+        return value
+
+    async def setex(self, key, ttl, value):
+        self.round_trips += 1
+        self.data[key] = value
+
+    async def scan_iter(self, match=None, count=None):
+        prefix = match.rstrip("*")
+        for key in list(self.data):
+            if key.startswith(prefix):
+                yield key
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class _Pipeline:
+            def __init__(self):
+                self.queued = []
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            def delete(self, *keys):
+                self.queued.append(("DEL",) + keys)
+
+            def incr(self, key):
+                self.queued.append(("INCR", key))
+
+            async def execute(self):
+                redis.round_trips += 1
+                redis.commands.extend(self.queued)
+                for command in self.queued:
+                    if command[0] == "DEL":
+                        for key in command[1:]:
+                            redis.data.pop(key, None)
+                    else:
+                        redis.data[command[1]] = int(redis.data.get(command[1], 0)) + 1
+                return [1] * len(self.queued)
+
+        return _Pipeline()
+
+
+class ScriptedConnection:
+    """Raw connection answering the tracking handshake, then replaying pushes"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.sent = []
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def send_command(self, *args):
+        self.sent.append(args)
+
+    async def read_response(self, timeout=None):
+        if not self.replies:
+            raise ConnectionError("closed")
+        return self.replies.pop(0)
+
+
+class ScriptedPool:
+    def __init__(self, *connections):
+        self.connections = list(connections)
+
+    def make_connection(self):
+        return self.connections.pop(0)
+
+
+def _enabled_cache(redis, **kwargs):
+    cache = TrackedCache(redis, **kwargs)
+    cache.enabled = True
+    return cache
+
+
+def test_hits_are_served_locally_until_invalidated():
+    redis = CountingRedis({"athlete:state:1": "v1", "athlete:calendar:1:2026-11": "[]"})
+    cache = _enabled_cache(redis)
+
+    async def scenario():
+        values = [await cache.get("athlete:state:1") for _ in range(3)]
+        await cache.get("athlete:calendar:1:2026-11")
+        await cache.get("athlete:calendar:1:2026-11")  # untracked prefix: always Redis
+        redis.data["athlete:state:1"] = "v2"
+        cache.invalidate(["athlete:state:1"])
+        values.append(await cache.get("athlete:state:1"))
+        return values
+
+    assert asyncio.run(scenario()) == ["v1", "v1", "v1", "v2"]
+    assert redis.gets == 4
+    assert (cache.hits, cache.misses, cache.invalidations) == (2, 2, 1)
+
+
+def test_invalidation_during_a_read_keeps_the_value_out_of_the_cache():
+    redis = CountingRedis({"athlete:state:1": "old"})
+    cache = _enabled_cache(redis)
+    # The write (and its invalidation) lands while our GET is in flight
+    redis.on_get = lambda key: cache.invalidate([key])
+
+    async def scenario():
+        first = await cache.get("athlete:state:1")
+        redis.on_get = None
+        redis.data["athlete:state:1"] = "new"
+        return first, await cache.get("athlete:state:1")
+
+    assert asyncio.run(scenario()) == ("old", "new")
+    assert redis.gets == 2
+
+
+def test_cache_is_bounded_and_flushed_by_a_null_invalidation():
+    redis = CountingRedis({f"athlete:state:{a}": str(a) for a in range(5)})
+    cache = _enabled_cache(redis, max_keys=3)
+
+    async def scenario():
+        for a in range(5):
+            await cache.get(f"athlete:state:{a}")
+
+    asyncio.run(scenario())
+    assert list(cache._entries) == ["athlete:state:2", "athlete:state:3", "athlete:state:4"]
+    cache.invalidate(None)
+    assert cache.stats()["keys"] == 0
+
+
+def test_tracking_handshake_and_invalidation_messages(monkeypatch):
+    monkeypatch.setattr(RedisConfig, "HEARTBEAT", 3600)
+    subscriber = ScriptedConnection([
+        7,  # CLIENT ID
+        ["subscribe", RedisConfig.INVALIDATE_CHANNEL, 1],
+        ["message", RedisConfig.INVALIDATE_CHANNEL, ["athlete:state:1"]],
+    ])
+    tracking = ScriptedConnection(["OK"])
+    redis = CountingRedis({"athlete:state:1": "v1"})
+    redis.connection_pool = ScriptedPool(subscriber, tracking)
+    cache = TrackedCache(redis)
+
+    async def scenario():
+        await cache._connect()
+        await cache.get("athlete:state:1")
+        cached = dict(cache._entries)
+        try:
+            await cache._listen()
+        except ConnectionError:
+            pass
+        evicted = dict(cache._entries)
+        await cache._disconnect()
+        return cached, evicted
+
+    cached, evicted = asyncio.run(scenario())
+    assert tracking.sent == [("CLIENT", "TRACKING", "ON", "REDIRECT", 7, "BCAST",
+                              "PREFIX", "athlete:state:")]
+    assert subscriber.sent[:2] == [("CLIENT", "ID"), ("SUBSCRIBE", RedisConfig.INVALIDATE_CHANNEL)]
+    assert "athlete:state:1" in cached and evicted == {}
+    # With the invalidation connection gone, reads fall through to Redis
+    assert cache.enabled is False
+
+
+def test_own_state_writes_are_visible_immediately():
+    redis = CountingRedis()
+    manager = AthleteStateManager()
+    manager.redis_client = redis
+    manager.state_cache = _enabled_cache(redis)
+
+    async def scenario():
+        await manager._cache_state(AthleteState(athlete_id=4, current_ftp=250))
+        before = await manager.get_state(4)
+        await manager._cache_state(AthleteState(athlete_id=4, current_ftp=262))
+        return before, await manager.get_state(4)
+
+    before, after = asyncio.run(scenario())
+    assert (before.current_ftp, after.current_ftp) == (250, 262)
+
+
+def test_plan_views_are_invalidated_in_one_round_trip():
+    redis = CountingRedis({
+        "athlete:calendar:3:2026-11": "[]",
+        "athlete:calendar:3:2026-12": "[]",
+        "athlete:calendar:30:2026-11": "[]",
+    })
+    manager = AthleteStateManager()
+    manager.redis_client = redis
+
+    async def scenario():
+        await manager.invalidate_plan_views(3, [date(2026, 11, 4), date(2026, 11, 20)])
+        await manager.invalidate_plan_views(3)
+
+    asyncio.run(scenario())
+    assert redis.round_trips == 2
+    assert redis.commands == [
+        ("DEL", "athlete:calendar:3:2026-11"), ("INCR", "athlete:context_version:3"),
+        ("DEL", "athlete:calendar:3:2026-12"), ("INCR", "athlete:context_version:3"),
+    ]
+    assert set(redis.data) == {"athlete:calendar:30:2026-11", "athlete:context_version:3"}
+
+
+def test_pool_stats_ignore_unfilled_slots():
+    class Pool:
+        max_connections = 4
+        _in_use_connections = {object()}
+        _available_connections = [None, None, object()]
+
+    assert pool_stats(Pool()) == {("in_use",): 1, ("idle",): 1, ("max",): 4}
@@ -0,0 +1,105 @@
+"""
+Tests for orjson response rendering and response compression
+"""
+import sys
+import os
+import json
+import uuid
+import asyncio
+from decimal import Decimal
+from datetime import date, datetime
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import responses
+from responses import FastJSONResponse, CompressionMiddleware, accepted_encoding, dumps
+
+
+def _calendar_row(day):
+    return {
+        "id": day,
+        "scheduled_date": date(2026, 11, day),
+        "created_at": datetime(2026, 10, 19, 8, 30, 15, 250000),
+        "target_tss": Decimal("62.5"),
+        "intervals": {"data": [{"duration_seconds": 300, "power_ftp_percent": 0.9}] * 8},
+    }
+
+
+def test_rendering_matches_fastapi_encoding():
+    content = {"days": [_calendar_row(d) for d in range(1, 4)], "job_id": uuid.UUID(int=7)}
+
+    assert json.loads(dumps(content)) == jsonable_encoder(content)
+    assert json.loads(dumps({"curve": np.array([1.5, 2.0]), 5: {"a", "a"}})) == {
+        "curve": [1.5, 2.0], "5": ["a"]
+    }
+
+
+def _app():
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get("/calendar")
+    async def calendar():
+        return FastJSONResponse({"days": [_calendar_row(d) for d in range(1, 29)]})
+
+    @app.get("/small")
+    async def small():
+        return {"status": "healthy"}
+
+    @app.get("/events")
+    async def events():
+        async def body():
+            yield "event: job\ndata: " + "x" * 1000 + "\n\n"
+            yield "event: job\ndata: done\n\n"
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    return app
+
+
+def _get(path, accept_encoding):
+    async def request():
+        transport = httpx.ASGITransport(app=_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers={"Accept-Encoding": accept_encoding})
+
+    return asyncio.run(request())
+
+
+def test_large_json_is_gzipped_and_small_is_not(monkeypatch):
+    monkeypatch.setattr(responses, "brotli", None)
+
+    large = _get("/calendar", "gzip, deflate, br")
+    assert large.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in large.headers["vary"]
+    assert int(large.headers["content-length"]) < len(large.content) / 4
+    assert large.json()["days"][0]["scheduled_date"] == "2026-11-01"
+
+    small = _get("/small", "gzip")
+    assert "content-encoding" not in small.headers
+    assert small.json() == {"status": "healthy"}
+
+    identity = _get("/calendar", "gzip;q=0, identity")
+    assert "content-encoding" not in identity.headers
+    assert len(identity.json()["days"]) == 28
+
+
+def test_streaming_responses_pass_through():
+    response = _get("/events", "gzip")
+    assert "content-encoding" not in response.headers
+    assert response.text.endswith("data: done\n\n")
+
+
+def test_brotli_is_preferred_only_when_installed(monkeypatch):
+    monkeypatch.setattr(responses, "brotli", None)
+    assert accepted_encoding("gzip, br") == "gzip"
+    assert accepted_encoding("br") is None
+    monkeypatch.setattr(responses, "brotli", object())
+    assert accepted_encoding("gzip, br") == "br"
+    assert accepted_encoding("br;q=0, gzip;q=0.5") == "gzip"
+    assert accepted_encoding(None) is None
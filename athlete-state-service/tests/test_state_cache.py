@@ -0,0 +1,92 @@
+"""
+AthleteStateManager cache-miss coalescing and early refresh
+"""
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from managers import AthleteStateManager, DatabaseConfig
+
+
+class CountingConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def fetchrow(self, query, *args):
+        await asyncio.sleep(0.01)
+        if "FROM athletes" in query:
+            self.pool.athlete_reads += 1
+            return {"id": args[0], "name": "Rider", "training_goal": "Gran Fondo",
+                    "weekly_hours_available": 10, "environment_preference": "outdoor",
+                    "strava_ftp": 260}
+        return None
+
+    async def execute(self, query, *args):
+        self.pool.upserts += 1
+        return "INSERT 0 1"
+
+
+class CountingPool:
+    def __init__(self):
+        self.athlete_reads = 0
+        self.upserts = 0
+
+    def acquire(self):
+        pool = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return CountingConnection(pool)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+    async def close(self):
+        pass
+
+
+def test_concurrent_misses_share_one_load():
+    async def scenario():
+        manager = AthleteStateManager()
+        manager.pg_pool = CountingPool()
+        states = await asyncio.gather(*(manager.get_state(7) for _ in range(25)))
+        return manager, states
+
+    manager, states = asyncio.run(scenario())
+    assert manager.pg_pool.athlete_reads == 1
+    assert manager.pg_pool.upserts == 1
+    assert {s.current_ftp for s in states} == {260}
+    # Waiters get independent instances
+    states[0].tsb = -20
+    assert states[1].tsb != -20
+    assert manager._state_loads == {}
+
+
+def test_early_refresh_never_writes():
+    async def scenario():
+        manager = AthleteStateManager()
+        manager.pg_pool = CountingPool()
+        # No athlete_state row: a refresh must not insert one
+        state = await manager._start_state_load(7, refresh=True)
+        await manager.cleanup()
+        return manager, state
+
+    manager, state = asyncio.run(scenario())
+    assert state is None
+    assert manager.pg_pool.upserts == 0
+    assert manager._fallback_cache == {}
+
+
+def test_early_refresh_only_near_expiry():
+    manager = AthleteStateManager()
+    manager.pg_pool = CountingPool()
+    fresh = {"expires_at": time.time() + DatabaseConfig.REDIS_TTL, "delta": 0.05}
+    expiring = {"expires_at": time.time() + 0.001, "delta": 0.05}
+    assert not any(manager._should_refresh_early(fresh) for _ in range(1000))
+    assert sum(manager._should_refresh_early(expiring) for _ in range(1000)) > 900
+    assert not manager._should_refresh_early(None)
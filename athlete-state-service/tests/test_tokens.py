@@ -0,0 +1,196 @@
+"""
+Tests for the expiry-indexed Strava token refresh against the fake OAuth server
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import fake_strava
+from strava import StravaRateLimited
+from tokens import StravaTokenManager, TokenConfig, LOAD_INDEX_SQL, SAVE_TOKENS_SQL
+
+
+class TokenConnection:
+    def __init__(self, db):
+        self.db = db
+
+    async def fetch(self, query, *args):
+        self.db.queries.append(query)
+        if query == LOAD_INDEX_SQL:
+            return [{"id": a, "expires_at": row["expires_at"]} for a, row in self.db.athletes.items()]
+        return [{"id": a, **self.db.athletes[a]} for a in args[0] if a in self.db.athletes]
+
+    async def execute(self, query, *args):
+        assert query == SAVE_TOKENS_SQL
+        self.db.updates.append(args)
+        for athlete_id, access, refresh, expires_at in zip(*args):
+            self.db.athletes[athlete_id].update(strava_access_token=access,
+                                                strava_refresh_token=refresh,
+                                                expires_at=expires_at)
+
+
+class TokenDatabase:
+    def __init__(self, athletes):
+        self.athletes = athletes
+        self.queries = []
+        self.updates = []
+
+    def acquire(self):
+        db = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return TokenConnection(db)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+class TokenRedis:
+    def __init__(self):
+        self.data = {}
+        self.pipelines = 0
+        self.gets = 0
+
+    async def get(self, key):
+        self.gets += 1
+        return self.data.get(key)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class _Pipeline:
+            def __init__(self):
+                self.commands = []
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            def set(self, key, value, ex=None):
+                assert ex and ex > 0
+                self.commands.append((key, value))
+
+            async def execute(self):
+                redis.pipelines += 1
+                redis.data.update(self.commands)
+
+        return _Pipeline()
+
+
+class Manager:
+    def __init__(self, athletes):
+        self.pg_pool = TokenDatabase(athletes)
+        self.redis_client = TokenRedis()
+
+
+def _athlete(refresh_token, expires_in):
+    return {"strava_access_token": f"old-{refresh_token}", "strava_refresh_token": refresh_token,
+            "expires_at": time.time() + expires_in}
+
+
+def _token_manager(manager, monkeypatch):
+    monkeypatch.setattr(fake_strava, "LATENCY", 0.01)
+    monkeypatch.setattr(TokenConfig, "CLIENT_ID", "client")
+    monkeypatch.setattr(TokenConfig, "CLIENT_SECRET", "secret")
+    fake_strava.oauth.update(in_flight=0, max_in_flight=0)
+    tokens = StravaTokenManager(manager)
+    tokens.http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake_strava.app))
+    return tokens
+
+
+def test_only_tokens_inside_the_window_are_due_soonest_first():
+    tokens = StravaTokenManager(None)
+    now = time.time()
+    tokens.track(1, now + 3000)
+    tokens.track(2, now + 600)
+    tokens.track(3, now + 60)
+    tokens.track(4, now + 900)
+    tokens.track(4, now + 20000)  # refreshed since: the old heap entry is stale
+    tokens.untrack(2)
+
+    assert tokens.pop_due(1800) == [3]
+    assert tokens.pop_due(1800) == []
+    assert tokens.pop_due(4000) == [1]
+
+
+def test_due_tokens_refresh_concurrently_and_save_in_one_update(monkeypatch):
+    monkeypatch.setattr(TokenConfig, "CONCURRENCY", 4)
+    athletes = {a: _athlete(f"refresh-{a}", 300 + a) for a in range(1, 21)}
+    athletes.update({a: _athlete(f"refresh-{a}", 20000) for a in range(21, 26)})
+    athletes[99] = _athlete("revoked-99", 100)
+    manager = Manager(athletes)
+    tokens = _token_manager(manager, monkeypatch)
+
+    async def scenario():
+        refreshed = await tokens.refresh_due()
+        again = await tokens.refresh_due()
+        await tokens.cleanup()
+        return refreshed, again
+
+    refreshed, again = asyncio.run(scenario())
+    assert (refreshed, again) == (20, 0)
+    assert 1 < fake_strava.oauth["max_in_flight"] <= 4
+    (ids, access, refresh, expires), = manager.pg_pool.updates
+    assert sorted(ids) == list(range(1, 21))
+    assert all(e > time.time() + 20000 for e in expires)
+    assert manager.redis_client.pipelines == 1
+    cached = json.loads(manager.redis_client.data["strava:token:7"])
+    assert cached["access_token"] == athletes[7]["strava_access_token"]
+    stats = tokens.stats()
+    assert (stats["refreshed"], stats["revoked"], stats["tracked"], stats["due"]) == (20, 1, 25, 0)
+
+
+def test_lookups_use_redis_and_refresh_expiring_tokens_once(monkeypatch):
+    athletes = {1: _athlete("refresh-1", 5000), 2: _athlete("refresh-2", 30)}
+    manager = Manager(athletes)
+    tokens = _token_manager(manager, monkeypatch)
+
+    async def scenario():
+        first = await tokens.get_access_token(1)
+        cached = await tokens.get_access_token(1)
+        # Concurrent lookups of an expiring token share one refresh
+        expiring = await asyncio.gather(*[tokens.get_access_token(2) for _ in range(5)])
+        await tokens.forget(1)
+        reread = await tokens.get_access_token(1)
+        await tokens.cleanup()
+        return first, cached, expiring, reread
+
+    first, cached, expiring, reread = asyncio.run(scenario())
+    assert first == cached == reread == "old-refresh-1"
+    assert len(set(expiring)) == 1 and expiring[0].startswith("access-refresh-2-")
+    assert len(manager.pg_pool.updates) == 1
+    assert len(manager.pg_pool.queries) == 3  # athlete 1 twice (forgotten once), athlete 2 once
+    assert tokens.stats()["cache_hits"] == 1
+
+
+def test_rate_limited_refreshes_stay_due(monkeypatch):
+    athletes = {a: _athlete(f"refresh-{a}", 300) for a in range(1, 4)}
+    manager = Manager(athletes)
+    tokens = _token_manager(manager, monkeypatch)
+
+    async def limited(refresh_token):
+        raise StravaRateLimited(900)
+
+    tokens._request_refresh = limited
+
+    async def scenario():
+        return await tokens.refresh_due()
+
+    assert asyncio.run(scenario()) == 0
+    assert manager.pg_pool.updates == []
+    assert sorted(tokens.pop_due(TokenConfig.REFRESH_WINDOW)) == [1, 2, 3]
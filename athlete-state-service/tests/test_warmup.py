@@ -0,0 +1,129 @@
+"""
+Tests for the startup state warm-up and the readiness endpoint
+"""
+import sys
+import os
+import json
+import asyncio
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from managers import AthleteStateManager
+from models import AthleteState
+from warmup import StateWarmup, WarmupConfig
+
+
+class PipelineRedis:
+    def __init__(self, data=None):
+        self.data = dict(data or {})
+        self.pipelines = 0
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class _Pipeline:
+            def __init__(self):
+                self.commands = []
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            def set(self, key, value, ex=None, nx=False):
+                self.commands.append((key, value, nx))
+
+            async def execute(self):
+                redis.pipelines += 1
+                results = []
+                for key, value, nx in self.commands:
+                    results.append(None if nx and key in redis.data else True)
+                    if results[-1]:
+                        redis.data[key] = value
+                return results
+
+        return _Pipeline()
+
+
+def _manager(redis, athlete_ids, gate=None):
+    manager = AthleteStateManager()
+    manager.redis_client = redis
+    manager.pg_pool = object()
+    queries = []
+
+    async def load_active_states(active_days):
+        queries.append(active_days)
+        if gate:
+            await gate.wait()
+        return [AthleteState(athlete_id=a, name=f"Rider {a}") for a in athlete_ids]
+
+    manager.load_active_states = load_active_states
+    return manager, queries
+
+
+def test_warmup_fills_missing_states_and_gates_readiness(monkeypatch):
+    monkeypatch.setattr(WarmupConfig, "CHUNK", 2)
+    redis = PipelineRedis({"athlete:state:2": "newer"})
+    gate = asyncio.Event()
+    manager, queries = _manager(redis, [1, 2, 3, 4, 5], gate)
+    warmup = StateWarmup(manager)
+
+    async def scenario():
+        await warmup.initialize()
+        await asyncio.sleep(0)
+        during = warmup.stats()
+        gate.set()
+        await warmup._task
+        return during, warmup.stats()
+
+    during, after = asyncio.run(scenario())
+    assert (during["ready"], during["progress"]) == (False, 0.0)
+    assert after["ready"] and after["finished"]
+    assert (after["total"], after["cached"], after["skipped"], after["progress"]) == (5, 4, 1, 1.0)
+    assert queries == [WarmupConfig.ACTIVE_DAYS]
+    assert redis.pipelines == 3
+    assert redis.data["athlete:state:2"] == "newer"  # never overwritten
+    assert AthleteState.from_dict(json.loads(redis.data["athlete:state:5"])).name == "Rider 5"
+
+
+def test_readiness_stops_waiting_after_the_timeout(monkeypatch):
+    manager, _ = _manager(PipelineRedis(), [1], gate=asyncio.Event())
+    warmup = StateWarmup(manager)
+
+    async def scenario():
+        await warmup.initialize()
+        waiting = warmup.ready
+        monkeypatch.setattr(WarmupConfig, "TIMEOUT", 0)
+        gave_up = warmup.ready
+        await warmup.cleanup()
+        return waiting, gave_up
+
+    assert asyncio.run(scenario()) == (False, True)
+
+
+def test_ready_endpoint_reports_503_while_warming(monkeypatch):
+    import main
+
+    gate = asyncio.Event()
+    manager, _ = _manager(PipelineRedis(), [1, 2], gate)
+    warmup = StateWarmup(manager)
+    monkeypatch.setattr(main, "state_warmup", warmup)
+
+    async def scenario():
+        await warmup.initialize()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            warming = await client.get("/ready")
+            gate.set()
+            await warmup._task
+            ready = await client.get("/ready")
+        return warming, ready
+
+    warming, ready = asyncio.run(scenario())
+    assert warming.status_code == 503
+    assert warming.json()["status"] == "warming"
+    assert ready.status_code == 200
+    assert ready.json()["warmup"]["cached"] == 2
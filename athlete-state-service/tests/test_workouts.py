@@ -0,0 +1,189 @@
+"""
+Tests for the versioned workouts listing: read-through cache, ETags and deltas
+"""
+import sys
+import os
+import json
+import asyncio
+from datetime import date
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from workouts import WorkoutListingService, workouts_etag, etag_matches
+
+
+class DictRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+
+class PlanDatabase:
+    """planned_workouts rows with row versions, plus tombstones"""
+
+    def __init__(self, plan_id=40, workouts=8):
+        self.version = 0
+        self.plan_id = plan_id
+        self.rows = []
+        self.tombstones = []
+        self.loads = 0
+        for day in range(1, workouts + 1):
+            self.write(day)
+
+    def write(self, day, workout_type="Endurance"):
+        self.version += 1
+        self.rows = [r for r in self.rows if r["id"] != day]
+        self.rows.append({"id": day, "scheduled_date": date(2026, 11, day), "workout_type": workout_type,
+                          "description": "", "duration_minutes": 60, "target_tss": 50,
+                          "intervals": json.dumps({"data": []}), "version": self.version})
+
+    def delete(self, day, plan_id=None):
+        self.version += 1
+        self.rows = [r for r in self.rows if r["id"] != day]
+        self.tombstones.append({"workout_id": day, "training_plan_id": plan_id or self.plan_id,
+                                "version": self.version})
+
+    def acquire(self):
+        db = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return PlanConnection(db)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+class PlanConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def transaction(self, **options):
+        class _Transaction:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Transaction()
+
+    async def fetchval(self, query, *args):
+        return self.db.version
+
+    async def fetchrow(self, query, *args):
+        self.db.loads += 1
+        plan_id = self.db.plan_id if len(self.db.rows) >= args[1] else None
+        return {"version": self.db.version, "plan_id": plan_id}
+
+    async def fetch(self, query, *args):
+        if "planned_workout_tombstones" in query:
+            return [t for t in self.db.tombstones if args[1] < t["version"] <= args[2]]
+        return sorted(self.db.rows, key=lambda r: r["scheduled_date"])
+
+
+class Manager:
+    def __init__(self, db):
+        self.pg_pool = db
+        self.redis_client = DictRedis()
+
+
+def test_listing_is_served_from_cache_until_the_version_moves():
+    db = PlanDatabase()
+    service = WorkoutListingService(Manager(db))
+
+    async def scenario():
+        first = await service.listing(7)
+        second = await service.listing(7)
+        db.write(3, "Threshold")
+        third = await service.listing(7)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert db.loads == 2
+    assert second == first
+    assert first["workouts"][0]["intervals"] == {"data": []}
+    assert first["workouts"][0]["scheduled_date"] == "2026-11-01"
+    assert third["version"] == 9
+    assert service.stats()["cache_hits"] == 1
+
+
+def test_delta_returns_changed_and_removed_workouts():
+    db = PlanDatabase()
+    service = WorkoutListingService(Manager(db))
+
+    async def scenario():
+        before = await service.listing(7)
+        db.write(2, "VO2max")
+        db.delete(5)
+        delta = await service.changes(7, before["version"])
+        unchanged = await service.changes(7, delta["version"])
+        return delta, unchanged
+
+    delta, unchanged = asyncio.run(scenario())
+    assert delta["delta"] is True
+    assert [(w["id"], w["workout_type"]) for w in delta["workouts"]] == [(2, "VO2max")]
+    assert delta["removed"] == [5]
+    assert (unchanged["delta"], unchanged["workouts"], unchanged["removed"]) == (True, [], [])
+
+
+def test_delta_falls_back_to_full_listing_when_the_plan_may_have_changed():
+    db = PlanDatabase(plan_id=40, workouts=6)
+    service = WorkoutListingService(Manager(db))
+
+    async def scenario():
+        since = db.version
+        # The newer plan 41 loses rows: the listing may have moved to plan 40
+        db.delete(99, plan_id=41)
+        moved = await service.changes(7, since)
+        # Too few of plan 40's rows existed at version 2 for it to be listed
+        early = await service.changes(7, 2)
+        ahead = await service.changes(7, db.version + 5)
+        return moved, early, ahead
+
+    moved, early, ahead = asyncio.run(scenario())
+    for response in (moved, early, ahead):
+        assert response["delta"] is False
+        assert len(response["workouts"]) == 6
+    assert service.stats()["full_resyncs"] == 3
+
+
+def test_if_none_match_gets_304(monkeypatch):
+    import main
+
+    db = PlanDatabase()
+    monkeypatch.setattr(main, "workout_listing", WorkoutListingService(Manager(db)))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            full = await client.get("/api/v1/workouts/7")
+            cached = await client.get("/api/v1/workouts/7", headers={"If-None-Match": full.headers["etag"]})
+            db.write(4, "Recovery")
+            changed = await client.get("/api/v1/workouts/7", headers={"If-None-Match": full.headers["etag"]})
+            return full, cached, changed
+
+    full, cached, changed = asyncio.run(scenario())
+    assert full.status_code == 200 and len(full.json()["workouts"]) == 8
+    assert full.headers["etag"] == workouts_etag(7, 8)
+    assert cached.status_code == 304 and cached.content == b""
+    assert changed.status_code == 200
+    assert changed.headers["etag"] == workouts_etag(7, 9)
+
+
+def test_etag_matching_is_weak():
+    etag = workouts_etag(7, 3)
+    assert etag_matches('"workouts-7-3"', etag)
+    assert etag_matches('W/"workouts-7-2", W/"workouts-7-3"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('W/"workouts-7-2"', etag)
+    assert not etag_matches(None, etag)
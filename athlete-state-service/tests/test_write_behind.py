@@ -0,0 +1,162 @@
+"""
+Tests for write-behind state persistence: coalescing, dirty columns and journal replay
+"""
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from managers import AthleteStateManager
+from write_behind import StateWriteBehind
+
+
+class StateConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def transaction(self):
+        class _Transaction:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Transaction()
+
+    async def fetchrow(self, query, *args):
+        if "FROM athletes" in query:
+            return {"id": args[0], "name": "Rider", "training_goal": "Gran Fondo",
+                    "weekly_hours_available": 10, "environment_preference": "outdoor",
+                    "strava_ftp": 260}
+        if "FROM athlete_state" in query:
+            return self.pool.rows.get(args[0])
+        return None
+
+    async def execute(self, query, *args):
+        self.pool.single_writes += 1
+
+    async def executemany(self, query, rows):
+        if self.pool.fail:
+            raise ConnectionError("database unavailable")
+        self.pool.batches.append((query, list(rows)))
+
+
+class StatePool:
+    def __init__(self, rows=None):
+        self.rows = rows or {}
+        self.single_writes = 0
+        self.batches = []
+        self.fail = False
+
+    def acquire(self):
+        pool = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                return StateConnection(pool)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+    async def close(self):
+        pass
+
+
+def _stored_row(athlete_id):
+    return {"athlete_id": athlete_id, "ctl_42d": 50.0, "atl_7d": 55.0, "tsb": -5.0,
+            "current_ftp": 250, "needs_macro_review": False, "acute_fatigue_level": "low",
+            "substitution_count_this_week": 0, "time_availability_profile": None}
+
+
+def test_updates_coalesce_into_one_batched_write(tmp_path):
+    pool = StatePool({1: _stored_row(1)})
+
+    async def scenario():
+        manager = AthleteStateManager()
+        manager.pg_pool = pool
+        writer = StateWriteBehind(manager, str(tmp_path / "journal.jsonl"))
+        await writer.initialize()
+        first = await manager.patch_state(1, {"substitution_count_this_week": 1})
+        second = await manager.patch_state(1, {"acute_fatigue_level": "high"})
+        await manager.patch_state(2, {"substitution_count_this_week": 3})
+        before_flush = (len(pool.batches), writer.stats()["dirty"])
+        await writer.flush()
+        await writer.cleanup()
+        return first, second, before_flush
+
+    first, second, before_flush = asyncio.run(scenario())
+    assert before_flush == (0, 2)
+    assert first.substitution_count_this_week == 1
+    # The second PATCH re-reads PostgreSQL; the unflushed first one is overlaid
+    assert (second.substitution_count_this_week, second.acute_fatigue_level) == (1, "high")
+    assert pool.single_writes == 1  # only the new athlete 2 row created on load
+
+    statements = {query: rows for query, rows in pool.batches}
+    both, = [q for q in statements if "acute_fatigue_level = EXCLUDED" in q]
+    assert "substitution_count_this_week = EXCLUDED" in both
+    assert "ctl_42d = EXCLUDED" not in both
+    assert [row[0] for row in statements[both]] == [1]
+    assert not os.listdir(tmp_path)
+
+
+def test_cache_miss_sees_unflushed_updates(tmp_path):
+    pool = StatePool({1: _stored_row(1)})
+
+    async def scenario():
+        manager = AthleteStateManager()
+        manager.pg_pool = pool
+        writer = StateWriteBehind(manager, str(tmp_path / "journal.jsonl"))
+        await writer.initialize()
+        await manager.patch_state(1, {"tsb": -12.5})
+        reloaded = await manager._load_state(1)
+        await writer.cleanup()
+        return reloaded
+
+    assert asyncio.run(scenario()).tsb == -12.5
+
+
+def test_journal_is_replayed_after_a_failed_flush(tmp_path):
+    journal = str(tmp_path / "journal.jsonl")
+    pool = StatePool({1: _stored_row(1)})
+
+    async def crashed_process():
+        manager = AthleteStateManager()
+        manager.pg_pool = pool
+        writer = StateWriteBehind(manager, journal)
+        await writer.initialize()
+        await manager.patch_state(1, {"needs_macro_review": True})
+        pool.fail = True
+        try:
+            await writer.flush()
+        except ConnectionError:
+            pass
+        await manager.patch_state(1, {"current_ftp": 271})
+        # Process dies: no cleanup, nothing reached PostgreSQL
+        writer._task.cancel()
+        writer._journal.close()
+
+    async def restarted_process():
+        pool.fail = False
+        manager = AthleteStateManager()
+        manager.pg_pool = pool
+        writer = StateWriteBehind(manager, journal)
+        await writer.initialize()
+        stats = writer.stats()
+        await writer.cleanup()
+        return stats
+
+    asyncio.run(crashed_process())
+    assert pool.batches == []
+    assert len(os.listdir(tmp_path)) == 2  # rotated segment + live journal
+
+    stats = asyncio.run(restarted_process())
+    assert stats["replayed"] == 2
+    assert stats["rows_written"] == 1
+    (query, rows), = pool.batches
+    assert "needs_macro_review = EXCLUDED" in query and "current_ftp = EXCLUDED" in query
+    assert rows[0][4] is True and rows[0][10] == 271
+    assert not os.listdir(tmp_path)
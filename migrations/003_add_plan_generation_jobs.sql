@@ -0,0 +1,34 @@
+-- Migration: Add Plan Generation Jobs
+-- Date: 2026-10-19
+-- Description: Persistent job state for plan generation run by athlete-state-service
+
+CREATE TABLE IF NOT EXISTS plan_generation_jobs (
+  id UUID PRIMARY KEY,
+  athlete_id INTEGER NOT NULL REFERENCES athletes(id) ON DELETE CASCADE,
+  status VARCHAR(20) NOT NULL DEFAULT 'queued',
+  progress INTEGER NOT NULL DEFAULT 0,
+  message TEXT,
+  params JSONB NOT NULL DEFAULT '{}'::jsonb,
+  dedupe_key TEXT NOT NULL,
+  result JSONB,
+  error TEXT,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  created_at TIMESTAMP DEFAULT NOW(),
+  started_at TIMESTAMP,
+  finished_at TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Only one live job per athlete + request shape
+CREATE UNIQUE INDEX IF NOT EXISTS idx_plan_jobs_active_dedupe
+  ON plan_generation_jobs(athlete_id, dedupe_key)
+  WHERE status IN ('queued', 'running');
+
+CREATE INDEX IF NOT EXISTS idx_plan_jobs_athlete_created
+  ON plan_generation_jobs(athlete_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_plan_jobs_status
+  ON plan_generation_jobs(status);
+
+COMMENT ON TABLE plan_generation_jobs IS 'Plan generation jobs queued and executed by athlete-state-service';
+COMMENT ON COLUMN plan_generation_jobs.status IS 'queued, running, completed, failed or cancelled';
+COMMENT ON COLUMN plan_generation_jobs.dedupe_key IS 'Hash of the request params; identical live requests share one job';
@@ -0,0 +1,16 @@
+-- Migration: Unique Strava activity per ride
+-- Date: 2026-10-19
+-- Description: Lets Strava ingestion upsert rides with ON CONFLICT (strava_activity_id)
+
+-- Existing duplicates must be removed first; find them with:
+--   SELECT strava_activity_id, COUNT(*) FROM rides
+--   WHERE strava_activity_id IS NOT NULL
+--   GROUP BY strava_activity_id HAVING COUNT(*) > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_rides_strava_activity_id
+  ON rides(strava_activity_id);
+
+CREATE INDEX IF NOT EXISTS idx_athletes_strava_athlete_id
+  ON athletes(strava_athlete_id);
+
+COMMENT ON INDEX idx_rides_strava_activity_id IS 'Conflict target for Strava webhook and backfill upserts';
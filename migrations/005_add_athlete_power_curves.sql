@@ -0,0 +1,39 @@
+-- Migration: Add Athlete Power Curves
+-- Date: 2026-10-19
+-- Description: Per-athlete, per-day mean-maximal power curves merged on ride ingestion
+
+-- Curves are REAL[] aligned with power.POWER_CURVE_DURATIONS (1 s .. 60 min);
+-- NULL marks a duration longer than any ride that day.
+CREATE TABLE IF NOT EXISTS athlete_power_curves (
+  athlete_id INTEGER NOT NULL REFERENCES athletes(id) ON DELETE CASCADE,
+  curve_date DATE NOT NULL,
+  curve REAL[] NOT NULL,
+  updated_at TIMESTAMP DEFAULT NOW(),
+  PRIMARY KEY (athlete_id, curve_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_power_curves_updated
+  ON athlete_power_curves(updated_at);
+
+-- Elementwise max of two curves (GREATEST ignores NULLs)
+CREATE OR REPLACE FUNCTION power_curve_max(a REAL[], b REAL[])
+RETURNS REAL[]
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT CASE
+    WHEN a IS NULL THEN b
+    WHEN b IS NULL THEN a
+    ELSE (
+      SELECT array_agg(GREATEST(x, y) ORDER BY i)
+      FROM unnest(a, b) WITH ORDINALITY AS t(x, y, i)
+    )
+  END
+$$;
+
+-- Best curve across rows, e.g. over a 42 or 90 day window
+CREATE OR REPLACE AGGREGATE power_curve_max_agg(REAL[]) (
+  SFUNC = power_curve_max,
+  STYPE = REAL[]
+);
+
+COMMENT ON TABLE athlete_power_curves IS 'Daily mean-maximal power curves, merged incrementally from ride streams';
+COMMENT ON COLUMN athlete_power_curves.updated_at IS 'Only bumped when a merge actually raised the curve';
@@ -0,0 +1,60 @@
+-- Migration: Clean chat history at write time
+-- Date: 2026-10-19
+-- Description: Pre-extracted role / clean content on n8n_chat_histories, keyset
+--              pagination index and rolling per-athlete conversation summaries
+
+-- Same cleaning as the Embed_Chat_Messages code node: AI replies that used
+-- tools are stored as '[Used tools: ...] answer', keep only the answer
+CREATE OR REPLACE FUNCTION chat_clean_content(msg_type TEXT, content TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT CASE
+    WHEN msg_type = 'ai' AND content LIKE '[Used tools:%' AND position('] ' IN content) > 0
+      THEN TRIM(SUBSTRING(content FROM position('] ' IN content) + 2))
+    ELSE TRIM(content)
+  END
+$$;
+
+ALTER TABLE n8n_chat_histories ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT NOW();
+ALTER TABLE n8n_chat_histories ADD COLUMN IF NOT EXISTS athlete_id INTEGER;
+ALTER TABLE n8n_chat_histories ADD COLUMN IF NOT EXISTS role VARCHAR(20);
+ALTER TABLE n8n_chat_histories ADD COLUMN IF NOT EXISTS clean_content TEXT;
+
+CREATE OR REPLACE FUNCTION chat_histories_extract()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  -- Sessions are keyed by athlete id; some older ones carry a stray '=' prefix
+  NEW.athlete_id := CASE WHEN NEW.session_id ~ '^=?\d+$'
+                         THEN LTRIM(NEW.session_id, '=')::INTEGER END;
+  NEW.role := CASE NEW.message->>'type'
+                WHEN 'human' THEN 'user'
+                WHEN 'ai' THEN 'assistant'
+              END;
+  NEW.clean_content := chat_clean_content(NEW.message->>'type', NEW.message->>'content');
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_chat_histories_extract ON n8n_chat_histories;
+CREATE TRIGGER trg_chat_histories_extract
+  BEFORE INSERT OR UPDATE OF message, session_id ON n8n_chat_histories
+  FOR EACH ROW EXECUTE FUNCTION chat_histories_extract();
+
+-- Backfill existing rows through the trigger
+UPDATE n8n_chat_histories SET message = message WHERE clean_content IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_chat_histories_athlete_created
+  ON n8n_chat_histories(athlete_id, created_at DESC, id DESC)
+  WHERE role IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS chat_summaries (
+  athlete_id INTEGER PRIMARY KEY REFERENCES athletes(id) ON DELETE CASCADE,
+  summary TEXT NOT NULL DEFAULT '',
+  last_message_id INTEGER NOT NULL DEFAULT 0,
+  message_count INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT NOW()
+);
+
+COMMENT ON COLUMN n8n_chat_histories.clean_content IS 'Message text without tool-call prefixes, set by trg_chat_histories_extract';
+COMMENT ON TABLE chat_summaries IS 'Rolling conversation summary per athlete, folded forward from last_message_id';
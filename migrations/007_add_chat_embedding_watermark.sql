@@ -0,0 +1,28 @@
+-- Migration: Watermarked chat embedding
+-- Date: 2026-10-19
+-- Description: Lets athlete-state-service embed n8n_chat_histories incrementally
+--              and idempotently instead of polling a 10 minute window
+
+ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS source_id INTEGER;
+ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT NOW();
+
+-- Conflict target: each n8n_chat_histories row is embedded at most once
+CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_messages_source_id
+  ON chat_messages(source_id);
+
+CREATE TABLE IF NOT EXISTS worker_watermarks (
+  name TEXT PRIMARY KEY,
+  last_id BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Start after whatever the n8n workflow already embedded
+INSERT INTO worker_watermarks (name, last_id)
+VALUES ('chat_embeddings', COALESCE((
+  SELECT MAX(h.id) FROM n8n_chat_histories h
+  WHERE h.created_at <= (SELECT MAX(created_at) FROM chat_messages)
+), 0))
+ON CONFLICT (name) DO NOTHING;
+
+COMMENT ON COLUMN chat_messages.source_id IS 'n8n_chat_histories.id the message was embedded from';
+COMMENT ON TABLE worker_watermarks IS 'High-water marks of incremental background workers';
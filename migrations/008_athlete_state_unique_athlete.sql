@@ -0,0 +1,16 @@
+-- Migration: Unique athlete_state row per athlete
+-- Date: 2026-10-19
+-- Description: Conflict target for the state manager's INSERT ... ON CONFLICT (athlete_id) upsert
+
+-- Racing inserts before this migration could leave several rows per
+-- athlete; keep the most recently updated one
+DELETE FROM athlete_state a
+USING athlete_state b
+WHERE a.athlete_id = b.athlete_id
+  AND (COALESCE(a.updated_at, '-infinity'), a.ctid) < (COALESCE(b.updated_at, '-infinity'), b.ctid);
+
+-- A no-op where athlete_id is already the primary key
+CREATE UNIQUE INDEX IF NOT EXISTS idx_athlete_state_athlete_id
+  ON athlete_state(athlete_id);
+
+COMMENT ON INDEX idx_athlete_state_athlete_id IS 'Conflict target for AthleteStateManager._save_to_database upserts';
@@ -0,0 +1,16 @@
+-- Migration: Plan generation job leases and retry backoff
+-- Date: 2026-10-19
+-- Description: Replica ownership with heartbeats so only stale jobs are reclaimed, plus retry scheduling
+
+ALTER TABLE plan_generation_jobs ADD COLUMN IF NOT EXISTS locked_by TEXT;
+ALTER TABLE plan_generation_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP;
+ALTER TABLE plan_generation_jobs ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP;
+
+-- Reclaim scans live jobs only
+CREATE INDEX IF NOT EXISTS idx_plan_jobs_live_heartbeat
+  ON plan_generation_jobs(heartbeat_at)
+  WHERE status IN ('queued', 'running');
+
+COMMENT ON COLUMN plan_generation_jobs.locked_by IS 'Replica (host:pid:nonce) holding the live job; NULL when released';
+COMMENT ON COLUMN plan_generation_jobs.heartbeat_at IS 'Renewed by the owner every 30s; older than the lease means the owner is gone';
+COMMENT ON COLUMN plan_generation_jobs.next_attempt_at IS 'Earliest time a retried job may run again (exponential backoff)';
@@ -0,0 +1,67 @@
+-- Migration: Calendar cache invalidation notifications
+-- Date: 2026-10-19
+-- Description: pg_notify on planned_workouts / training_plans writes so athlete-state-service drops cached calendar months, including for writes made by n8n
+
+CREATE OR REPLACE FUNCTION notify_calendar_month(p_athlete_id INTEGER, p_day DATE)
+RETURNS void AS $$
+BEGIN
+  IF p_athlete_id IS NULL OR p_day IS NULL THEN
+    RETURN;
+  END IF;
+  -- Identical payloads in one transaction are delivered once, so a bulk
+  -- plan insert sends one message per athlete and month
+  PERFORM pg_notify('athlete_cache', json_build_object(
+    'scope', 'calendar',
+    'athlete_id', p_athlete_id,
+    'month', to_char(p_day, 'YYYY-MM')
+  )::text);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_planned_workout_change()
+RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM notify_calendar_month(OLD.athlete_id, OLD.scheduled_date::date);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM notify_calendar_month(NEW.athlete_id, NEW.scheduled_date::date);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_training_plan_change()
+RETURNS trigger AS $$
+DECLARE
+  plan RECORD;
+  month_start DATE;
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    plan := OLD;
+  ELSE
+    plan := NEW;
+  END IF;
+  -- Plan status (active/replaced) decides which workouts the calendar shows
+  FOR month_start IN
+    SELECT generate_series(date_trunc('month', plan.start_date),
+                           date_trunc('month', COALESCE(plan.end_date, plan.start_date)),
+                           interval '1 month')::date
+  LOOP
+    PERFORM notify_calendar_month(plan.athlete_id, month_start);
+  END LOOP;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_planned_workouts_calendar_notify ON planned_workouts;
+CREATE TRIGGER trg_planned_workouts_calendar_notify
+  AFTER INSERT OR UPDATE OR DELETE ON planned_workouts
+  FOR EACH ROW EXECUTE FUNCTION notify_planned_workout_change();
+
+DROP TRIGGER IF EXISTS trg_training_plans_calendar_notify ON training_plans;
+CREATE TRIGGER trg_training_plans_calendar_notify
+  AFTER INSERT OR UPDATE OR DELETE ON training_plans
+  FOR EACH ROW EXECUTE FUNCTION notify_training_plan_change();
+
+COMMENT ON FUNCTION notify_calendar_month(INTEGER, DATE) IS 'Signals athlete-state-service (channel athlete_cache) to drop one cached calendar month';
@@ -0,0 +1,13 @@
+-- Migration: Persist current FTP on athlete_state and track FTP reviews
+-- Date: 2026-10-19
+-- Description: Estimated FTP survives cache eviction; per-athlete review watermark so athletes without an estimate are not recomputed every run
+
+ALTER TABLE athlete_state ADD COLUMN IF NOT EXISTS current_ftp INTEGER;
+
+CREATE TABLE IF NOT EXISTS athlete_ftp_reviews (
+  athlete_id INTEGER PRIMARY KEY REFERENCES athletes(id) ON DELETE CASCADE,
+  reviewed_at TIMESTAMP NOT NULL
+);
+
+COMMENT ON COLUMN athlete_state.current_ftp IS 'FTP in use (estimated or set via PATCH); preferred over athletes.strava_ftp on rebuild';
+COMMENT ON TABLE athlete_ftp_reviews IS 'Last time the FTP estimator evaluated each athlete, whether or not it produced a suggestion';
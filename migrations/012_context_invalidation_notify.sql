@@ -0,0 +1,43 @@
+-- Migration: Chat context cache invalidation notifications
+-- Date: 2026-10-19
+-- Description: pg_notify on athletes / rides / training_phases writes so athlete-state-service bumps the cached chat context version, including for writes made by n8n
+
+CREATE OR REPLACE FUNCTION notify_context_change()
+RETURNS trigger AS $$
+DECLARE
+  athlete INTEGER;
+BEGIN
+  IF TG_TABLE_NAME = 'athletes' THEN
+    athlete := COALESCE(NEW.id, OLD.id);
+  ELSIF TG_OP = 'DELETE' THEN
+    athlete := OLD.athlete_id;
+  ELSE
+    athlete := NEW.athlete_id;
+  END IF;
+  IF athlete IS NOT NULL THEN
+    -- Identical payloads in one transaction are delivered once
+    PERFORM pg_notify('athlete_cache', json_build_object(
+      'scope', 'context',
+      'athlete_id', athlete
+    )::text);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_athletes_context_notify ON athletes;
+CREATE TRIGGER trg_athletes_context_notify
+  AFTER UPDATE OR DELETE ON athletes
+  FOR EACH ROW EXECUTE FUNCTION notify_context_change();
+
+DROP TRIGGER IF EXISTS trg_rides_context_notify ON rides;
+CREATE TRIGGER trg_rides_context_notify
+  AFTER INSERT OR UPDATE OR DELETE ON rides
+  FOR EACH ROW EXECUTE FUNCTION notify_context_change();
+
+DROP TRIGGER IF EXISTS trg_training_phases_context_notify ON training_phases;
+CREATE TRIGGER trg_training_phases_context_notify
+  AFTER INSERT OR UPDATE OR DELETE ON training_phases
+  FOR EACH ROW EXECUTE FUNCTION notify_context_change();
+
+COMMENT ON FUNCTION notify_context_change() IS 'Signals athlete-state-service (channel athlete_cache) to bump one athlete''s chat context version';
@@ -0,0 +1,35 @@
+-- Migration: Plan generation progress notifications
+-- Date: 2026-10-19
+-- Description: pg_notify on plan_generation_jobs status / progress changes so every athlete-state-service replica can push progress to server-sent event streams
+
+CREATE OR REPLACE FUNCTION notify_plan_job_progress()
+RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify('athlete_cache', json_build_object(
+    'scope', 'job',
+    'athlete_id', NEW.athlete_id,
+    'job_id', NEW.id,
+    'status', NEW.status,
+    'progress', NEW.progress,
+    'message', left(NEW.message, 500)
+  )::text);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_plan_jobs_insert_notify ON plan_generation_jobs;
+CREATE TRIGGER trg_plan_jobs_insert_notify
+  AFTER INSERT ON plan_generation_jobs
+  FOR EACH ROW EXECUTE FUNCTION notify_plan_job_progress();
+
+-- Lease heartbeats and re-persists rewrite the row; only real changes notify
+DROP TRIGGER IF EXISTS trg_plan_jobs_progress_notify ON plan_generation_jobs;
+CREATE TRIGGER trg_plan_jobs_progress_notify
+  AFTER UPDATE ON plan_generation_jobs
+  FOR EACH ROW
+  WHEN (OLD.status IS DISTINCT FROM NEW.status
+        OR OLD.progress IS DISTINCT FROM NEW.progress
+        OR OLD.message IS DISTINCT FROM NEW.message)
+  EXECUTE FUNCTION notify_plan_job_progress();
+
+COMMENT ON FUNCTION notify_plan_job_progress() IS 'Signals athlete-state-service (channel athlete_cache) that a plan generation job changed status or progress';
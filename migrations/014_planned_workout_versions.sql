@@ -0,0 +1,84 @@
+-- Migration: Versioned planned workouts for ETag / delta listings
+-- Date: 2026-10-19
+-- Description: Per-athlete version counter bumped on every planned_workouts write, row versions and delete tombstones so athlete-state-service can answer If-None-Match with 304 and ?since=<version> with only the changed workouts, including for writes made by n8n
+
+ALTER TABLE planned_workouts
+ADD COLUMN IF NOT EXISTS row_version BIGINT NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_planned_workouts_plan_version
+  ON planned_workouts (training_plan_id, row_version);
+
+-- No foreign key: delete cascades from athletes fire the tombstone trigger
+CREATE TABLE IF NOT EXISTS athlete_workout_versions (
+  athlete_id INTEGER PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS planned_workout_tombstones (
+  athlete_id INTEGER NOT NULL,
+  version BIGINT NOT NULL,
+  workout_id INTEGER NOT NULL,
+  training_plan_id INTEGER,
+  removed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (athlete_id, version)
+);
+
+-- The row lock taken here also orders concurrent writers for one athlete,
+-- so versions become visible in increasing order
+CREATE OR REPLACE FUNCTION bump_workout_version(p_athlete_id INTEGER)
+RETURNS BIGINT AS $$
+  INSERT INTO athlete_workout_versions (athlete_id, version, updated_at)
+  VALUES (p_athlete_id, 1, NOW())
+  ON CONFLICT (athlete_id) DO UPDATE
+    SET version = athlete_workout_versions.version + 1, updated_at = NOW()
+  RETURNING version;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION tombstone_planned_workout(p_workout_id INTEGER, p_athlete_id INTEGER, p_plan_id INTEGER)
+RETURNS void AS $$
+  INSERT INTO planned_workout_tombstones (athlete_id, version, workout_id, training_plan_id)
+  SELECT p_athlete_id, bump_workout_version(p_athlete_id), p_workout_id, p_plan_id
+  WHERE p_athlete_id IS NOT NULL;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION version_planned_workout()
+RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    PERFORM tombstone_planned_workout(OLD.id, OLD.athlete_id, OLD.training_plan_id);
+    RETURN NULL;
+  END IF;
+  -- A workout moved to another plan or athlete leaves the old listing
+  IF TG_OP = 'UPDATE' AND (OLD.athlete_id IS DISTINCT FROM NEW.athlete_id
+                           OR OLD.training_plan_id IS DISTINCT FROM NEW.training_plan_id) THEN
+    PERFORM tombstone_planned_workout(OLD.id, OLD.athlete_id, OLD.training_plan_id);
+  END IF;
+  IF NEW.athlete_id IS NOT NULL THEN
+    NEW.row_version := bump_workout_version(NEW.athlete_id);
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_planned_workouts_version_insert ON planned_workouts;
+CREATE TRIGGER trg_planned_workouts_version_insert
+  BEFORE INSERT ON planned_workouts
+  FOR EACH ROW EXECUTE FUNCTION version_planned_workout();
+
+-- No-op updates (same values) keep their version
+DROP TRIGGER IF EXISTS trg_planned_workouts_version_update ON planned_workouts;
+CREATE TRIGGER trg_planned_workouts_version_update
+  BEFORE UPDATE ON planned_workouts
+  FOR EACH ROW
+  WHEN (OLD.* IS DISTINCT FROM NEW.*)
+  EXECUTE FUNCTION version_planned_workout();
+
+DROP TRIGGER IF EXISTS trg_planned_workouts_version_delete ON planned_workouts;
+CREATE TRIGGER trg_planned_workouts_version_delete
+  AFTER DELETE ON planned_workouts
+  FOR EACH ROW EXECUTE FUNCTION version_planned_workout();
+
+COMMENT ON COLUMN planned_workouts.row_version IS 'athlete_workout_versions.version at the last insert / update of this row';
+COMMENT ON TABLE athlete_workout_versions IS 'Per-athlete planned workout version; the ETag of the workouts listing';
+COMMENT ON TABLE planned_workout_tombstones IS 'Deleted (or moved) planned workouts, reported as removed in ?since= delta listings';
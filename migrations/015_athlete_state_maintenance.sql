@@ -0,0 +1,12 @@
+-- Migration: Scheduled athlete state maintenance
+-- Date: 2026-10-19
+-- Description: Week marker for substitution_count_this_week so athlete-state-service's maintenance scheduler can reset weekly counters with one idempotent UPDATE, and a rides index for its active-athlete and training-load queries
+
+-- Monday of the week substitution_count_this_week counts; new rows start
+-- in the current week
+ALTER TABLE athlete_state
+ADD COLUMN IF NOT EXISTS counter_week DATE NOT NULL DEFAULT date_trunc('week', NOW())::date;
+
+CREATE INDEX IF NOT EXISTS idx_rides_athlete_date ON rides (athlete_id, ride_date);
+
+COMMENT ON COLUMN athlete_state.counter_week IS 'Week (Monday) substitution_count_this_week belongs to; rows from an earlier week are reset by the maintenance scheduler';
@@ -0,0 +1,26 @@
+-- Migration: Strava activity history backfill
+-- Date: 2026-10-19
+-- Description: Per-athlete progress of athlete-state-service's Strava backfill, so paging through an athlete's activity history resumes where it stopped after a restart or a rate limit
+
+CREATE TABLE IF NOT EXISTS strava_backfill (
+    athlete_id INTEGER PRIMARY KEY REFERENCES athletes(id) ON DELETE CASCADE,
+    status TEXT NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'done', 'failed')),
+    -- Fixed history window (epoch seconds), so page numbers stay stable
+    before_ts BIGINT NOT NULL,
+    after_ts BIGINT NOT NULL,
+    next_page INTEGER NOT NULL DEFAULT 1,
+    pages INTEGER NOT NULL DEFAULT 0,
+    rides INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    requested_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_strava_backfill_pending
+  ON strava_backfill (requested_at) WHERE status = 'pending';
+
+COMMENT ON TABLE strava_backfill IS 'Strava activity history backfill per athlete; next_page is the resume cursor within [after_ts, before_ts)';
+COMMENT ON COLUMN strava_backfill.next_page IS 'Next /athlete/activities page to fetch; saved in the same transaction as that page''s rides';
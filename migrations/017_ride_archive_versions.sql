@@ -0,0 +1,88 @@
+-- Migration: Versioned rides for the columnar ride archive
+-- Date: 2026-10-19
+-- Description: Per-athlete version counter bumped on every rides write, row versions and delete tombstones so athlete-state-service can refresh its per-athlete columnar ride archive incrementally, including for rides written by n8n
+
+ALTER TABLE rides
+ADD COLUMN IF NOT EXISTS archive_version BIGINT NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_rides_athlete_archive_version
+  ON rides (athlete_id, archive_version);
+
+-- No foreign key: delete cascades from athletes fire the tombstone trigger
+CREATE TABLE IF NOT EXISTS athlete_ride_versions (
+  athlete_id INTEGER PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Athletes with rides from before this migration: version 0 makes the
+-- archive do a full export for them
+INSERT INTO athlete_ride_versions (athlete_id, version)
+SELECT DISTINCT athlete_id, 0 FROM rides WHERE athlete_id IS NOT NULL
+ON CONFLICT (athlete_id) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS ride_archive_tombstones (
+  athlete_id INTEGER NOT NULL,
+  version BIGINT NOT NULL,
+  ride_id INTEGER NOT NULL,
+  removed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (athlete_id, version)
+);
+
+-- The row lock taken here also orders concurrent writers for one athlete,
+-- so versions become visible in increasing order
+CREATE OR REPLACE FUNCTION bump_ride_version(p_athlete_id INTEGER)
+RETURNS BIGINT AS $$
+  INSERT INTO athlete_ride_versions (athlete_id, version, updated_at)
+  VALUES (p_athlete_id, 1, NOW())
+  ON CONFLICT (athlete_id) DO UPDATE
+    SET version = athlete_ride_versions.version + 1, updated_at = NOW()
+  RETURNING version;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION tombstone_ride(p_ride_id INTEGER, p_athlete_id INTEGER)
+RETURNS void AS $$
+  INSERT INTO ride_archive_tombstones (athlete_id, version, ride_id)
+  SELECT p_athlete_id, bump_ride_version(p_athlete_id), p_ride_id
+  WHERE p_athlete_id IS NOT NULL;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION version_ride()
+RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    PERFORM tombstone_ride(OLD.id, OLD.athlete_id);
+    RETURN NULL;
+  END IF;
+  -- A ride moved to another athlete leaves the old athlete's archive
+  IF TG_OP = 'UPDATE' AND OLD.athlete_id IS DISTINCT FROM NEW.athlete_id THEN
+    PERFORM tombstone_ride(OLD.id, OLD.athlete_id);
+  END IF;
+  IF NEW.athlete_id IS NOT NULL THEN
+    NEW.archive_version := bump_ride_version(NEW.athlete_id);
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_rides_archive_version_insert ON rides;
+CREATE TRIGGER trg_rides_archive_version_insert
+  BEFORE INSERT ON rides
+  FOR EACH ROW EXECUTE FUNCTION version_ride();
+
+-- No-op updates (same values) keep their version
+DROP TRIGGER IF EXISTS trg_rides_archive_version_update ON rides;
+CREATE TRIGGER trg_rides_archive_version_update
+  BEFORE UPDATE ON rides
+  FOR EACH ROW
+  WHEN (OLD.* IS DISTINCT FROM NEW.*)
+  EXECUTE FUNCTION version_ride();
+
+DROP TRIGGER IF EXISTS trg_rides_archive_version_delete ON rides;
+CREATE TRIGGER trg_rides_archive_version_delete
+  AFTER DELETE ON rides
+  FOR EACH ROW EXECUTE FUNCTION version_ride();
+
+COMMENT ON COLUMN rides.archive_version IS 'athlete_ride_versions.version at the last insert / update of this row';
+COMMENT ON TABLE athlete_ride_versions IS 'Per-athlete rides version; the ride archive re-exports an athlete whose version passed its watermark';
+COMMENT ON TABLE ride_archive_tombstones IS 'Deleted (or moved) rides, dropped from the ride archive on its next refresh and pruned after';
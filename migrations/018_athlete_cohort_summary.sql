@@ -0,0 +1,57 @@
+-- Migration: Cohort training load summary
+-- Date: 2026-10-19
+-- Description: One precomputed row per athlete (CTL / ATL / TSB, weekly and rolling TSS, plan compliance) so athlete-state-service can serve the whole roster in one indexed read; its maintenance scheduler refreshes the view concurrently, so reads never wait on a refresh
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS athlete_cohort_summary AS
+WITH load AS (
+  SELECT athlete_id,
+         SUM(tss) FILTER (WHERE ride_date >= date_trunc('week', CURRENT_DATE)) AS tss_this_week,
+         SUM(tss) FILTER (WHERE ride_date >= date_trunc('week', CURRENT_DATE) - INTERVAL '7 days'
+                            AND ride_date < date_trunc('week', CURRENT_DATE)) AS tss_last_week,
+         SUM(tss) FILTER (WHERE ride_date >= CURRENT_DATE - 6) AS tss_7d,
+         SUM(tss) FILTER (WHERE ride_date >= CURRENT_DATE - 27) AS tss_28d,
+         MAX(ride_date)::date AS last_ride_date
+  FROM rides
+  WHERE ride_date >= LEAST(CURRENT_DATE - 27, date_trunc('week', CURRENT_DATE)::date - 7)
+  GROUP BY athlete_id
+),
+-- Past workouts of the last four weeks; rest days have no duration
+compliance AS (
+  SELECT athlete_id,
+         COUNT(*) AS planned_workouts,
+         COUNT(*) FILTER (WHERE status = 'completed' OR completed_ride_id IS NOT NULL) AS completed_workouts,
+         SUM(target_tss) AS planned_tss
+  FROM planned_workouts
+  WHERE scheduled_date >= CURRENT_DATE - 28 AND scheduled_date < CURRENT_DATE
+    AND COALESCE(duration_minutes, 0) > 0
+  GROUP BY athlete_id
+)
+SELECT a.id AS athlete_id,
+       a.name,
+       s.ctl_42d,
+       s.atl_7d,
+       s.tsb,
+       s.acute_fatigue_level,
+       COALESCE(l.tss_this_week, 0)::float8 AS tss_this_week,
+       COALESCE(l.tss_last_week, 0)::float8 AS tss_last_week,
+       COALESCE(l.tss_7d, 0)::float8 AS tss_7d,
+       COALESCE(l.tss_28d, 0)::float8 AS tss_28d,
+       l.last_ride_date,
+       COALESCE(c.planned_workouts, 0)::int AS planned_workouts,
+       COALESCE(c.completed_workouts, 0)::int AS completed_workouts,
+       c.planned_tss::float8 AS planned_tss,
+       NOW() AS refreshed_at
+FROM athletes a
+LEFT JOIN athlete_state s ON s.athlete_id = a.id
+LEFT JOIN load l ON l.athlete_id = a.id
+LEFT JOIN compliance c ON c.athlete_id = a.id;
+
+-- REFRESH ... CONCURRENTLY needs a unique index
+CREATE UNIQUE INDEX IF NOT EXISTS idx_athlete_cohort_summary_athlete
+  ON athlete_cohort_summary (athlete_id);
+
+CREATE INDEX IF NOT EXISTS idx_planned_workouts_athlete_date
+  ON planned_workouts (athlete_id, scheduled_date);
+
+COMMENT ON MATERIALIZED VIEW athlete_cohort_summary IS 'Per-athlete training load and 28-day plan compliance for the cohort endpoint; refreshed concurrently by the athlete-state-service maintenance scheduler';
+COMMENT ON COLUMN athlete_cohort_summary.refreshed_at IS 'When the view was last refreshed; the rolling windows are relative to that day';